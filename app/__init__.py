@@ -1 +1,6 @@
+from dotenv import load_dotenv
+
+# Modules read their settings from the environment when imported, so .env is loaded before any of them.
+load_dotenv()
+
 from app.logger_config import logger 
\ No newline at end of file
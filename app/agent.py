@@ -1,43 +1,27 @@
-from .tools.financial_extractor import extract_financials
-from .tools.qualitative_analysis import analyze_transcripts
-from .tools.vectorstore import create_or_load_vector_store
-from .tools.market_data import fetch_market_data
-from langchain_core.prompts import PromptTemplate
-from langchain_groq import ChatGroq
+from .tools.financial_extractor import extract_financials, aextract_financials
+from .tools.qualitative_analysis import analyze_transcripts, aanalyze_transcripts, build_transcripts_query, transcript_filter
+from .tools.market_data import fetch_market_data, afetch_market_data
+from .tools.vectorstore import RETRIEVAL_QUARTERS, UnknownTickerError, retrieve_batch, aretrieve_batch
+from .tools.transcript_summaries import cached_summaries
+from .registry import registry
+from .metrics import FORECAST_OUTPUTS, instrumented, observe_stage
+from .schemas import ForecastParseError, parse_forecast_output
+from .tools.prompts import LazyPromptTemplate
 from langchain_core.runnables import RunnableLambda, RunnableParallel
+import asyncio
 import os
-from dotenv import load_dotenv
+import time
 import logging
-import warnings
 
 logger = logging.getLogger(__name__)
-load_dotenv()
 
-model = os.getenv("MODEL_NAME", "llama-3.3-70b-versatile")
-api_key = os.getenv("GROQ_API_KEY")
-if not api_key:
-    raise EnvironmentError("Missing GROQ_API_KEY in environment variables.")
+FORECAST_BATCH_CONCURRENCY = int(os.getenv("FORECAST_BATCH_CONCURRENCY", "4"))
+FORECAST_SYNTHESIS_ATTEMPTS = int(os.getenv("FORECAST_SYNTHESIS_ATTEMPTS", "2"))
 
-warnings.filterwarnings("ignore", category=DeprecationWarning)
-
-def get_llm():
-    try:
-        return ChatGroq(
-            model=model,
-            api_key=api_key,
-            temperature=0.1,
-            max_tokens=1000
-        )
-    except Exception as e:
-        logger.error("Failed to initialize LLM: %s", str(e))
-        raise RuntimeError("LLM Initialization failed") from e
-
-def synthesize_forecast(task, financials, qualitative, market, llm):
-    try:
-        prompt = PromptTemplate(
-            input_variables=["task", "financials", "qualitative", "market"],
-            template=(
-                """
+FORECAST_PROMPT = LazyPromptTemplate(
+    input_variables=["task", "financials", "qualitative", "market"],
+    template=(
+        """
         You are a senior financial analyst preparing a forecast for the upcoming quarter.
 
         Inputs:
@@ -85,56 +69,300 @@ def synthesize_forecast(task, financials, qualitative, market, llm):
             {{"opportunity": "expansion into Asia market", "benefit": "increase revenue by 5%"}},
             {{"opportunity": "new product launch", "benefit": "boost net profit margin"}}
         ],
+        "assumptions": [
+            "Stable currency and demand conditions",
+            "No major regulatory changes"
+        ],
         "overall_forecast": {{
             "summary": "Strong revenue growth expected driven by new products and market expansion, balanced by supply chain risks.",
             "confidence_level": "medium"
         }}
         }}
         """
-        )
-        )
-        response = llm.invoke(
-            prompt.format(
-                task=task,
-                financials=financials,
-                qualitative=qualitative,
-                market=market
-            )
-        )
+    )
+)
+
+
+RETRY_NOTE = (
+    "\n\nYour previous answer could not be used ({error}). Reply with only the JSON object described above, "
+    "keeping every field brief so the answer is complete."
+)
+
+def json_mode(llm):
+    # Groq's JSON mode guarantees syntactically valid JSON; other providers ignore the option.
+    return llm.bind(response_format={"type": "json_object"})
+
+def forecast_prompt(task, financials, qualitative, market, error=None):
+    prompt = FORECAST_PROMPT.format(
+        task=task,
+        financials=financials,
+        qualitative=qualitative,
+        market=market
+    )
+    return prompt + RETRY_NOTE.format(error=error) if error else prompt
+
+@instrumented("synthesis")
+def synthesize_forecast(task, financials, qualitative, market, llm, error=None):
+    try:
+        response = json_mode(llm).invoke(forecast_prompt(task, financials, qualitative, market, error))
         return response.content.strip()
     except Exception as e:
         logger.exception("Failed to synthesize forecast.")
         raise RuntimeError("Forecast synthesis failed") from e
 
-def generate_forecast(task):
+@instrumented("synthesis")
+async def asynthesize_forecast(task, financials, qualitative, market, llm, error=None):
+    try:
+        response = await json_mode(llm).ainvoke(forecast_prompt(task, financials, qualitative, market, error))
+        return response.content.strip()
+    except Exception as e:
+        logger.exception("Failed to synthesize forecast.")
+        raise RuntimeError("Forecast synthesis failed") from e
+
+def parse_attempt(text, attempt):
+    try:
+        forecast, repaired = parse_forecast_output(text)
+    except ForecastParseError as e:
+        logger.warning(f"Forecast output attempt {attempt + 1} unusable: {e}")
+        return None, e
+    FORECAST_OUTPUTS.inc(outcome="retried" if attempt else "repaired" if repaired else "valid")
+    return forecast, None
+
+def synthesize_validated(task, results, llm):
+    # Only the synthesis call is repeated on unusable output; tool results are reused as-is.
+    error = None
+    for attempt in range(FORECAST_SYNTHESIS_ATTEMPTS):
+        text = synthesize_forecast(task=task, llm=llm, error=error, **results)
+        forecast, error = parse_attempt(text, attempt)
+        if forecast is not None:
+            return forecast
+    FORECAST_OUTPUTS.inc(outcome="failed")
+    raise error
+
+async def asynthesize_validated(task, results, llm, first_text=None):
+    error = None
+    for attempt in range(FORECAST_SYNTHESIS_ATTEMPTS):
+        if attempt == 0 and first_text is not None:
+            text = first_text
+        else:
+            text = await asynthesize_forecast(task=task, llm=llm, error=error, **results)
+        forecast, error = parse_attempt(text, attempt)
+        if forecast is not None:
+            return forecast
+    FORECAST_OUTPUTS.inc(outcome="failed")
+    raise error
+
+def retrieval_requests(task, corpus, pending_transcripts=None):
+    # Financials come from the precomputed metrics store and transcripts from cached per-call
+    # summaries; raw chunks are only retrieved for transcripts that are not summarized yet.
+    requests = {}
+    if pending_transcripts is None:
+        _, pending_transcripts = cached_summaries(corpus, RETRIEVAL_QUARTERS)
+    if pending_transcripts:
+        requests["qualitative"] = (build_transcripts_query(task), transcript_filter(corpus))
+    return requests
+
+@instrumented("retrieval")
+def retrieve_for_tools(task, vector_store, embeddings, corpus):
+    # One batched embedding pass and one store query per filter, shared by every tool.
+    requests = retrieval_requests(task, corpus)
+    if not requests:
+        return {}
+    chunks = retrieve_batch(vector_store, embeddings, list(requests.values()), corpus=corpus)
+    return dict(zip(requests, chunks))
+
+@instrumented("retrieval")
+async def aretrieve_for_tools(task, vector_store, embeddings, corpus):
+    requests = await asyncio.to_thread(retrieval_requests, task, corpus)
+    if not requests:
+        return {}
+    chunks = await aretrieve_batch(vector_store, embeddings, list(requests.values()), corpus=corpus)
+    return dict(zip(requests, chunks))
+
+@instrumented("forecast")
+def generate_forecast(task, ticker=None):
+    company = None
     try:
-        llm = get_llm()
-        vector_store = create_or_load_vector_store()
+        llm, company = registry.get(ticker)
+        vector_store = company.vector_store
+        chunks = retrieve_for_tools(task, vector_store, registry.embeddings, company.corpus)
 
         parallel_tools = RunnableParallel({
             "financials": RunnableLambda(
                 lambda inputs: extract_financials(
-                    task=inputs["task"], llm=llm, vector_store=vector_store)
+                    task=inputs["task"], llm=llm, vector_store=vector_store, embeddings=registry.embeddings,
+                    corpus=company.corpus)
             ),
             "qualitative": RunnableLambda(
                 lambda inputs: analyze_transcripts(
-                    task=inputs["task"], llm=llm, vector_store=vector_store)
+                    task=inputs["task"], llm=llm, vector_store=vector_store, chunks=chunks.get("qualitative"),
+                    corpus=company.corpus)
             ),
             "market": RunnableLambda(
-                lambda _: fetch_market_data()
+                lambda _: fetch_market_data(company.ticker)
             )
         })
 
         results = parallel_tools.invoke({"task": task})
+        return synthesize_validated(task, results, llm)
+    except (ForecastParseError, UnknownTickerError):
+        raise
+    except Exception as e:
+        logger.exception("Error generating forecast.")
+        raise RuntimeError("Error in generating forecast") from e
+    finally:
+        if company is not None:
+            company.release()
+
+async def aget_company(ticker):
+    # registry.get hands out a reference on the company store. If this task is cancelled while the
+    # store is still opening, the reference is released once the lookup finishes.
+    lookup = asyncio.ensure_future(asyncio.to_thread(registry.get, ticker))
+    try:
+        return await asyncio.shield(lookup)
+    except asyncio.CancelledError:
+        def release(done):
+            if not done.cancelled() and done.exception() is None:
+                done.result()[1].release()
+
+        lookup.add_done_callback(release)
+        raise
+
+def start_tools(task, llm, company, embeddings, market=None):
+    vector_store = company.vector_store
+    retrieval = asyncio.ensure_future(aretrieve_for_tools(task, vector_store, embeddings, company.corpus))
 
-        forecast = synthesize_forecast(
-            task=task,
-            financials=results["financials"],
-            qualitative=results["qualitative"],
-            market=results["market"],
-            llm=llm
-        )
-        return forecast
+    async def qualitative():
+        chunks = await retrieval
+        return await aanalyze_transcripts(
+            task=task, llm=llm, vector_store=vector_store, chunks=chunks.get("qualitative"), corpus=company.corpus)
+
+    async def market_data():
+        if market is not None:
+            return market
+        return await afetch_market_data(company.ticker)
+
+    return {
+        "financials": asyncio.ensure_future(
+            aextract_financials(
+                task=task, llm=llm, vector_store=vector_store, embeddings=embeddings, corpus=company.corpus)),
+        "qualitative": asyncio.ensure_future(qualitative()),
+        "market": asyncio.ensure_future(market_data()),
+    }
+
+def cancel_tools(tools):
+    for tool in tools.values():
+        tool.cancel()
+
+@instrumented("forecast")
+async def agenerate_forecast(task, market=None, ticker=None):
+    tools = {}
+    company = None
+    try:
+        llm, company = await aget_company(ticker)
+        tools = start_tools(task, llm, company, registry.embeddings, market)
+        results = dict(zip(tools, await asyncio.gather(*tools.values())))
+        return await asynthesize_validated(task, results, llm)
+    except (ForecastParseError, UnknownTickerError):
+        raise
     except Exception as e:
         logger.exception("Error generating forecast.")
         raise RuntimeError("Error in generating forecast") from e
+    finally:
+        cancel_tools(tools)
+        if company is not None:
+            company.release()
+
+async def astream_forecast(task, market=None, ticker=None):
+    # Yields each tool result as soon as it finishes, then the synthesis tokens, then the validated forecast.
+    tools = {}
+    company = None
+    try:
+        llm, company = await aget_company(ticker)
+        tools = start_tools(task, llm, company, registry.embeddings, market)
+        names = {tool: name for name, tool in tools.items()}
+        results = {}
+        pending = set(tools.values())
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for tool in done:
+                results[names[tool]] = tool.result()
+                yield {"event": "tool", "name": names[tool], "data": results[names[tool]]}
+
+        prompt = forecast_prompt(task, results["financials"], results["qualitative"], results["market"])
+        parts = []
+        start = time.perf_counter()
+        # JSON mode cannot be streamed on Groq, so the streamed text goes through the same
+        # repair and validation step (and retry) as the other paths.
+        async for chunk in llm.astream(prompt, config={"tags": ["stage:synthesis"]}):
+            if chunk.content:
+                parts.append(chunk.content)
+                yield {"event": "token", "data": chunk.content}
+        observe_stage("synthesis", time.perf_counter() - start)
+        forecast = await asynthesize_validated(task, results, llm, first_text="".join(parts).strip())
+        yield {"event": "forecast", "data": forecast}
+    except (ForecastParseError, UnknownTickerError):
+        raise
+    except Exception as e:
+        logger.exception("Error streaming forecast.")
+        raise RuntimeError("Error in generating forecast") from e
+    finally:
+        cancel_tools(tools)
+        if company is not None:
+            company.release()
+
+async def abatch_forecast(tasks, market=None, concurrency=FORECAST_BATCH_CONCURRENCY, ticker=None):
+    # Shares one registry lookup, one market snapshot and one retrieval pass across every task;
+    # only the per-task LLM calls remain, at most `concurrency` of them at a time.
+    start = time.perf_counter()
+    llm, company = await aget_company(ticker)
+    try:
+        return await _abatch_forecast(tasks, market, concurrency, llm, company, start)
+    finally:
+        company.release()
+
+async def _abatch_forecast(tasks, market, concurrency, llm, company, start):
+    vector_store, corpus = company.vector_store, company.corpus
+    if market is None:
+        market = await afetch_market_data(company.ticker)
+
+    _, pending_transcripts = await asyncio.to_thread(cached_summaries, corpus, RETRIEVAL_QUARTERS)
+    per_task = [retrieval_requests(task, corpus, pending_transcripts) for task in tasks]
+    flat = [(i, name, request) for i, requests in enumerate(per_task) for name, request in requests.items()]
+    chunks = [{} for _ in tasks]
+    if flat:
+        retrieved = await aretrieve_batch(vector_store, registry.embeddings, [request for _, _, request in flat], corpus=corpus)
+        for (i, name, _), docs in zip(flat, retrieved):
+            chunks[i][name] = docs
+    shared = {"retrieval_s": time.perf_counter() - start}
+
+    slots = asyncio.Semaphore(concurrency)
+
+    async def limited(coro):
+        async with slots:
+            return await coro
+
+    async def run(task, task_chunks):
+        task_start = time.perf_counter()
+        timings = {}
+        try:
+            financials, qualitative = await asyncio.gather(
+                limited(aextract_financials(
+                    task=task, llm=llm, vector_store=vector_store, embeddings=registry.embeddings, corpus=corpus)),
+                limited(aanalyze_transcripts(
+                    task=task, llm=llm, vector_store=vector_store, chunks=task_chunks.get("qualitative"), corpus=corpus)),
+            )
+            timings["tools_s"] = time.perf_counter() - task_start
+            synthesis_start = time.perf_counter()
+            results = {"financials": financials, "qualitative": qualitative, "market": market}
+            forecast = await limited(asynthesize_validated(task, results, llm))
+            timings["synthesis_s"] = time.perf_counter() - synthesis_start
+            return {"task": task, "forecast": forecast, "error": None, "timings": timings}
+        except Exception as e:
+            logger.error(f"Batch forecast task failed: {e}")
+            return {"task": task, "forecast": None, "error": str(e), "timings": timings}
+        finally:
+            timings["total_s"] = time.perf_counter() - task_start
+
+    results = await asyncio.gather(*(run(task, task_chunks) for task, task_chunks in zip(tasks, chunks)))
+    return results, shared
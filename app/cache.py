@@ -0,0 +1,191 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FORECAST_CACHE_BACKEND = os.getenv("FORECAST_CACHE_BACKEND", "memory")
+FORECAST_CACHE_PATH = os.getenv("FORECAST_CACHE_PATH", "./forecast_cache.sqlite")
+FORECAST_CACHE_TTL = float(os.getenv("FORECAST_CACHE_TTL", "21600"))
+FORECAST_CACHE_MAX_ENTRIES = int(os.getenv("FORECAST_CACHE_MAX_ENTRIES", "256"))
+FORECAST_CACHE_SEMANTIC_THRESHOLD = float(os.getenv("FORECAST_CACHE_SEMANTIC_THRESHOLD", "0"))
+
+HIT = "HIT"
+SEMANTIC_HIT = "SEMANTIC-HIT"
+MISS = "MISS"
+
+def normalize_task(task: str):
+    task = re.sub(r"\s+", " ", task.strip().lower())
+    return task.rstrip(".!? ")
+
+def make_key(task: str, ticker: str, corpus_version, market_snapshot):
+    raw = json.dumps([normalize_task(task), ticker, corpus_version, market_snapshot])
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+class MemoryBackend:
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            created_at, value = entry
+            if time.time() - created_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class SQLiteBackend:
+    # A local file shared by every uvicorn worker on the host.
+    def __init__(self, path: str, ttl: float, max_entries: int):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS forecast_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_forecast_cache_last_access ON forecast_cache (last_access)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key):
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value, created_at FROM forecast_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if now - created_at > self.ttl:
+                conn.execute("DELETE FROM forecast_cache WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE forecast_cache SET last_access = ? WHERE key = ?", (now, key))
+        return json.loads(value)
+
+    def set(self, key, value):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO forecast_cache (key, value, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now)
+            )
+            conn.execute("DELETE FROM forecast_cache WHERE created_at < ?", (now - self.ttl,))
+            conn.execute("""
+                DELETE FROM forecast_cache WHERE key IN (
+                    SELECT key FROM forecast_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM forecast_cache")
+
+class SemanticTier:
+    # Maps near-duplicate task wordings onto a previously cached key for the same company, corpus and market snapshot.
+    def __init__(self, threshold: float, max_entries: int):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, vector, scope):
+        vector = np.asarray(vector, dtype=np.float32)
+        vector /= np.linalg.norm(vector) or 1.0
+        best_key, best_score = None, self.threshold
+        with self._lock:
+            for key, (entry_scope, entry_vector) in self._entries.items():
+                if entry_scope != scope:
+                    continue
+                score = float(np.dot(vector, entry_vector))
+                if score >= best_score:
+                    best_key, best_score = key, score
+        return best_key
+
+    def add(self, key, vector, scope):
+        vector = np.asarray(vector, dtype=np.float32)
+        vector /= np.linalg.norm(vector) or 1.0
+        with self._lock:
+            self._entries[key] = (scope, vector)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+class ForecastCache:
+    def __init__(self, backend, semantic=None):
+        self.backend = backend
+        self.semantic = semantic
+
+    def get(self, task, ticker, corpus_version, market_snapshot, embed=None):
+        key = make_key(task, ticker, corpus_version, market_snapshot)
+        value = self.backend.get(key)
+        if value is not None:
+            return key, value, HIT
+        if self.semantic is not None and embed is not None:
+            similar_key = self.semantic.lookup(embed(normalize_task(task)), (ticker, corpus_version, market_snapshot))
+            if similar_key is not None:
+                value = self.backend.get(similar_key)
+                if value is not None:
+                    return key, value, SEMANTIC_HIT
+        return key, None, MISS
+
+    def set(self, key, task, ticker, corpus_version, market_snapshot, value, embed=None):
+        self.backend.set(key, value)
+        if self.semantic is not None and embed is not None:
+            self.semantic.add(key, embed(normalize_task(task)), (ticker, corpus_version, market_snapshot))
+
+    def clear(self):
+        self.backend.clear()
+
+def build_forecast_cache():
+    if FORECAST_CACHE_BACKEND == "off":
+        return None
+    if FORECAST_CACHE_BACKEND == "sqlite":
+        backend = SQLiteBackend(FORECAST_CACHE_PATH, FORECAST_CACHE_TTL, FORECAST_CACHE_MAX_ENTRIES)
+    elif FORECAST_CACHE_BACKEND == "memory":
+        backend = MemoryBackend(FORECAST_CACHE_TTL, FORECAST_CACHE_MAX_ENTRIES)
+    else:
+        raise ValueError(f"Unknown FORECAST_CACHE_BACKEND: {FORECAST_CACHE_BACKEND}")
+    semantic = None
+    if FORECAST_CACHE_SEMANTIC_THRESHOLD > 0:
+        semantic = SemanticTier(FORECAST_CACHE_SEMANTIC_THRESHOLD, FORECAST_CACHE_MAX_ENTRIES)
+    logger.info(f"Forecast cache enabled: backend={FORECAST_CACHE_BACKEND}, ttl={FORECAST_CACHE_TTL}s, semantic={semantic is not None}")
+    return ForecastCache(backend, semantic)
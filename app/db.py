@@ -1,90 +1,324 @@
+import base64
 import json
-import mysql.connector
 import os
 import logging
+import queue
+import threading
+import time
 from datetime import datetime, timezone
-from mysql.connector import Error, pooling
+from app.metrics import instrumented
 
 logger = logging.getLogger(__name__)
 
-try:
-    dbconfig = {
-        "host": os.getenv("DB_HOST"),
-        "user": os.getenv("DB_USER"),
-        "password": os.getenv("DB_PASSWORD"),
-        "database": os.getenv("DB_NAME"),
-        "pool_name": "mypool",
-        "pool_size": 5,
-    }
-    connection_pool = mysql.connector.pooling.MySQLConnectionPool(**dbconfig)
-except Error as err:
-    logger.error(f"Error creating connection pool: {err}")
-    connection_pool = None
+connection_pool = None
+_pool_attempted = False
+_pool_lock = threading.Lock()
 
-def log_request_response(request_id: str, request_data: dict, response_data: dict):
-    if connection_pool is None:
+def get_pool():
+    # Created once on first use, normally by init_db at startup, so importing the app opens no connections.
+    global connection_pool, _pool_attempted
+    with _pool_lock:
+        if connection_pool is None and not _pool_attempted:
+            _pool_attempted = True
+            from mysql.connector import Error, pooling
+
+            dbconfig = {
+                "host": os.getenv("DB_HOST"),
+                "user": os.getenv("DB_USER"),
+                "password": os.getenv("DB_PASSWORD"),
+                "database": os.getenv("DB_NAME"),
+                "pool_name": "mypool",
+                "pool_size": 5,
+            }
+            try:
+                connection_pool = pooling.MySQLConnectionPool(**dbconfig)
+            except Error as err:
+                logger.error(f"Error creating connection pool: {err}")
+        return connection_pool
+
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "1000"))
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "50"))
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", "1.0"))
+
+INSERT_LOG = """
+    INSERT INTO forecast_logs (request_id, request_data, response_data, confidence_level, timestamp)
+    VALUES (%s, %s, %s, %s, %s)
+"""
+
+SCHEMA_MIGRATIONS = [
+    ("column", "confidence_level", "ALTER TABLE forecast_logs ADD COLUMN confidence_level VARCHAR(16) NULL"),
+    ("json", "request_data", "ALTER TABLE forecast_logs MODIFY request_data JSON NOT NULL"),
+    ("json", "response_data", "ALTER TABLE forecast_logs MODIFY response_data JSON NOT NULL"),
+    ("index", "idx_forecast_logs_timestamp", "CREATE INDEX idx_forecast_logs_timestamp ON forecast_logs (timestamp, id)"),
+    ("index", "idx_forecast_logs_request_id", "CREATE INDEX idx_forecast_logs_request_id ON forecast_logs (request_id)"),
+    ("index", "idx_forecast_logs_confidence", "CREATE INDEX idx_forecast_logs_confidence ON forecast_logs (confidence_level, timestamp, id)"),
+]
+
+def _migrate(cursor):
+    # Brings tables created by older versions (TEXT payloads, no indexes) up to the current schema.
+    cursor.execute("""
+        SELECT COLUMN_NAME, DATA_TYPE FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'forecast_logs'
+    """)
+    columns = {name.lower(): data_type.lower() for name, data_type in cursor.fetchall()}
+    cursor.execute("""
+        SELECT DISTINCT INDEX_NAME FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'forecast_logs'
+    """)
+    indexes = {row[0].lower() for row in cursor.fetchall()}
+
+    for kind, name, statement in SCHEMA_MIGRATIONS:
+        if kind == "column" and name in columns:
+            continue
+        if kind == "json" and columns.get(name) == "json":
+            continue
+        if kind == "index" and name in indexes:
+            continue
+        logger.info(f"Migrating forecast_logs: {statement}")
+        cursor.execute(statement)
+        if name == "confidence_level":
+            cursor.execute("""
+                UPDATE forecast_logs
+                SET confidence_level = LOWER(JSON_UNQUOTE(JSON_EXTRACT(response_data, '$.overall_forecast.confidence_level')))
+                WHERE confidence_level IS NULL AND JSON_VALID(response_data)
+            """)
+
+def init_db():
+    # One-time schema setup at startup instead of on every logged request.
+    pool = get_pool()
+    if pool is None:
         logger.error("No database connection pool available.")
-        return
+        return False
+    from mysql.connector import Error
 
+    conn = cursor = None
     try:
-        conn = connection_pool.get_connection()
+        conn = pool.get_connection()
         cursor = conn.cursor()
-
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS forecast_logs (
                 id INT AUTO_INCREMENT PRIMARY KEY,
                 request_id VARCHAR(255) NOT NULL,
-                request_data TEXT NOT NULL,
-                response_data TEXT NOT NULL,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                request_data JSON NOT NULL,
+                response_data JSON NOT NULL,
+                confidence_level VARCHAR(16) NULL,
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                INDEX idx_forecast_logs_timestamp (timestamp, id),
+                INDEX idx_forecast_logs_request_id (request_id),
+                INDEX idx_forecast_logs_confidence (confidence_level, timestamp, id)
             )
         """)
+        _migrate(cursor)
         conn.commit()
-
-        cursor.execute("""
-            INSERT INTO forecast_logs (request_id, request_data, response_data, timestamp)
-            VALUES (%s, %s, %s, %s)
-        """, (
-            request_id,
-            json.dumps(request_data),
-            json.dumps(response_data),
-            datetime.now(timezone.utc)
-        ))
-        conn.commit()
-
-        cursor.execute("SELECT * FROM forecast_logs WHERE request_id = %s", (request_id,))
-        result = cursor.fetchall()
-        logger.info(f"Logged record with request_id {request_id}: {result}")
-
+        return True
     except Error as err:
-        logger.error(f"Database error while logging request/response: {err}")
-
-    except Exception as e:
-        logger.error(f"Unexpected error in log_request_response: {e}")
-
+        logger.error(f"Database error while initializing schema: {err}")
+        return False
     finally:
         if cursor:
             cursor.close()
         if conn:
             conn.close()
 
-def fetch_recent_logs(limit=20):
-    if connection_pool is None:
+_STOP = object()
+
+class LogWriter:
+    # Drains queued log records on a background thread and inserts them in batches.
+    def __init__(self, queue_size: int, batch_size: int, flush_interval: float):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._lock = threading.Lock()
+        # Counters are bumped from request threads and the writer thread alike.
+        self._counts_lock = threading.Lock()
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        # Everything queued before the sentinel is flushed before the thread exits.
+        self._queue.put(_STOP)
+        thread.join(timeout)
+
+    def enqueue(self, record):
+        self.start()
+        try:
+            self._queue.put_nowait(record)
+            self._count(enqueued=1)
+        except queue.Full:
+            self._count(dropped=1)
+            logger.error(f"Log queue full ({self._queue.maxsize}), dropped record {record[0]}")
+
+    def _count(self, **deltas):
+        with self._counts_lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    def status(self):
+        with self._counts_lock:
+            counts = {name: getattr(self, name) for name in ("enqueued", "written", "dropped", "failed", "batches")}
+        return {"queue_depth": self._queue.qsize(), "queue_size": self._queue.maxsize, **counts}
+
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = self.flush_interval if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                record = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                record = None
+            if record is _STOP:
+                self._flush(batch)
+                return
+            if record is not None:
+                batch.append(record)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self._flush(batch)
+                batch, deadline = [], None
+
+    @instrumented("log_write")
+    def _flush(self, batch):
+        if not batch:
+            return
+        pool = get_pool()
+        if pool is None:
+            self._count(failed=len(batch))
+            logger.error(f"No database connection pool available, {len(batch)} log records lost.")
+            return
+        from mysql.connector import Error
+
+        conn = cursor = None
+        try:
+            conn = pool.get_connection()
+            cursor = conn.cursor()
+            cursor.executemany(INSERT_LOG, batch)
+            conn.commit()
+            self._count(written=len(batch), batches=1)
+            logger.info(f"Logged {len(batch)} forecast records")
+        except Error as err:
+            self._count(failed=len(batch))
+            logger.error(f"Database error while logging request/response batch: {err}")
+        except Exception as e:
+            self._count(failed=len(batch))
+            logger.error(f"Unexpected error in log writer: {e}")
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close()
+
+log_writer = LogWriter(LOG_QUEUE_SIZE, LOG_BATCH_SIZE, LOG_FLUSH_INTERVAL)
+
+def confidence_of(response_data):
+    overall = response_data.get("overall_forecast") if isinstance(response_data, dict) else None
+    level = overall.get("confidence_level") if isinstance(overall, dict) else None
+    return str(level).strip().lower()[:16] if level else None
+
+@instrumented("log_enqueue")
+def log_request_response(request_id: str, request_data: dict, response_data: dict):
+    log_writer.enqueue((
+        request_id,
+        json.dumps(request_data),
+        json.dumps(response_data),
+        confidence_of(response_data),
+        datetime.now(timezone.utc)
+    ))
+
+LOGS_EXPORT_BATCH = int(os.getenv("LOGS_EXPORT_BATCH", "500"))
+
+def encode_cursor(row):
+    raw = f"{row['timestamp'].isoformat()}|{row['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str):
+    try:
+        timestamp, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except Exception:
+        raise ValueError("Invalid logs cursor")
+
+def _payload(value):
+    return json.loads(value) if isinstance(value, (str, bytes, bytearray)) else value
+
+def _format_log(row):
+    return {
+        "id": row["id"],
+        "request_id": row["request_id"],
+        "timestamp": row["timestamp"].isoformat(),
+        "confidence_level": row["confidence_level"],
+        "request_data": _payload(row["request_data"]),
+        "response_data": _payload(row["response_data"]),
+    }
+
+def fetch_logs(limit=20, cursor=None, since=None, until=None, confidence_level=None, request_id=None):
+    # Keyset pagination over (timestamp, id), newest first; the cursor is the last row of the previous page.
+    pool = get_pool()
+    if pool is None:
         logger.error("No database connection pool available.")
-        return []
+        return [], None
+    from mysql.connector import Error
+
+    clauses, params = [], []
+    if cursor:
+        timestamp, row_id = decode_cursor(cursor)
+        clauses.append("(timestamp < %s OR (timestamp = %s AND id < %s))")
+        params += [timestamp, timestamp, row_id]
+    if since is not None:
+        clauses.append("timestamp >= %s")
+        params.append(since)
+    if until is not None:
+        clauses.append("timestamp < %s")
+        params.append(until)
+    if confidence_level:
+        clauses.append("confidence_level = %s")
+        params.append(confidence_level.lower())
+    if request_id:
+        clauses.append("request_id = %s")
+        params.append(request_id)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+    conn = db_cursor = None
     try:
-        conn = connection_pool.get_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute(
-            "SELECT timestamp, request_data, response_data FROM forecast_logs ORDER BY timestamp DESC LIMIT %s", (limit,)
-        )
-        logs = cursor.fetchall()
-        return logs
-    except Exception as e:
-        logger.error(f"Error fetching logs: {e}")
-        return []
+        conn = pool.get_connection()
+        db_cursor = conn.cursor(dictionary=True)
+        db_cursor.execute(f"""
+            SELECT id, request_id, timestamp, confidence_level, request_data, response_data
+            FROM forecast_logs {where}
+            ORDER BY timestamp DESC, id DESC
+            LIMIT %s
+        """, (*params, limit + 1))
+        rows = db_cursor.fetchall()
+    except Error as err:
+        logger.error(f"Error fetching logs: {err}")
+        return [], None
     finally:
-        if cursor:
-            cursor.close()
+        if db_cursor:
+            db_cursor.close()
         if conn:
             conn.close()
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return [_format_log(row) for row in rows[:limit]], next_cursor
+
+def iter_logs(**filters):
+    cursor = None
+    while True:
+        logs, cursor = fetch_logs(limit=LOGS_EXPORT_BATCH, cursor=cursor, **filters)
+        yield from logs
+        if cursor is None:
+            return
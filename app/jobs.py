@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import os
+import re
+import time
+import uuid
+from datetime import datetime, timezone
+from app.cache import normalize_task
+
+logger = logging.getLogger(__name__)
+
+FORECAST_JOB_WORKERS = int(os.getenv("FORECAST_JOB_WORKERS", "4"))
+FORECAST_JOB_QUEUE_SIZE = int(os.getenv("FORECAST_JOB_QUEUE_SIZE", "32"))
+FORECAST_JOB_RETENTION = float(os.getenv("FORECAST_JOB_RETENTION", "3600"))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+class QueueFullError(Exception):
+    pass
+
+class Job:
+    def __init__(self, task: str, ticker: str):
+        self.id = uuid.uuid4().hex
+        self.task = task
+        self.ticker = ticker
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.subscribers = 1
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "task": self.task,
+            "ticker": self.ticker,
+            "subscribers": self.subscribers,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error,
+        }
+
+JOB_ID = re.compile(r"[0-9a-f]{32}")
+
+def job_from_log(entry):
+    # A finished job rebuilt from its forecast_logs row, for polls that arrive after it left memory
+    # (retention expired, a restart, or another worker process).
+    response = entry["response_data"] or {}
+    failed = isinstance(response, dict) and response.get("status") == FAILED and "error" in response
+    timestamp = datetime.fromisoformat(entry["timestamp"])
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    request = entry["request_data"] or {}
+    return {
+        "job_id": entry["request_id"],
+        "status": FAILED if failed else DONE,
+        "task": request.get("task"),
+        "ticker": request.get("ticker"),
+        "subscribers": None,
+        "created_at": None,
+        "started_at": None,
+        "finished_at": timestamp.timestamp(),
+        "result": None if failed else response,
+        "error": response["error"] if failed else None,
+    }
+
+class JobManager:
+    # Bounded queue drained by a fixed set of worker tasks; identical in-flight tasks share one job.
+    def __init__(self, run, workers: int, queue_size: int, retention: float):
+        self.run = run
+        self.workers = workers
+        self.queue_size = queue_size
+        self.retention = retention
+        self._queue = None
+        self._worker_tasks = []
+        self._jobs = {}
+        self._in_flight = {}
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._worker_tasks = [
+            asyncio.create_task(self._worker(), name=f"forecast-job-{i}") for i in range(self.workers)
+        ]
+        logger.info(f"Forecast job queue started: workers={self.workers}, queue_size={self.queue_size}")
+
+    async def stop(self):
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+
+    def submit(self, task: str, ticker: str):
+        key = (ticker, normalize_task(task))
+        job = self._in_flight.get(key)
+        if job is not None:
+            job.subscribers += 1
+            logger.info(f"Coalesced forecast task onto in-flight job {job.id} ({job.subscribers} subscribers)")
+            return job, True
+
+        self._prune()
+        job = Job(task, ticker)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFullError(f"Forecast job queue is full ({self.queue_size} waiting)")
+        self._jobs[job.id] = job
+        self._in_flight[key] = job
+        return job, False
+
+    def get(self, job_id: str):
+        return self._jobs.get(job_id)
+
+    def status(self):
+        return {
+            "workers": len(self._worker_tasks),
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "queue_size": self.queue_size,
+            "in_flight": len(self._in_flight),
+            "jobs": len(self._jobs),
+        }
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        for job_id, job in list(self._jobs.items()):
+            if job.finished_at is not None and job.finished_at < cutoff:
+                del self._jobs[job_id]
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            job.status = RUNNING
+            job.started_at = time.time()
+            try:
+                job.result = await self.run(job)
+                job.status = DONE
+            except Exception as e:
+                logger.error(f"Forecast job {job.id} failed: {e}")
+                job.error = str(e)
+                job.status = FAILED
+            finally:
+                job.finished_at = time.time()
+                self._in_flight.pop((job.ticker, normalize_task(job.task)), None)
+                self._queue.task_done()
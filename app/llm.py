@@ -0,0 +1,294 @@
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, List, Optional
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+from app.tools.context_packer import estimate_tokens
+from app.metrics import LLMUsageCallback, current_stage
+from app.llm_gateway import GATEWAY_RETRIES, GATEWAY_WAIT_SECONDS, SYNTHESIS_PRIORITY, TOOL_PRIORITY, get_gateway, retry_status
+
+logger = logging.getLogger(__name__)
+
+FAKE_FORECAST = {
+    "trends": {
+        "revenue_growth": "5.4% YoY in constant currency",
+        "operating_margin": "24.5%, up 40 bps sequentially",
+        "cost_increase": "Employee costs up 2% on wage revisions"
+    },
+    "management_outlook": {
+        "sentiment": "cautiously optimistic",
+        "forward_guidance": [
+            "Expect demand recovery in BFSI over the next two quarters",
+            "Target operating margin band of 26-28%"
+        ]
+    },
+    "risks": [
+        {"risk": "Discretionary spend cuts in North America", "impact": "medium"},
+        {"risk": "Currency volatility", "impact": "low"}
+    ],
+    "opportunities": [
+        {"opportunity": "Large cost-takeout and vendor consolidation deals", "benefit": "steadier order book"},
+        {"opportunity": "GenAI services demand", "benefit": "new revenue streams"}
+    ],
+    "assumptions": [
+        "Stable exchange rates",
+        "No major change in client budgets"
+    ],
+    "overall_forecast": {
+        "summary": "Modest sequential revenue growth with stable margins, supported by a strong deal pipeline.",
+        "confidence_level": "medium"
+    }
+}
+FAKE_ANALYSIS = (
+    "Revenue grew modestly quarter on quarter with operating margin holding near 24-25%. "
+    "Management sounded cautiously optimistic, citing a healthy deal pipeline, steady BFSI demand and "
+    "continued investment in AI capabilities, while flagging discretionary spend cuts and currency volatility as risks."
+)
+KEYS_PATTERN = re.compile(r"JSON object with (?:exactly these |the )?keys: ([^.]+)\.")
+
+class FakeForecastLLM(BaseChatModel):
+    # Offline stand-in for benchmarks: canned, schema-valid outputs with lognormal time-to-first-token
+    # and a fixed output token rate. The latency sequence is reproducible for a given seed.
+    latency_ms: float = 400
+    latency_sigma: float = 0.35
+    tokens_per_second: float = 250
+    seed: int = 0
+    _rng: Any = PrivateAttr(default=None)
+    _rng_lock: Any = PrivateAttr(default=None)
+
+    def model_post_init(self, __context):
+        self._rng = random.Random(self.seed)
+        self._rng_lock = threading.Lock()
+
+    @property
+    def _llm_type(self):
+        return "fake-forecast"
+
+    def respond(self, prompt: str):
+        if '"overall_forecast"' in prompt:
+            return json.dumps(FAKE_FORECAST, indent=2)
+        keys = KEYS_PATTERN.search(prompt)
+        if keys:
+            fields = [key.strip() for key in keys.group(1).split(",") if key.strip()]
+            return json.dumps({field: ["N/A"] if "statements" in field or "themes" in field else "N/A" for field in fields})
+        return FAKE_ANALYSIS
+
+    def delays(self, output: str):
+        with self._rng_lock:
+            first_token = self._rng.lognormvariate(math.log(self.latency_ms / 1000), self.latency_sigma)
+        return first_token, estimate_tokens(output) / self.tokens_per_second
+
+    def _message(self, prompt: str, output: str):
+        usage = {"input_tokens": estimate_tokens(prompt), "output_tokens": estimate_tokens(output)}
+        usage["total_tokens"] = usage["input_tokens"] + usage["output_tokens"]
+        return AIMessage(content=output, usage_metadata=usage, response_metadata={"model_name": self._llm_type})
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs):
+        prompt = "\n".join(str(message.content) for message in messages)
+        output = self.respond(prompt)
+        first_token, generation = self.delays(output)
+        time.sleep(first_token + generation)
+        return ChatResult(generations=[ChatGeneration(message=self._message(prompt, output))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs):
+        prompt = "\n".join(str(message.content) for message in messages)
+        output = self.respond(prompt)
+        first_token, generation = self.delays(output)
+        await asyncio.sleep(first_token + generation)
+        return ChatResult(generations=[ChatGeneration(message=self._message(prompt, output))])
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs):
+        prompt = "\n".join(str(message.content) for message in messages)
+        output = self.respond(prompt)
+        first_token, _ = self.delays(output)
+        await asyncio.sleep(first_token)
+        pieces = re.findall(r"\S+\s*|\s+", output)
+        for piece in pieces:
+            await asyncio.sleep(estimate_tokens(piece) / self.tokens_per_second)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=piece))
+            if run_manager:
+                await run_manager.on_llm_new_token(piece, chunk=chunk)
+            yield chunk
+
+def _used_tokens(result):
+    usage = getattr(result.generations[0].message, "usage_metadata", None) if result.generations else None
+    return usage.get("total_tokens") if usage else None
+
+class GatewayChatModel(BaseChatModel):
+    # Wraps a provider chat model so every call goes through the process-wide gateway.
+    inner: BaseChatModel
+    gateway: Any
+
+    @property
+    def _llm_type(self):
+        return f"gateway-{self.inner._llm_type}"
+
+    def _priority(self, run_manager):
+        tags = run_manager.tags if run_manager else []
+        synthesis = current_stage.get() == "synthesis" or "stage:synthesis" in (tags or [])
+        return SYNTHESIS_PRIORITY if synthesis else TOOL_PRIORITY
+
+    def _prompt_tokens(self, messages):
+        return sum(estimate_tokens(str(message.content)) for message in messages)
+
+    def _estimate(self, messages, kwargs):
+        completion = kwargs.get("max_tokens") or getattr(self.inner, "max_tokens", None) or self.gateway.expected_completion_tokens
+        return self._prompt_tokens(messages) + completion
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs):
+        priority = self._priority(run_manager)
+        reserved = self._estimate(messages, kwargs)
+        start = time.perf_counter()
+        self.gateway.slots.acquire_sync(priority)
+        try:
+            time.sleep(self.gateway.reserve(reserved))
+            GATEWAY_WAIT_SECONDS.observe(time.perf_counter() - start, priority=priority)
+            for attempt in range(self.gateway.max_retries + 1):
+                # Each attempt settles its own reservation; a failed or cancelled call is refunded.
+                used = 0
+                try:
+                    result = self.inner._generate(messages, stop=stop, **kwargs)
+                    used = _used_tokens(result)
+                    return result
+                except Exception as e:
+                    status = retry_status(e)
+                    if status is None or attempt == self.gateway.max_retries:
+                        raise
+                    delay = self.gateway.backoff(attempt, e)
+                    GATEWAY_RETRIES.inc(status=status)
+                    logger.warning(f"LLM call failed with {status}, retry {attempt + 1} in {delay:.2f}s")
+                finally:
+                    self.gateway.settle(reserved, used)
+                time.sleep(max(delay, self.gateway.reserve(reserved)))
+        finally:
+            self.gateway.slots.release()
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs):
+        priority = self._priority(run_manager)
+        reserved = self._estimate(messages, kwargs)
+        start = time.perf_counter()
+        await self.gateway.slots.acquire(priority)
+        try:
+            await asyncio.sleep(self.gateway.reserve(reserved))
+            GATEWAY_WAIT_SECONDS.observe(time.perf_counter() - start, priority=priority)
+            for attempt in range(self.gateway.max_retries + 1):
+                used = 0
+                try:
+                    result = await self.inner._agenerate(messages, stop=stop, **kwargs)
+                    used = _used_tokens(result)
+                    return result
+                except Exception as e:
+                    status = retry_status(e)
+                    if status is None or attempt == self.gateway.max_retries:
+                        raise
+                    delay = self.gateway.backoff(attempt, e)
+                    GATEWAY_RETRIES.inc(status=status)
+                    logger.warning(f"LLM call failed with {status}, retry {attempt + 1} in {delay:.2f}s")
+                finally:
+                    self.gateway.settle(reserved, used)
+                await asyncio.sleep(max(delay, self.gateway.reserve(reserved)))
+        finally:
+            self.gateway.slots.release()
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs):
+        priority = self._priority(run_manager)
+        reserved = self._estimate(messages, kwargs)
+        start = time.perf_counter()
+        await self.gateway.slots.acquire(priority)
+        try:
+            await asyncio.sleep(self.gateway.reserve(reserved))
+            GATEWAY_WAIT_SECONDS.observe(time.perf_counter() - start, priority=priority)
+            for attempt in range(self.gateway.max_retries + 1):
+                # Settled with the reported usage, or the prompt plus the text streamed so far when the
+                # stream ends early, fails or the consumer stops reading.
+                started = False
+                used, reported = 0, None
+                try:
+                    async for chunk in self.inner._astream(messages, stop=stop, **kwargs):
+                        if not started:
+                            started = True
+                            used = self._prompt_tokens(messages)
+                        used += estimate_tokens(chunk.text)
+                        usage = getattr(chunk.message, "usage_metadata", None)
+                        if usage and usage.get("total_tokens"):
+                            reported = usage["total_tokens"]
+                        if run_manager:
+                            await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                        yield chunk
+                    return
+                except Exception as e:
+                    # Once tokens have reached the caller the call cannot be replayed.
+                    status = retry_status(e)
+                    if started or status is None or attempt == self.gateway.max_retries:
+                        raise
+                    delay = self.gateway.backoff(attempt, e)
+                    GATEWAY_RETRIES.inc(status=status)
+                    logger.warning(f"LLM stream failed with {status}, retry {attempt + 1} in {delay:.2f}s")
+                finally:
+                    self.gateway.settle(reserved, reported or used)
+                await asyncio.sleep(max(delay, self.gateway.reserve(reserved)))
+        finally:
+            self.gateway.slots.release()
+
+# Settings are read when the client is built so values loaded from .env at startup apply.
+def build_groq_llm():
+    from langchain_groq import ChatGroq
+
+    api_key = os.getenv("GROQ_API_KEY")
+    if not api_key:
+        raise EnvironmentError("Missing GROQ_API_KEY in environment variables.")
+    # Retries are left to the gateway, which knows about the shared rate budget.
+    return ChatGroq(
+        model=os.getenv("MODEL_NAME", "llama-3.3-70b-versatile"),
+        api_key=api_key,
+        base_url=os.getenv("GROQ_BASE_URL") or os.getenv("GROQ_API_BASE"),
+        temperature=0.1,
+        max_tokens=1000,
+        max_retries=0
+    )
+
+def build_fake_llm():
+    return FakeForecastLLM(
+        latency_ms=float(os.getenv("FAKE_LLM_LATENCY_MS", "400")),
+        latency_sigma=float(os.getenv("FAKE_LLM_LATENCY_SIGMA", "0.35")),
+        tokens_per_second=float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "250")),
+        seed=int(os.getenv("FAKE_LLM_SEED", "0"))
+    )
+
+LLM_PROVIDERS = {
+    "groq": build_groq_llm,
+    "fake": build_fake_llm,
+}
+
+def get_llm(provider: Optional[str] = None):
+    provider = provider or os.getenv("LLM_PROVIDER", "groq")
+    if provider not in LLM_PROVIDERS:
+        raise ValueError(f"Unknown LLM_PROVIDER: {provider}")
+    try:
+        llm = LLM_PROVIDERS[provider]()
+    except EnvironmentError:
+        raise
+    except Exception as e:
+        logger.error("Failed to initialize LLM: %s", str(e))
+        raise RuntimeError("LLM Initialization failed") from e
+    if os.getenv("LLM_GATEWAY", "true").lower() == "true":
+        llm = GatewayChatModel(inner=llm, gateway=get_gateway())
+    llm.callbacks = [*(llm.callbacks or []), LLMUsageCallback()]
+    logger.info(f"LLM provider: {provider}")
+    return llm
@@ -0,0 +1,173 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+from typing import Optional
+from app.metrics import Counter, Histogram, register
+
+logger = logging.getLogger(__name__)
+
+SYNTHESIS_PRIORITY = 0
+TOOL_PRIORITY = 1
+
+GATEWAY_WAIT_SECONDS = register(Histogram("forecast_llm_gateway_wait_seconds", "Time LLM calls waited for a slot and rate budget.", ["priority"]))
+GATEWAY_RETRIES = register(Counter("forecast_llm_gateway_retries_total", "LLM calls retried after a rate-limit or server error.", ["status"]))
+
+class TokenBucket:
+    # Callers reserve up front and may drive the balance negative; the deficit is how long they must wait.
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= min(amount, self.capacity)
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def refund(self, amount: float):
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+class _Waiter:
+    def __init__(self, priority, wake):
+        self.priority = priority
+        self.wake = wake
+        self.cancelled = False
+
+class PrioritySlots:
+    # A semaphore that hands freed slots to the highest-priority waiter, for async and sync callers alike.
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_use = 0
+        self._waiters = []
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+
+    def _enqueue(self, priority, wake):
+        with self._lock:
+            if self.in_use < self.limit and not self._waiters:
+                self.in_use += 1
+                return None
+            waiter = _Waiter(priority, wake)
+            heapq.heappush(self._waiters, (priority, next(self._order), waiter))
+            return waiter
+
+    def release(self):
+        with self._lock:
+            while self._waiters:
+                _, _, waiter = heapq.heappop(self._waiters)
+                if not waiter.cancelled:
+                    waiter.wake()
+                    return
+            self.in_use -= 1
+
+    async def acquire(self, priority: int):
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def on_grant():
+            # The slot is ours now; hand it on if the caller stopped waiting meanwhile.
+            if granted.cancelled():
+                self.release()
+            else:
+                granted.set_result(None)
+
+        waiter = self._enqueue(priority, lambda: loop.call_soon_threadsafe(on_grant))
+        if waiter is None:
+            return
+        try:
+            await granted
+        except asyncio.CancelledError:
+            with self._lock:
+                waiter.cancelled = True
+            if granted.done() and not granted.cancelled():
+                # Granted just before the cancellation reached us: the slot is ours to give back.
+                self.release()
+            raise
+
+    def acquire_sync(self, priority: int):
+        granted = threading.Event()
+        if self._enqueue(priority, granted.set) is not None:
+            granted.wait()
+
+    def status(self):
+        with self._lock:
+            waiting = sum(1 for _, _, waiter in self._waiters if not waiter.cancelled)
+            return {"in_flight": self.in_use, "waiting": waiting, "max_in_flight": self.limit}
+
+def retry_status(error):
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if status == 429 or (status is not None and status >= 500):
+        return status
+    if type(error).__name__ in ("APIConnectionError", "APITimeoutError"):
+        return "connection"
+    return None
+
+def retry_after(error):
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+class LLMGateway:
+    def __init__(self, rpm: float, tpm: float, max_in_flight: int, max_retries: int,
+                 backoff_base: float, backoff_max: float, expected_completion_tokens: int):
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.slots = PrioritySlots(max_in_flight)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.expected_completion_tokens = expected_completion_tokens
+
+    def reserve(self, tokens: int):
+        waits = [0.0]
+        if self.requests is not None:
+            waits.append(self.requests.reserve(1))
+        if self.tokens is not None:
+            waits.append(self.tokens.reserve(tokens))
+        return max(waits)
+
+    def settle(self, reserved: int, used: Optional[int]):
+        if self.tokens is not None and used is not None:
+            self.tokens.refund(reserved - used)
+
+    def backoff(self, attempt: int, error):
+        delay = retry_after(error)
+        if delay is None:
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        return delay
+
+    def status(self):
+        return self.slots.status()
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+def get_gateway():
+    # One gateway per process, so every LLM client shares the same budgets and slots.
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = LLMGateway(
+                rpm=float(os.getenv("LLM_RPM", "0")),
+                tpm=float(os.getenv("LLM_TPM", "0")),
+                max_in_flight=int(os.getenv("LLM_MAX_IN_FLIGHT", "8")),
+                max_retries=int(os.getenv("LLM_MAX_RETRIES", "4")),
+                backoff_base=float(os.getenv("LLM_BACKOFF_BASE", "0.5")),
+                backoff_max=float(os.getenv("LLM_BACKOFF_MAX", "20")),
+                expected_completion_tokens=int(os.getenv("LLM_EXPECTED_COMPLETION_TOKENS", "600")),
+            )
+            logger.info(f"LLM gateway: rpm={os.getenv('LLM_RPM', '0')}, tpm={os.getenv('LLM_TPM', '0')}, max_in_flight={_gateway.slots.limit}")
+        return _gateway
@@ -4,13 +4,17 @@ import os
 LOG_DIR = "logs"
 LOG_FILE = "app.log"
 
-os.makedirs(LOG_DIR, exist_ok=True)
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
-    handlers=[
-        logging.FileHandler(os.path.join(LOG_DIR, LOG_FILE)),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger("forecast-app")
+
+def configure_logging():
+    # Called from the server's startup hook, so importing the app never creates the log directory.
+    # A no-op once the root logger has handlers.
+    os.makedirs(LOG_DIR, exist_ok=True)
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+        handlers=[
+            logging.FileHandler(os.path.join(LOG_DIR, LOG_FILE)),
+            logging.StreamHandler()
+        ]
+    )
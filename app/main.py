@@ -1,39 +1,155 @@
+import asyncio
 import json
-import re
 import uuid
 import logging
-from fastapi import FastAPI, Request, HTTPException
+import warnings
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Optional
+from fastapi import FastAPI, Query, Request, Response, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, Field, ValidationError
-from app.agent import generate_forecast
-from app.db import log_request_response, fetch_recent_logs
+from app.agent import abatch_forecast, agenerate_forecast, astream_forecast
+from app.metrics import REQUEST_SECONDS, Gauge, instrumented, record_stage, register, render_metrics, stage_timings
+from app.cache import build_forecast_cache
+from app.tools.market_data import aget_market_snapshot
+from app.tools.vectorstore import DEFAULT_TICKER, UnknownTickerError, get_corpus, list_tickers
+from app.schemas import ForecastParseError
+from app.db import fetch_logs, init_db, iter_logs, log_request_response, log_writer
+from app.jobs import FAILED, FORECAST_JOB_QUEUE_SIZE, FORECAST_JOB_RETENTION, FORECAST_JOB_WORKERS, JOB_ID, JobManager, QueueFullError, job_from_log
+from app.llm_gateway import get_gateway
+from app.logger_config import configure_logging
+from app.registry import registry
 import os
-
-app = FastAPI()
+import time
 
 logger = logging.getLogger(__name__)
 
+FORECAST_CONCURRENCY = int(os.getenv("FORECAST_CONCURRENCY", "8"))
+FORECAST_QUEUE_TIMEOUT = float(os.getenv("FORECAST_QUEUE_TIMEOUT", "30"))
+FORECAST_BATCH_MAX_TASKS = int(os.getenv("FORECAST_BATCH_MAX_TASKS", "20"))
+SERVER_TIMING = os.getenv("SERVER_TIMING", "true").lower() in ("1", "true", "yes")
+forecast_slots = asyncio.Semaphore(FORECAST_CONCURRENCY)
+# Built by the startup hook; None until then or when FORECAST_CACHE_BACKEND=off.
+forecast_cache = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Process-wide setup happens here rather than at import, so importing the app stays cheap and side-effect free.
+    global forecast_cache
+    configure_logging()
+    warnings.filterwarnings("ignore", category=DeprecationWarning)
+    forecast_cache = await run_in_threadpool(build_forecast_cache)
+    await run_in_threadpool(init_db)
+    log_writer.start()
+    try:
+        await run_in_threadpool(registry.warm)
+        logger.info(f"Resources ready: {registry.status()['load_timings']}")
+    except Exception as e:
+        logger.error(f"Startup resource load failed, /ready will report not ready: {e}")
+    await forecast_jobs.start()
+    yield
+    await forecast_jobs.stop()
+    await run_in_threadpool(log_writer.stop)
+
+app = FastAPI(lifespan=lifespan)
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        path = route.path if route is not None else "unmatched"
+        REQUEST_SECONDS.observe(time.perf_counter() - start, method=request.method, path=path, status=status)
+
 class ForecastRequest(BaseModel):
     task: str = Field(
         "Analyze the financial reports and transcripts for the last three quarters and provide a qualitative forecast for the upcoming quarter. Your forecast must identify key financial trends (e.g., revenue growth, margin pressure), summarize management's stated outlook, and highlight any significant risks or opportunities mentioned",
     )
+    ticker: str = DEFAULT_TICKER
+
+class BatchForecastRequest(BaseModel):
+    tasks: list[str] = Field(..., min_length=1, max_length=FORECAST_BATCH_MAX_TASKS)
+    ticker: str = DEFAULT_TICKER
+
+def resolve_ticker(ticker: Optional[str]):
+    try:
+        return get_corpus(ticker).ticker
+    except UnknownTickerError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+def server_timing(timings: dict):
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
+
+def _cache_embed():
+    return registry.embeddings.embed_query if registry.embeddings is not None else None
+
+@instrumented("cache")
+async def lookup_forecast_cache(task: str, ticker: str, market: dict):
+    # Hits are answered without opening the company's vector store.
+    if forecast_cache is None:
+        return None, None, None
+    version = await run_in_threadpool(registry.corpus_version, ticker)
+    return await run_in_threadpool(
+        forecast_cache.get, task, ticker, version, market["version"], _cache_embed()
+    )
+
+async def store_forecast_cache(cache_key, task: str, ticker: str, market: dict, result: dict):
+    # A forecast made without any market snapshot is not cached, so the next request retries with market data.
+    if forecast_cache is not None and market["version"] is not None:
+        version = await run_in_threadpool(registry.corpus_version, ticker)
+        await run_in_threadpool(
+            forecast_cache.set, cache_key, task, ticker, version, market["version"], result, _cache_embed()
+        )
+
+async def acquire_forecast_slot(request_id: str):
+    try:
+        await asyncio.wait_for(forecast_slots.acquire(), timeout=FORECAST_QUEUE_TIMEOUT)
+        return True
+    except asyncio.TimeoutError:
+        logger.error(f"Forecast concurrency limit ({FORECAST_CONCURRENCY}) reached, rejecting request {request_id}")
+        return False
 
 @app.post("/forecast")
-async def forecast(request: Request, body: ForecastRequest):
+async def forecast(request: Request, response: Response, body: ForecastRequest):
     request_id = os.urandom(8).hex()
+    start = time.perf_counter()
+    timings = {}
+    stage_timings.set(timings)
+    ticker = resolve_ticker(body.ticker)
+    market = await aget_market_snapshot(ticker)
+    if market["age_seconds"] is not None:
+        response.headers["X-Market-Data-Age"] = str(market["age_seconds"])
+    cache_key, cached, cache_status = await lookup_forecast_cache(body.task, ticker, market)
+    if cache_status is not None:
+        response.headers["X-Forecast-Cache"] = cache_status
+        if cached is not None:
+            log_request_response(request_id, body.model_dump(), cached)
+            record_stage("total", time.perf_counter() - start)
+            if SERVER_TIMING:
+                response.headers["Server-Timing"] = server_timing(timings)
+            return cached
+
+    if not await acquire_forecast_slot(request_id):
+        raise HTTPException(status_code=503, detail="Server busy, please retry shortly.")
     try:
-        result = generate_forecast(task=body.task)
-        cleaned_str = re.sub(r'^```json|```$', '', result.strip(), flags=re.MULTILINE).strip()
-        cleaned_result = json.loads(cleaned_str)
+        cleaned_result = await agenerate_forecast(task=body.task, market=market["data"], ticker=ticker)
+        await store_forecast_cache(cache_key, body.task, ticker, market, cleaned_result)
+        record_stage("total", time.perf_counter() - start)
+        if SERVER_TIMING:
+            response.headers["Server-Timing"] = server_timing(timings)
 
-        log_request_response(
-            request_id=request_id,
-            request_data=body.model_dump(),
-            response_data=cleaned_result
-        )
+        log_request_response(request_id, body.model_dump(), cleaned_result)
         return cleaned_result
 
-    except json.JSONDecodeError as jde:
-        logger.error(f"JSON parsing failed: {jde}")
+    except ForecastParseError as fpe:
+        logger.error(f"Forecast output unusable after retries: {fpe}")
         raise HTTPException(status_code=500, detail="Failed to parse forecast output as JSON.")
 
     except ValidationError as ve:
@@ -44,7 +160,213 @@ async def forecast(request: Request, body: ForecastRequest):
         logger.error(f"Unexpected error in /forecast: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+    finally:
+        forecast_slots.release()
+
+@app.post("/forecast/batch")
+async def forecast_batch(response: Response, body: BatchForecastRequest):
+    start = time.perf_counter()
+    ticker = resolve_ticker(body.ticker)
+    market = await aget_market_snapshot(ticker)
+    timings = {"market_s": time.perf_counter() - start, "retrieval_s": 0.0}
+    if market["age_seconds"] is not None:
+        response.headers["X-Market-Data-Age"] = str(market["age_seconds"])
+
+    results = []
+    misses = []
+    for task in body.tasks:
+        cache_key, cached, cache_status = await lookup_forecast_cache(task, ticker, market)
+        entry = {"task": task, "cache": cache_status, "result": cached, "error": None, "timings": {}}
+        results.append(entry)
+        if cached is None:
+            misses.append((entry, cache_key))
+
+    if misses:
+        # The whole batch takes one slot; its own LLM calls are bounded by FORECAST_BATCH_CONCURRENCY.
+        if not await acquire_forecast_slot("batch"):
+            raise HTTPException(status_code=503, detail="Server busy, please retry shortly.")
+        try:
+            outputs, shared = await abatch_forecast([entry["task"] for entry, _ in misses], market=market["data"], ticker=ticker)
+        except Exception as e:
+            logger.error(f"Unexpected error in /forecast/batch: {e}")
+            raise HTTPException(status_code=500, detail="Internal server error")
+        finally:
+            forecast_slots.release()
+        timings.update(shared)
+
+        for (entry, cache_key), output in zip(misses, outputs):
+            entry["timings"] = {name: round(seconds, 3) for name, seconds in output["timings"].items()}
+            if output["error"] is not None:
+                entry["error"] = output["error"]
+                continue
+            entry["result"] = output["forecast"]
+            await store_forecast_cache(cache_key, entry["task"], ticker, market, entry["result"])
+
+    for entry in results:
+        if entry["result"] is not None:
+            log_request_response(os.urandom(8).hex(), {"task": entry["task"], "ticker": ticker}, entry["result"])
+    timings["total_s"] = time.perf_counter() - start
+    return {"ticker": ticker, "results": results, "timings": {name: round(seconds, 3) for name, seconds in timings.items()}}
+
+async def run_forecast_job(job):
+    request_data = {"task": job.task, "ticker": job.ticker}
+    try:
+        market = await aget_market_snapshot(job.ticker)
+        cache_key, cached, _ = await lookup_forecast_cache(job.task, job.ticker, market)
+        if cached is not None:
+            result = cached
+        else:
+            # Job workers share the global slot budget with /forecast and /forecast/stream.
+            async with forecast_slots:
+                result = await agenerate_forecast(task=job.task, market=market["data"], ticker=job.ticker)
+            await store_forecast_cache(cache_key, job.task, job.ticker, market, result)
+    except Exception as e:
+        # Failures are logged too, so a poll that misses the in-memory job still gets an answer.
+        log_request_response(job.id, request_data, {"status": FAILED, "error": str(e)})
+        raise
+    log_request_response(job.id, request_data, result)
+    return result
+
+forecast_jobs = JobManager(run_forecast_job, FORECAST_JOB_WORKERS, FORECAST_JOB_QUEUE_SIZE, FORECAST_JOB_RETENTION)
+
+@app.post("/forecast/jobs", status_code=202)
+async def submit_forecast_job(response: Response, body: ForecastRequest):
+    ticker = resolve_ticker(body.ticker)
+    try:
+        job, coalesced = forecast_jobs.submit(body.task, ticker)
+    except QueueFullError as e:
+        logger.error(str(e))
+        raise HTTPException(status_code=429, detail="Forecast queue is full, please retry shortly.", headers={"Retry-After": "5"})
+    response.headers["Location"] = f"/forecast/jobs/{job.id}"
+    return {"job_id": job.id, "status": job.status, "coalesced": coalesced}
+
+@app.get("/forecast/jobs/{job_id}")
+async def get_forecast_job(job_id: str):
+    job = forecast_jobs.get(job_id)
+    if job is not None:
+        return job.to_dict()
+    if JOB_ID.fullmatch(job_id):
+        logs, _ = await run_in_threadpool(fetch_logs, limit=1, request_id=job_id)
+        if logs:
+            return job_from_log(logs[0])
+    raise HTTPException(status_code=404, detail="Unknown job id")
+
+@app.get("/forecast/jobs")
+async def forecast_jobs_status():
+    return forecast_jobs.status()
+
+def sse_event(event: str, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/forecast/stream")
+async def forecast_stream(body: ForecastRequest):
+    request_id = os.urandom(8).hex()
+    ticker = resolve_ticker(body.ticker)
+    market = await aget_market_snapshot(ticker)
+    cache_key, cached, cache_status = await lookup_forecast_cache(body.task, ticker, market)
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    if cache_status is not None:
+        headers["X-Forecast-Cache"] = cache_status
+
+    async def events():
+        if cached is not None:
+            yield sse_event("result", cached)
+            log_request_response(request_id, body.model_dump(), cached)
+            return
+        if not await acquire_forecast_slot(request_id):
+            yield sse_event("error", {"detail": "Server busy, please retry shortly."})
+            return
+        try:
+            async for event in astream_forecast(task=body.task, market=market["data"], ticker=ticker):
+                if event["event"] == "tool":
+                    yield sse_event("tool", {"name": event["name"], "data": event["data"]})
+                elif event["event"] == "token":
+                    yield sse_event("token", {"text": event["data"]})
+                else:
+                    cleaned_result = event["data"]
+                    yield sse_event("result", cleaned_result)
+                    await store_forecast_cache(cache_key, body.task, ticker, market, cleaned_result)
+                    log_request_response(request_id, body.model_dump(), cleaned_result)
+        except ForecastParseError as fpe:
+            logger.error(f"Forecast output unusable after retries: {fpe}")
+            yield sse_event("error", {"detail": "Failed to parse forecast output as JSON."})
+        except Exception as e:
+            logger.error(f"Unexpected error in /forecast/stream: {e}")
+            yield sse_event("error", {"detail": "Internal server error"})
+        finally:
+            forecast_slots.release()
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=headers)
+
+register(Gauge("forecast_available_slots", "Free FORECAST_CONCURRENCY slots.", lambda: forecast_slots._value))
+register(Gauge("forecast_job_queue_depth", "Forecast jobs waiting for a worker.", lambda: forecast_jobs.status()["queue_depth"]))
+register(Gauge("forecast_log_queue_depth", "Log records waiting to be written.", lambda: log_writer.status()["queue_depth"]))
+register(Gauge("forecast_log_records_dropped", "Log records dropped because the queue was full.", lambda: log_writer.status()["dropped"]))
+register(Gauge("forecast_llm_in_flight", "LLM calls currently holding a gateway slot.", lambda: get_gateway().status()["in_flight"]))
+register(Gauge("forecast_llm_waiting", "LLM calls waiting for a gateway slot.", lambda: get_gateway().status()["waiting"]))
+
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/health")
+def health():
+    return {"status": "ok"}
+
+@app.get("/ready")
+def ready():
+    status = registry.status()
+    status["log_writer"] = log_writer.status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+@app.get("/market")
+async def market_snapshot(ticker: str = DEFAULT_TICKER):
+    return await aget_market_snapshot(resolve_ticker(ticker))
+
+@app.get("/companies")
+def companies():
+    loaded = registry.status()["companies"]
+    return {"default": DEFAULT_TICKER, "companies": [{"ticker": ticker, "loaded": ticker in loaded} for ticker in list_tickers()]}
+
+@app.post("/reload")
+async def reload(force: bool = False, ticker: Optional[str] = None):
+    if ticker is not None:
+        ticker = resolve_ticker(ticker)
+    try:
+        reloaded = await run_in_threadpool(registry.reload, force, ticker)
+    except Exception as e:
+        logger.error(f"Reload failed: {e}")
+        raise HTTPException(status_code=500, detail="Resource reload failed")
+    return {"reloaded": reloaded, **registry.status()}
+
 @app.get("/logs")
-def get_logs(limit: int = 20):
-    logs = fetch_recent_logs(limit=limit)
-    return logs
\ No newline at end of file
+def get_logs(
+    limit: int = Query(20, ge=1, le=200),
+    cursor: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    confidence_level: Optional[str] = None,
+    request_id: Optional[str] = None,
+):
+    try:
+        logs, next_cursor = fetch_logs(
+            limit=limit, cursor=cursor, since=since, until=until,
+            confidence_level=confidence_level, request_id=request_id
+        )
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    return {"items": logs, "next_cursor": next_cursor}
+
+@app.get("/logs/export")
+def export_logs(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    confidence_level: Optional[str] = None,
+    request_id: Optional[str] = None,
+):
+    logs = iter_logs(since=since, until=until, confidence_level=confidence_level, request_id=request_id)
+    return StreamingResponse(
+        (json.dumps(log, ensure_ascii=False) + "\n" for log in logs),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": "attachment; filename=forecast_logs.ndjson"}
+    )
@@ -0,0 +1,168 @@
+import asyncio
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from langchain_core.callbacks import BaseCallbackHandler
+from opentelemetry import trace
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+tracer = trace.get_tracer("forecast-app")
+
+# Per-request stage durations in seconds; set by the API layer and reported as Server-Timing.
+stage_timings = ContextVar("stage_timings", default=None)
+current_stage = ContextVar("current_stage", default=None)
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, values)) + "}"
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, key)} {value}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            series = self._series.setdefault(key, {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["buckets"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        bucket_labels = self.labelnames + ("le",)
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series["buckets"]):
+                    lines.append(f"{self.name}_bucket{_labels(bucket_labels, key + (bound,))} {count}")
+                lines.append(f"{self.name}_bucket{_labels(bucket_labels, key + ('+Inf',))} {series['count']}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {series['sum']}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {series['count']}")
+        return lines
+
+class Gauge:
+    # Read from a callback at scrape time, e.g. a queue depth.
+    def __init__(self, name: str, help: str, read):
+        self.name = name
+        self.help = help
+        self.read = read
+
+    def render(self):
+        try:
+            value = self.read()
+        except Exception as e:
+            logger.error(f"Failed to read gauge {self.name}: {e}")
+            return []
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {value}"]
+
+STAGE_SECONDS = Histogram("forecast_stage_seconds", "Time spent in each forecast stage.", ["stage"])
+REQUEST_SECONDS = Histogram("forecast_http_request_seconds", "HTTP request latency.", ["method", "path", "status"])
+RESOURCE_LOAD_SECONDS = Histogram("forecast_resource_load_seconds", "Time to load shared resources (embeddings, vector store, LLM client).", ["resource"])
+LLM_CALLS = Counter("forecast_llm_calls_total", "LLM calls by stage.", ["stage"])
+LLM_TOKENS = Counter("forecast_llm_tokens_total", "LLM prompt and completion tokens by stage.", ["stage", "type"])
+FORECAST_OUTPUTS = Counter("forecast_outputs_total", "Forecast outputs by outcome: valid, repaired, retried or failed.", ["outcome"])
+
+_metrics = [STAGE_SECONDS, REQUEST_SECONDS, RESOURCE_LOAD_SECONDS, LLM_CALLS, LLM_TOKENS, FORECAST_OUTPUTS]
+
+def register(metric):
+    _metrics.append(metric)
+    return metric
+
+def render_metrics():
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+def record_stage(stage, seconds):
+    timings = stage_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+def observe_stage(stage, seconds):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    record_stage(stage, seconds)
+
+@contextmanager
+def stage(name: str):
+    start = time.perf_counter()
+    token = current_stage.set(name)
+    try:
+        with tracer.start_as_current_span(name):
+            yield
+    finally:
+        current_stage.reset(token)
+        observe_stage(name, time.perf_counter() - start)
+
+def instrumented(name: str):
+    # Wraps a sync or async function in a tracing span and a stage timing.
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with stage(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+class LLMUsageCallback(BaseCallbackHandler):
+    # Counts tokens per LLM call, labelled with the stage that made the call.
+    run_inline = True
+
+    def on_llm_end(self, response, tags=None, **kwargs):
+        # Calls made outside a stage() block (e.g. streamed synthesis) can name their stage with a "stage:<name>" tag.
+        tagged = [tag[len("stage:"):] for tag in tags or [] if tag.startswith("stage:")]
+        label = tagged[0] if tagged else current_stage.get() or "other"
+        prompt_tokens = completion_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                prompt_tokens += usage.get("input_tokens", 0)
+                completion_tokens += usage.get("output_tokens", 0)
+        if not prompt_tokens and not completion_tokens:
+            usage = (response.llm_output or {}).get("token_usage") or {}
+            prompt_tokens = usage.get("prompt_tokens", 0)
+            completion_tokens = usage.get("completion_tokens", 0)
+        LLM_CALLS.inc(stage=label)
+        LLM_TOKENS.inc(prompt_tokens, stage=label, type="prompt")
+        LLM_TOKENS.inc(completion_tokens, stage=label, type="completion")
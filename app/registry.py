@@ -0,0 +1,310 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from app.metrics import RESOURCE_LOAD_SECONDS
+from app.tools.vectorstore import (
+    DEFAULT_TICKER,
+    UnknownTickerError,
+    close_vector_store,
+    corpus_fingerprint,
+    corpus_version,
+    create_or_load_vector_store,
+    get_corpus,
+    get_embeddings,
+    index_bytes,
+    sync_vector_store,
+)
+
+logger = logging.getLogger(__name__)
+
+COMPANY_CACHE_SIZE = int(os.getenv("COMPANY_CACHE_SIZE", "8"))
+COMPANY_CACHE_MB = float(os.getenv("COMPANY_CACHE_MB", "1024"))
+PRELOAD_TICKERS = [ticker for ticker in os.getenv("PRELOAD_TICKERS", DEFAULT_TICKER).upper().split(",") if ticker]
+
+class CompanyStore:
+    # Handed out with a reference held; the store is closed once it has been evicted or replaced and
+    # its last user has released it, so eviction never pulls the index from under a running request.
+    def __init__(self, corpus, vector_store):
+        self.corpus = corpus
+        self.ticker = corpus.ticker
+        self.vector_store = vector_store
+        self.loaded_at = datetime.now(timezone.utc)
+        self._users_lock = threading.Lock()
+        self._users = 0
+        self._retired = False
+        self.refresh()
+
+    def refresh(self):
+        self.corpus_fingerprint = corpus_fingerprint(self.corpus)
+        self.corpus_version = corpus_version(self.corpus)
+        self.index_bytes = index_bytes(self.corpus)
+
+    def acquire(self):
+        with self._users_lock:
+            self._users += 1
+        return self
+
+    def release(self):
+        with self._users_lock:
+            self._users -= 1
+            close = self._retired and self._users == 0
+        if close:
+            close_vector_store(self.vector_store)
+
+    def retire(self):
+        with self._users_lock:
+            self._retired = True
+            close = self._users == 0
+        if close:
+            close_vector_store(self.vector_store)
+
+    def corpus_changed(self):
+        return corpus_fingerprint(self.corpus) != self.corpus_fingerprint
+
+    def status(self):
+        return {
+            "corpus_version": self.corpus_version,
+            "index_mb": round(self.index_bytes / 2**20, 1),
+            "loaded_at": self.loaded_at.isoformat(),
+        }
+
+class ResourceRegistry:
+    # The embeddings model and LLM client are shared; each company's vector store is opened on first
+    # use and kept in an LRU bounded by COMPANY_CACHE_SIZE stores and COMPANY_CACHE_MB of index.
+    def __init__(self, max_companies: int = COMPANY_CACHE_SIZE, max_index_mb: float = COMPANY_CACHE_MB):
+        self._lock = threading.Lock()
+        self._companies_lock = threading.Lock()
+        self._company_locks = {}
+        self.companies = OrderedDict()
+        self.max_companies = max_companies
+        self.max_index_bytes = max_index_mb * 2**20
+        self.embeddings = None
+        self.llm = None
+        self.load_timings = {}
+        self.loaded_at = None
+        self.reloading = False
+        self.last_error = None
+        self.company_errors = {}
+        self.evictions = 0
+
+    @property
+    def ready(self):
+        return self.embeddings is not None and self.llm is not None
+
+    def get(self, ticker=None):
+        # The company store comes with a reference held; callers release() it when they are done.
+        if not self.ready:
+            self.load()
+        return self.llm, self.company(ticker, acquire=True)
+
+    def load(self, force: bool = False):
+        from app.llm import get_llm
+
+        with self._lock:
+            if self.ready and not force:
+                return False
+
+            self.reloading = True
+            timings = {}
+            try:
+                embeddings = self.embeddings
+                if embeddings is None:
+                    start = time.perf_counter()
+                    embeddings = get_embeddings()
+                    timings["embeddings"] = time.perf_counter() - start
+
+                llm = self.llm
+                if llm is None:
+                    start = time.perf_counter()
+                    llm = get_llm()
+                    timings["llm"] = time.perf_counter() - start
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error(f"Resource registry load failed: {e}")
+                raise
+            finally:
+                self.reloading = False
+
+            self.embeddings, self.llm = embeddings, llm
+            self.load_timings = {**self.load_timings, **timings}
+            self.loaded_at = datetime.now(timezone.utc)
+            self.last_error = None
+
+        for name, seconds in timings.items():
+            RESOURCE_LOAD_SECONDS.observe(seconds, resource=name)
+            logger.info(f"Loaded {name} in {seconds:.2f}s")
+        return True
+
+    def warm(self, tickers=PRELOAD_TICKERS):
+        # Opens the most requested companies at startup so their first forecast skips the store load.
+        self.load()
+        for ticker in tickers:
+            try:
+                self.company(ticker)
+            except UnknownTickerError as e:
+                if ticker == DEFAULT_TICKER:
+                    self.company_errors[ticker] = str(e)
+                logger.info(f"Skipping warm-up: {e}")
+            except Exception as e:
+                # Recorded by company(); /ready reports it when it is the default company.
+                logger.error(f"Warm-up failed for {ticker}: {e}")
+
+    def company(self, ticker=None, acquire: bool = False):
+        corpus = get_corpus(ticker)
+        with self._companies_lock:
+            store = self.companies.get(corpus.ticker)
+            if store is not None:
+                self.companies.move_to_end(corpus.ticker)
+                return store.acquire() if acquire else store
+            lock = self._company_locks.setdefault(corpus.ticker, threading.Lock())
+
+        # Concurrent first requests for one company wait for a single load; other companies are not blocked.
+        with lock:
+            with self._companies_lock:
+                store = self.companies.get(corpus.ticker)
+                if store is not None:
+                    self.companies.move_to_end(corpus.ticker)
+                    return store.acquire() if acquire else store
+            try:
+                store = self._open_company(corpus)
+            except Exception as e:
+                self.company_errors[corpus.ticker] = str(e)
+                raise
+            with self._companies_lock:
+                self.companies[corpus.ticker] = store
+                self.company_errors.pop(corpus.ticker, None)
+                if acquire:
+                    store.acquire()
+                self._evict()
+        self._start_precompute(store)
+        return store
+
+    def _open_company(self, corpus):
+        if not self.ready:
+            self.load()
+        start = time.perf_counter()
+        vector_store = create_or_load_vector_store(corpus, embeddings=self.embeddings)
+        if vector_store is None:
+            raise RuntimeError(f"Vector store initialization failed for {corpus.ticker}")
+        seconds = time.perf_counter() - start
+        RESOURCE_LOAD_SECONDS.observe(seconds, resource="company_store")
+        logger.info(f"Opened {corpus.ticker} vector store in {seconds:.2f}s")
+        return CompanyStore(corpus, vector_store)
+
+    def _evict(self):
+        # The most recently used store is never evicted, even if it alone exceeds the memory cap.
+        while len(self.companies) > 1 and (
+            len(self.companies) > self.max_companies
+            or sum(store.index_bytes for store in self.companies.values()) > self.max_index_bytes
+        ):
+            ticker, store = self.companies.popitem(last=False)
+            store.retire()
+            self.evictions += 1
+            logger.info(f"Evicted {ticker} vector store ({store.index_bytes / 2**20:.1f} MB index)")
+
+    def corpus_version(self, ticker=None):
+        corpus = get_corpus(ticker)
+        store = self.companies.get(corpus.ticker)
+        return store.corpus_version if store is not None else corpus_version(corpus)
+
+    def _start_precompute(self, store: CompanyStore):
+        store.acquire()
+        threading.Thread(target=self.precompute, args=(store,), name=f"precompute-{store.ticker}", daemon=True).start()
+
+    def precompute(self, store: CompanyStore):
+        # Fills ingest-time artifacts for new documents so requests rarely pay for them. Runs with a
+        # reference on the store taken by _start_precompute.
+        from app.tools.metrics_store import get_quarterly_metrics
+        from app.tools.transcript_summaries import summarize_pending
+
+        try:
+            start = time.perf_counter()
+            try:
+                get_quarterly_metrics(self.llm, store.vector_store, self.embeddings, store.corpus)
+                logger.info(f"Precomputed {store.ticker} quarterly metrics in {time.perf_counter() - start:.2f}s")
+            except Exception as e:
+                logger.error(f"Quarterly metrics precompute failed for {store.ticker}: {e}")
+
+            start = time.perf_counter()
+            try:
+                summarized = summarize_pending(self.llm, store.vector_store, store.corpus)
+                logger.info(f"Summarized {summarized} {store.ticker} transcripts in {time.perf_counter() - start:.2f}s")
+            except Exception as e:
+                logger.error(f"Transcript summary precompute failed for {store.ticker}: {e}")
+        finally:
+            store.release()
+
+    def reload(self, force: bool = False, ticker=None):
+        # Re-syncs loaded companies whose documents changed; force reopens their stores from disk.
+        self.load()
+        # Without a ticker, companies whose store failed to open are retried along with the loaded ones.
+        tickers = [get_corpus(ticker).ticker] if ticker else [*self.companies, *(name for name in self.company_errors if name not in self.companies)]
+        reloaded = []
+        self.reloading = True
+        try:
+            for name in tickers:
+                store = self.companies.get(name)
+                if store is None:
+                    self.company(name)
+                    reloaded.append(name)
+                    continue
+                if not force and not store.corpus_changed():
+                    continue
+                start = time.perf_counter()
+                if force:
+                    refreshed = self._open_company(store.corpus)
+                    # Swap only once the store is ready so in-flight requests keep a consistent view.
+                    with self._companies_lock:
+                        if self.companies.get(name) is store:
+                            self.companies[name] = refreshed
+                            store.retire()
+                        else:
+                            refreshed.retire()
+                            refreshed = None
+                else:
+                    # Incremental: only new, modified or deleted PDFs touch the index.
+                    sync_vector_store(store.vector_store, store.corpus)
+                    store.refresh()
+                    refreshed = store
+                RESOURCE_LOAD_SECONDS.observe(time.perf_counter() - start, resource="corpus_sync")
+                if refreshed is not None:
+                    self._start_precompute(refreshed)
+                reloaded.append(name)
+        except Exception as e:
+            self.last_error = str(e)
+            logger.error(f"Resource reload failed: {e}")
+            raise
+        finally:
+            self.reloading = False
+        return reloaded
+
+    def status(self):
+        with self._companies_lock:
+            companies = {ticker: store.status() for ticker, store in self.companies.items()}
+        # Not ready while the default company's store is failing, since requests without a ticker use it.
+        default_error = self.company_errors.get(DEFAULT_TICKER)
+        return {
+            "ready": self.ready and default_error is None,
+            "reloading": self.reloading,
+            "loaded_at": self.loaded_at.isoformat() if self.loaded_at else None,
+            "default_company": {
+                "ticker": DEFAULT_TICKER,
+                "loaded": DEFAULT_TICKER in companies,
+                "error": default_error,
+            },
+            "companies": companies,
+            "company_cache": {
+                "loaded": len(companies),
+                "max_companies": self.max_companies,
+                "index_mb": round(sum(store["index_mb"] for store in companies.values()), 1),
+                "max_index_mb": round(self.max_index_bytes / 2**20, 1),
+                "evictions": self.evictions,
+            },
+            "load_timings": {name: round(seconds, 3) for name, seconds in self.load_timings.items()},
+            "last_error": self.last_error,
+        }
+
+registry = ResourceRegistry()
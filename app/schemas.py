@@ -0,0 +1,166 @@
+import json
+import re
+from typing import Any, Dict, List, Literal
+from pydantic import AliasChoices, BaseModel, ConfigDict, Field, ValidationError, field_validator, model_validator
+
+MAX_REPAIR_CUTS = 50
+
+class ForecastParseError(ValueError):
+    pass
+
+def _text(value):
+    if isinstance(value, str):
+        return value
+    if isinstance(value, dict):
+        return "; ".join(f"{key}: {_text(item)}" for key, item in value.items())
+    if isinstance(value, list):
+        return "; ".join(_text(item) for item in value)
+    return "" if value is None else str(value)
+
+def _items(value, name_key, detail_key):
+    # The prompt only shows an example, so lists of plain strings and {name: detail} maps are accepted too.
+    if isinstance(value, (str, dict)) and not (isinstance(value, dict) and name_key in value):
+        value = [value] if isinstance(value, str) else [{name_key: key, detail_key: item} for key, item in value.items()]
+    return [{name_key: item} if isinstance(item, str) else item for item in value] if isinstance(value, list) else value
+
+class Risk(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    risk: str = Field(validation_alias=AliasChoices("risk", "description", "name", "title"))
+    impact: str = Field("", validation_alias=AliasChoices("impact", "severity", "likelihood"))
+
+    @field_validator("risk", "impact", mode="before")
+    @classmethod
+    def as_text(cls, value):
+        return _text(value)
+
+class Opportunity(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    opportunity: str = Field(validation_alias=AliasChoices("opportunity", "description", "name", "title"))
+    benefit: str = Field("", validation_alias=AliasChoices("benefit", "impact", "upside"))
+
+    @field_validator("opportunity", "benefit", mode="before")
+    @classmethod
+    def as_text(cls, value):
+        return _text(value)
+
+class OverallForecast(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    summary: str
+    confidence_level: Literal["high", "medium", "low"]
+
+    @field_validator("confidence_level", mode="before")
+    @classmethod
+    def normalize_confidence(cls, value):
+        return value.strip().lower() if isinstance(value, str) else value
+
+class ForecastOutput(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    trends: Dict[str, Any] = {}
+    management_outlook: Dict[str, Any] = {}
+    risks: List[Risk] = []
+    opportunities: List[Opportunity] = []
+    assumptions: List[str] = []
+    overall_forecast: OverallForecast
+
+    @model_validator(mode="before")
+    @classmethod
+    def normalize_lists(cls, data):
+        if not isinstance(data, dict):
+            return data
+        data = dict(data)
+        if "risks" in data:
+            data["risks"] = _items(data["risks"], "risk", "impact")
+        if "opportunities" in data:
+            data["opportunities"] = _items(data["opportunities"], "opportunity", "benefit")
+        assumptions = data.get("assumptions")
+        if isinstance(assumptions, (str, dict)):
+            assumptions = [assumptions] if isinstance(assumptions, str) else [f"{key}: {_text(value)}" for key, value in assumptions.items()]
+        if isinstance(assumptions, list):
+            data["assumptions"] = [_text(item) for item in assumptions]
+        return data
+
+def _strip_fences(text: str):
+    return re.sub(r"^```(?:json)?|```$", "", text.strip(), flags=re.MULTILINE).strip()
+
+def _scan(text: str):
+    # Returns the index just past the first balanced top-level object, or None if it never closes,
+    # the brackets still open, whether the text ends inside a string, and the positions of commas
+    # (outside strings) that directly precede a closing bracket.
+    stack, in_string, escaped = [], False, False
+    comma, trailing = None, []
+    for i, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char.isspace():
+            continue
+        if char in "}]" and comma is not None:
+            trailing.append(comma)
+        comma = i if char == "," else None
+        if char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]" and stack:
+            stack.pop()
+            if not stack:
+                return i + 1, stack, False, trailing
+    return None, stack, in_string, trailing
+
+def _drop(text: str, positions):
+    for i in reversed(positions):
+        text = text[:i] + text[i + 1:]
+    return text
+
+def _close(fragment: str):
+    _, stack, in_string, _ = _scan(fragment)
+    if in_string:
+        fragment += '"'
+    fragment = fragment.rstrip().rstrip(",")
+    if fragment.endswith(":"):
+        fragment += " null"
+    return fragment + "".join(reversed(stack))
+
+def repair_json(text: str):
+    # Tolerates code fences, prose around the object, trailing commas and output cut off mid-object.
+    text = _strip_fences(text)
+    start = text.find("{")
+    if start == -1:
+        raise ForecastParseError("No JSON object in model output")
+    text = text[start:]
+    end, _, _, trailing = _scan(text)
+    candidate = _drop(text[:end] if end else text, trailing)
+    if end:
+        return json.loads(candidate)
+
+    # Truncated: close what is open, dropping trailing members until the remainder parses.
+    for _ in range(MAX_REPAIR_CUTS):
+        try:
+            return json.loads(_close(candidate))
+        except json.JSONDecodeError:
+            cut = candidate.rfind(",")
+            if cut <= 0:
+                break
+            candidate = candidate[:cut]
+    raise ForecastParseError("Could not repair truncated JSON")
+
+def parse_forecast_output(text: str):
+    # Returns the validated forecast and whether it needed repairing.
+    repaired = False
+    try:
+        data = json.loads(_strip_fences(text))
+    except json.JSONDecodeError:
+        try:
+            data = repair_json(text)
+        except json.JSONDecodeError as e:
+            raise ForecastParseError(f"Invalid JSON: {e}") from e
+        repaired = True
+    try:
+        return ForecastOutput.model_validate(data).model_dump(), repaired
+    except ValidationError as e:
+        raise ForecastParseError(f"Forecast does not match schema: {e.error_count()} errors") from e
@@ -2,8 +2,9 @@ import streamlit as st
 import requests
 import json
 import os
-import mysql.connector
 import pandas as pd
+from datetime import timedelta
+from urllib.parse import urlencode
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -11,21 +12,61 @@ st.set_page_config(page_title="TCS Financial Forecasting Dashboard", layout="wid
 
 # --- Sidebar for global settings ---
 st.sidebar.title("Settings")
-default_api_url = "http://127.0.0.1:8000/forecast"
+default_api_url = os.getenv("FORECAST_API_URL", "http://127.0.0.1:8000/forecast")
 api_url = st.sidebar.text_input("FastAPI Forecast Endpoint URL", value=default_api_url, help="URL for the FastAPI /forecast endpoint.")
+stream_mode = st.sidebar.checkbox("Stream results", value=True, help="Show each tool's output as it finishes and the forecast as it is written (uses /forecast/stream).")
 
-db_mode = st.sidebar.radio("DB Credentials Mode", ["Provide credentials", "Read from .env"], index=0, help="Choose how to provide MySQL credentials.")
-if db_mode == "Provide credentials":
-    db_host = st.sidebar.text_input("DB Host", value=os.getenv("DB_HOST", "localhost"), help="MySQL server host.")
-    db_user = st.sidebar.text_input("DB User", value=os.getenv("DB_USER", "root"), help="MySQL username.")
-    db_password = st.sidebar.text_input("DB Password", value=os.getenv("DB_PASSWORD", ""), type="password", help="MySQL password.")
-    db_name = st.sidebar.text_input("DB Name", value=os.getenv("DB_NAME", "tcs"), help="MySQL database name.")
-else:
-    db_host = os.getenv("DB_HOST", "localhost")
-    db_user = os.getenv("DB_USER", "root")
-    db_password = os.getenv("DB_PASSWORD", "")
-    db_name = os.getenv("DB_NAME", "tcs")
-    st.sidebar.info(f"Using .env: Host: `{db_host}` | User: `{db_user}` | DB: `{db_name}`")
+api_base = api_url.rstrip("/").rsplit("/forecast", 1)[0]
+
+TOOL_LABELS = {
+    "financials": "Financial metrics",
+    "qualitative": "Management commentary",
+    "market": "Market data",
+}
+
+def read_sse(response):
+    event, data = None, []
+    for line in response.iter_lines(decode_unicode=True):
+        if line is None:
+            continue
+        if line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].strip())
+        elif not line and event:
+            yield event, json.loads("\n".join(data))
+            event, data = None, []
+
+def render_forecast(result):
+    if "trends" in result:
+        st.subheader("Trends")
+        for k, v in result["trends"].items():
+            st.markdown(f"- **{k.replace('_',' ').title()}**: {v}")
+    if "management_outlook" in result:
+        st.subheader("Management Outlook")
+        for k, v in result["management_outlook"].items():
+            if isinstance(v, list):
+                st.markdown(f"- **{k.replace('_',' ').title()}**:")
+                for item in v:
+                    st.markdown(f"    - {item}")
+            else:
+                st.markdown(f"- **{k.replace('_',' ').title()}**: {v}")
+    if "risks" in result:
+        st.subheader("Risks")
+        for r in result["risks"]:
+            st.markdown(f"- **{r.get('risk','')}** (Impact: {r.get('impact','')})")
+    if "opportunities" in result:
+        st.subheader("Opportunities")
+        for o in result["opportunities"]:
+            st.markdown(f"- **{o.get('opportunity','')}** (Benefit: {o.get('benefit','')})")
+    if "assumptions" in result:
+        st.subheader("Assumptions")
+        for a in result["assumptions"]:
+            st.markdown(f"- {a}")
+    if "overall_forecast" in result:
+        st.subheader("Overall Forecast")
+        st.markdown(f"{result['overall_forecast'].get('summary','')}")
+        st.markdown(f"**Confidence Level:** {result['overall_forecast'].get('confidence_level','')}")
 
 st.title("TCS Financial Forecasting Dashboard")
 
@@ -35,111 +76,141 @@ tab1, tab2 = st.tabs(["📊 Forecast", "🗂️ Logs"])
 with tab1:
     st.header("Generate Financial Forecast")
     st.markdown("""
-    Enter your forecasting task below. The agent will analyze recent financial reports and transcripts to generate a qualitative business outlook for TCS.
+    Pick a company and enter your forecasting task below. The agent will analyze its recent financial reports and transcripts to generate a qualitative business outlook.
     """)
+    try:
+        companies = requests.get(f"{api_base}/companies", timeout=5).json()
+        tickers = [company["ticker"] for company in companies["companies"]] or [companies["default"]]
+        default_index = tickers.index(companies["default"]) if companies["default"] in tickers else 0
+        ticker = st.selectbox("Company", tickers, index=default_index)
+    except (requests.RequestException, ValueError, KeyError):
+        ticker = st.text_input("Company ticker", value="TCS")
     task_input = st.text_area(
         "Forecast Task", 
         "Analyze the financial reports and transcripts for the last three quarters and provide a qualitative forecast for the upcoming quarter. Your forecast must identify key financial trends (e.g., revenue growth, margin pressure), summarize management's stated outlook, and highlight any significant risks or opportunities mentioned",
         help="Describe the forecasting task you want the agent to perform."
     )
     if st.button("Generate Forecast", key="forecast_btn"):
-        with st.spinner("Contacting the FastAPI agent..."):
+        if stream_mode:
             try:
-                response = requests.post(api_url, json={"task": task_input})
-                if response.status_code == 200:
-                    result = response.json()
-                    st.success("Forecast Generated!")
-                    # Sectioned, appealing output
-                    if "trends" in result:
-                        st.subheader("Trends")
-                        for k, v in result["trends"].items():
-                            st.markdown(f"- **{k.replace('_',' ').title()}**: {v}")
-                    if "management_outlook" in result:
-                        st.subheader("Management Outlook")
-                        for k, v in result["management_outlook"].items():
-                            if isinstance(v, list):
-                                st.markdown(f"- **{k.replace('_',' ').title()}**:")
-                                for item in v:
-                                    st.markdown(f"    - {item}")
-                            else:
-                                st.markdown(f"- **{k.replace('_',' ').title()}**: {v}")
-                    if "risks" in result:
-                        st.subheader("Risks")
-                        for r in result["risks"]:
-                            st.markdown(f"- **{r.get('risk','')}** (Impact: {r.get('impact','')})")
-                    if "opportunities" in result:
-                        st.subheader("Opportunities")
-                        for o in result["opportunities"]:
-                            st.markdown(f"- **{o.get('opportunity','')}** (Benefit: {o.get('benefit','')})")
-                    if "assumptions" in result:
-                        st.subheader("Assumptions")
-                        for a in result["assumptions"]:
-                            st.markdown(f"- {a}")
-                    if "overall_forecast" in result:
-                        st.subheader("Overall Forecast")
-                        st.markdown(f"{result['overall_forecast'].get('summary','')}")
-                        st.markdown(f"**Confidence Level:** {result['overall_forecast'].get('confidence_level','')}")
-                else:
-                    st.error(f"API Error: {response.status_code}")
-                    try:
-                        st.write(response.json())
-                    except:
+                with requests.post(api_url.rstrip("/") + "/stream", json={"task": task_input, "ticker": ticker}, stream=True, timeout=300) as response:
+                    if response.status_code != 200:
+                        st.error(f"API Error: {response.status_code}")
                         st.write(response.text)
+                    else:
+                        status = st.status("Running forecast tools...", expanded=True)
+                        synthesis = st.empty()
+                        tokens = ""
+                        for event, data in read_sse(response):
+                            if event == "tool":
+                                with status:
+                                    with st.expander(f"{TOOL_LABELS.get(data['name'], data['name'])} ready"):
+                                        st.write(data["data"])
+                            elif event == "token":
+                                tokens += data["text"]
+                                synthesis.code(tokens, language="json")
+                            elif event == "result":
+                                status.update(label="Forecast tools finished", state="complete", expanded=False)
+                                synthesis.empty()
+                                st.success("Forecast Generated!")
+                                render_forecast(data)
+                            elif event == "error":
+                                status.update(label="Forecast failed", state="error")
+                                st.error(f"API Error: {data.get('detail', '')}")
             except Exception as e:
                 st.error(f"Error contacting FastAPI: {e}")
+        else:
+            with st.spinner("Contacting the FastAPI agent..."):
+                try:
+                    response = requests.post(api_url, json={"task": task_input, "ticker": ticker})
+                    if response.status_code == 200:
+                        st.success("Forecast Generated!")
+                        render_forecast(response.json())
+                    else:
+                        st.error(f"API Error: {response.status_code}")
+                        try:
+                            st.write(response.json())
+                        except:
+                            st.write(response.text)
+                except Exception as e:
+                    st.error(f"Error contacting FastAPI: {e}")
 
 with tab2:
-    st.header("Recent Forecast Logs")
+    st.header("Forecast Logs")
     st.markdown("""
-    View the 10 most recent forecast requests and responses. Select a log to see full details.
+    Browse logged forecast requests and responses, newest first. Filter by time range, confidence level or request id, and select a log to see full details.
     """)
-    if st.button("Show Recent Logs", key="logs_btn"):
-        with st.spinner("Querying MySQL database for logs..."):
-            try:
-                conn = mysql.connector.connect(
-                    host=db_host,
-                    user=db_user,
-                    password=db_password,
-                    database=db_name,
-                )
-                cursor = conn.cursor(dictionary=True)
-                cursor.execute(
-                    "SELECT timestamp, request_data, response_data FROM forecast_logs ORDER BY timestamp DESC LIMIT 10"
-                )
-                logs = cursor.fetchall()
-                cursor.close()
-                conn.close()
-            except Exception as e:
-                st.error(f"Database error: {e}")
-                logs = []
-            if logs:
-                table_data = []
-                for idx, log in enumerate(logs):
-                    req = log.get("request_data", "")
-                    resp = log.get("response_data", "")
-                    req_short = req[:60] + ("..." if len(req) > 60 else "")
-                    resp_short = resp[:60] + ("..." if len(resp) > 60 else "")
-                    table_data.append({
-                        "Index": idx,
-                        "Timestamp": log.get("timestamp", "N/A"),
-                        "Request": req_short,
-                        "Response": resp_short
-                    })
-                df = pd.DataFrame(table_data)
-                st.dataframe(df.style.apply(lambda x: ['background-color: #f9f9f9' if i%2==0 else '' for i in range(len(x))], axis=0), use_container_width=True)
-                log_options = [f"{row['Timestamp']} (#{row['Index']})" for row in table_data]
-                selected_idx = st.selectbox("Select log for details", options=list(range(len(logs))), format_func=lambda i: log_options[i])
-                log = logs[selected_idx]
-                with st.expander(f"Log Details for {log.get('timestamp','N/A')}"):
-                    st.markdown("**Request (full):**")
-                    try:
-                        st.json(json.loads(log.get("request_data", "{}")))
-                    except:
-                        st.write(log.get("request_data", ""))
-                    st.markdown("**Response (full):**")
-                    try:
-                        st.json(json.loads(log.get("response_data", "{}")))
-                    except:
-                        st.write(log.get("response_data", ""))
-            else:
-                st.info("No logs found.")
\ No newline at end of file
+    col1, col2, col3 = st.columns(3)
+    since = col1.date_input("From", value=None, help="Only logs on or after this date.")
+    until = col2.date_input("To", value=None, help="Only logs before the end of this date.")
+    confidence = col3.selectbox("Confidence level", ["Any", "high", "medium", "low"])
+    request_id = st.text_input("Request id", value="", help="Exact request or job id.")
+    page_size = st.slider("Logs per page", min_value=5, max_value=100, value=10)
+
+    filters = {}
+    if since:
+        filters["since"] = since.isoformat()
+    if until:
+        filters["until"] = (until + timedelta(days=1)).isoformat()
+    if confidence != "Any":
+        filters["confidence_level"] = confidence
+    if request_id.strip():
+        filters["request_id"] = request_id.strip()
+
+    if "log_cursors" not in st.session_state:
+        st.session_state.log_cursors = [None]
+    if st.session_state.get("log_filters") != filters:
+        st.session_state.log_filters = filters
+        st.session_state.log_cursors = [None]
+
+    def load_logs(cursor):
+        params = {**filters, "limit": page_size}
+        if cursor:
+            params["cursor"] = cursor
+        response = requests.get(f"{api_base}/logs", params=params, timeout=30)
+        response.raise_for_status()
+        return response.json()
+
+    nav1, nav2, nav3 = st.columns([1, 1, 4])
+    if nav1.button("Newer", key="logs_prev", disabled=len(st.session_state.log_cursors) <= 1):
+        st.session_state.log_cursors.pop()
+    next_clicked = nav2.button("Older", key="logs_next")
+
+    try:
+        page = load_logs(st.session_state.log_cursors[-1])
+        if next_clicked and page["next_cursor"]:
+            st.session_state.log_cursors.append(page["next_cursor"])
+            page = load_logs(page["next_cursor"])
+        logs = page["items"]
+    except Exception as e:
+        st.error(f"Error fetching logs from FastAPI: {e}")
+        logs = []
+    nav3.caption(f"Page {len(st.session_state.log_cursors)}")
+
+    if logs:
+        table_data = []
+        for idx, log in enumerate(logs):
+            req = json.dumps(log.get("request_data", {}))
+            resp = json.dumps(log.get("response_data", {}))
+            table_data.append({
+                "Index": idx,
+                "Timestamp": log.get("timestamp", "N/A"),
+                "Request Id": log.get("request_id", ""),
+                "Confidence": log.get("confidence_level") or "",
+                "Request": req[:60] + ("..." if len(req) > 60 else ""),
+                "Response": resp[:60] + ("..." if len(resp) > 60 else "")
+            })
+        df = pd.DataFrame(table_data)
+        st.dataframe(df.style.apply(lambda x: ['background-color: #f9f9f9' if i%2==0 else '' for i in range(len(x))], axis=0), use_container_width=True)
+        log_options = [f"{row['Timestamp']} (#{row['Index']})" for row in table_data]
+        selected_idx = st.selectbox("Select log for details", options=list(range(len(logs))), format_func=lambda i: log_options[i])
+        log = logs[selected_idx]
+        with st.expander(f"Log Details for {log.get('timestamp','N/A')}"):
+            st.markdown("**Request (full):**")
+            st.json(log.get("request_data", {}))
+            st.markdown("**Response (full):**")
+            st.json(log.get("response_data", {}))
+    else:
+        st.info("No logs found.")
+
+    st.markdown(f"Bulk export of every log matching these filters: [NDJSON]({api_base}/logs/export?{urlencode(filters)})")
@@ -0,0 +1,103 @@
+import os
+import re
+
+# Month the fiscal year starts in; 4 (April) for Indian filers, 1 for calendar fiscal years.
+FISCAL_YEAR_START_MONTH = int(os.getenv("FISCAL_YEAR_START_MONTH", "4"))
+PERIOD_SCAN_PAGES = 5
+
+MONTH_NAMES = ("january", "february", "march", "april", "may", "june",
+               "july", "august", "september", "october", "november", "december")
+MONTHS = {name[:3]: number for number, name in enumerate(MONTH_NAMES, start=1)}
+MONTH_PATTERN = "|".join(MONTHS)
+FILENAME_PERIOD_PATTERN = re.compile(rf"({MONTH_PATTERN})[a-z]*[_\- ]?'?(\d{{4}}|\d{{2}})(?!\d)", re.IGNORECASE)
+QUARTER_LABEL_PATTERN = re.compile(r"\bQ([1-4])\s*(?:FY|F\.Y\.)\s*'?\s*(\d{4}|\d{2})\b", re.IGNORECASE)
+PERIOD_END_PATTERN = re.compile(
+    rf"(?:three months|quarter)\s+ended\s+({MONTH_PATTERN})[a-z]*\s+\d{{1,2}},?\s+(\d{{4}})", re.IGNORECASE
+)
+
+# Headings that open a section of a results filing, matched near the top of each page.
+REPORT_SECTIONS = (
+    ("segment", ("segment information", "segment revenue")),
+    ("income_statement", ("statement of financial results", "statement of profit and loss", "income statement")),
+    ("balance_sheet", ("balance sheet", "statement of assets and liabilities")),
+    ("cash_flow", ("statement of cash flows", "cash flow statement")),
+    ("notes", ("explanatory notes", "notes to the")),
+    ("auditor_report", ("auditor's report", "auditor’s report")),
+)
+HEADING_CHARS = 600
+QA_START_PATTERN = re.compile(
+    r"(take|have) (our|the) first question|first question (is|comes) from|question[- ]and[- ]answer session (begins|starts)",
+    re.IGNORECASE,
+)
+
+def _full_year(year: str):
+    year = int(year)
+    return year if year > 99 else 2000 + year
+
+def fiscal_period(year: int, month: int):
+    # The fiscal quarter whose last month is `month` of `year`, labelled by the year the fiscal year ends in.
+    start = FISCAL_YEAR_START_MONTH
+    fiscal_year = year + 1 if start > 1 and month >= start else year
+    fiscal_quarter = (month - start) % 12 // 3 + 1
+    return {
+        "quarter": f"Q{fiscal_quarter} FY{fiscal_year % 100:02d}",
+        "fiscal_year": fiscal_year,
+        "fiscal_quarter": fiscal_quarter,
+        "period_end": f"{year}-{month:02d}",
+    }
+
+def _quarter_end_before(year: int, month: int):
+    # Filings are named after the month results are published (quarterly_jul_25.pdf), which covers the
+    # quarter that ended most recently.
+    while (month - FISCAL_YEAR_START_MONTH + 1) % 3 != 0:
+        month -= 1
+        if month == 0:
+            year, month = year - 1, 12
+    return year, month
+
+def period_from_filename(path: str):
+    match = FILENAME_PERIOD_PATTERN.search(os.path.basename(path))
+    if not match:
+        return {}
+    return fiscal_period(*_quarter_end_before(_full_year(match.group(2)), MONTHS[match.group(1).lower()[:3]]))
+
+def period_from_text(page_texts: list):
+    for text in page_texts[:PERIOD_SCAN_PAGES]:
+        match = QUARTER_LABEL_PATTERN.search(text)
+        if match:
+            fiscal_quarter, fiscal_year = int(match.group(1)), _full_year(match.group(2))
+            month = (FISCAL_YEAR_START_MONTH - 1 + 3 * fiscal_quarter - 1) % 12 + 1
+            year = fiscal_year - 1 if FISCAL_YEAR_START_MONTH > 1 and month >= FISCAL_YEAR_START_MONTH else fiscal_year
+            return fiscal_period(year, month)
+        match = PERIOD_END_PATTERN.search(text)
+        if match:
+            return fiscal_period(int(match.group(2)), MONTHS[match.group(1).lower()[:3]])
+    return {}
+
+def document_period(path: str, page_texts: list = None):
+    # The file name decides when it carries a month; otherwise the first pages are searched for
+    # "Q1 FY26" or "three months ended June 30, 2025".
+    period = period_from_filename(path)
+    if period:
+        return period
+    if page_texts is None:
+        from pypdf import PdfReader
+
+        page_texts = [page.extract_text() or "" for page in PdfReader(path).pages[:PERIOD_SCAN_PAGES]]
+    return period_from_text(page_texts)
+
+def report_section(text: str):
+    head = text[:HEADING_CHARS].lower()
+    found = [(head.find(marker), section) for section, markers in REPORT_SECTIONS for marker in markers if marker in head]
+    return min(found)[1] if found else "other"
+
+def page_sections(doc_type: str, page_texts: list):
+    # Transcripts switch from prepared remarks to Q&A at the moderator's first question and never switch back.
+    if doc_type != "transcript":
+        return [report_section(text) for text in page_texts]
+    sections = []
+    in_qa = False
+    for text in page_texts:
+        in_qa = in_qa or bool(QA_START_PATTERN.search(text))
+        sections.append("qa" if in_qa else "remarks")
+    return sections
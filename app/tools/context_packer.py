@@ -0,0 +1,83 @@
+import logging
+import os
+import re
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+FINANCIALS_CONTEXT_TOKENS = int(os.getenv("FINANCIALS_CONTEXT_TOKENS", "1500"))
+TRANSCRIPTS_CONTEXT_TOKENS = int(os.getenv("TRANSCRIPTS_CONTEXT_TOKENS", "2000"))
+METRICS_CONTEXT_TOKENS = int(os.getenv("METRICS_CONTEXT_TOKENS", "2500"))
+MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))
+OVERLAP_PROBE_CHARS = 80
+
+def estimate_tokens(text: str):
+    return max(1, len(text) // 4) if text else 0
+
+def _merge_pair(first: str, second: str):
+    if second in first:
+        return first
+    if first in second:
+        return second
+    # The splitter overlaps neighbouring chunks, so the start of one reappears inside the other.
+    probe = second[:OVERLAP_PROBE_CHARS]
+    position = first.find(probe)
+    if probe and position != -1 and second.startswith(first[position:]):
+        return first[:position] + second
+    return None
+
+def merge_overlapping(chunks: list):
+    merged = []
+    for chunk in chunks:
+        key = (chunk.metadata.get("source"), chunk.metadata.get("page"))
+        text = chunk.page_content
+        for i, existing in enumerate(merged):
+            if (existing.metadata.get("source"), existing.metadata.get("page")) != key:
+                continue
+            combined = _merge_pair(existing.page_content, text) or _merge_pair(text, existing.page_content)
+            if combined is not None:
+                merged[i] = Document(page_content=combined, metadata=existing.metadata)
+                break
+        else:
+            merged.append(Document(page_content=text, metadata=chunk.metadata))
+    return merged
+
+def _terms(text: str):
+    return set(re.findall(r"\w+", text.lower()))
+
+def _similarity(first: set, second: set):
+    if not first or not second:
+        return 0.0
+    return len(first & second) / len(first | second)
+
+def select_mmr(chunks: list, budget_tokens: int, lambda_: float = MMR_LAMBDA):
+    # Chunks arrive in relevance order; rank stands in for the similarity score.
+    candidates = [(1.0 - i / max(len(chunks), 1), chunk, _terms(chunk.page_content)) for i, chunk in enumerate(chunks)]
+    selected, selected_terms, used = [], [], 0
+    while candidates:
+        best = max(
+            range(len(candidates)),
+            key=lambda i: lambda_ * candidates[i][0]
+            - (1 - lambda_) * max((_similarity(candidates[i][2], terms) for terms in selected_terms), default=0.0)
+        )
+        _, chunk, terms = candidates.pop(best)
+        tokens = estimate_tokens(chunk.page_content)
+        if used + tokens > budget_tokens:
+            if selected:
+                continue
+            # Always keep the most relevant chunk, trimmed to the budget.
+            chunk = Document(page_content=chunk.page_content[:budget_tokens * 4], metadata=chunk.metadata)
+            tokens = estimate_tokens(chunk.page_content)
+        selected.append(chunk)
+        selected_terms.append(terms)
+        used += tokens
+    return selected
+
+def pack_context(chunks: list, budget_tokens: int, label: str = "context"):
+    input_tokens = sum(estimate_tokens(chunk.page_content) for chunk in chunks)
+    packed = select_mmr(merge_overlapping(chunks), budget_tokens)
+    context = "\n\n".join(chunk.page_content for chunk in packed)
+    packed_tokens = estimate_tokens(context)
+    saved = max(input_tokens - packed_tokens, 0)
+    logger.info(f"Packed {label}: {len(chunks)} chunks / {input_tokens} tokens -> {len(packed)} / {packed_tokens} (saved {saved})")
+    return context
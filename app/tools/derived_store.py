@@ -0,0 +1,49 @@
+import os
+import re
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from .vectorstore import CHROMA_PATH, cached_manifest, recent_quarters
+
+# Ingest-time artifacts derived from the PDFs, keyed by document content hash and shared by every company.
+DERIVED_DB_PATH = os.getenv("DERIVED_DB_PATH", os.path.join(CHROMA_PATH, "derived.sqlite"))
+
+_schemas_ready = set()
+_schemas_lock = threading.Lock()
+
+@contextmanager
+def connect(schema=None):
+    # `schema(conn)` creates the caller's table; it runs on the first connection per
+    # database file rather than on every read and write.
+    os.makedirs(os.path.dirname(DERIVED_DB_PATH) or ".", exist_ok=True)
+    conn = sqlite3.connect(DERIVED_DB_PATH, timeout=10)
+    try:
+        with conn:
+            key = (os.path.abspath(DERIVED_DB_PATH), schema)
+            if schema is not None and key not in _schemas_ready:
+                schema(conn)
+                with _schemas_lock:
+                    _schemas_ready.add(key)
+            yield conn
+    finally:
+        conn.close()
+
+def manifest_documents(corpus, doc_type: str, last_quarters: int = 0):
+    manifest, derived = cached_manifest(corpus)
+    key = ("manifest_documents", doc_type, last_quarters)
+    if key not in derived:
+        quarters = recent_quarters(corpus, doc_type, last_quarters)
+        derived[key] = {
+            entry["sha256"]: path
+            for path, entry in sorted(manifest["files"].items())
+            if entry["type"] == doc_type and (not quarters or entry.get("quarter") in quarters)
+        }
+    return dict(derived[key])
+
+def parse_json_output(text: str):
+    cleaned = re.sub(r'^```json|```$', '', text.strip(), flags=re.MULTILINE).strip()
+    try:
+        return json.loads(cleaned)
+    except json.JSONDecodeError:
+        return {"raw": cleaned}
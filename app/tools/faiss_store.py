@@ -0,0 +1,340 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterable, List, Optional
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+from .chunk_metadata import period_from_filename
+
+logger = logging.getLogger(__name__)
+
+# "flat" is exact; "hnsw" and "ivf" trade a little recall for sub-linear search on large partitions.
+FAISS_INDEX = os.getenv("FAISS_INDEX", "flat")
+FAISS_HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))
+FAISS_HNSW_EF_CONSTRUCTION = int(os.getenv("FAISS_HNSW_EF_CONSTRUCTION", "80"))
+FAISS_HNSW_EF_SEARCH = int(os.getenv("FAISS_HNSW_EF_SEARCH", "64"))
+# 0 picks about 4 * sqrt(n) lists per partition.
+FAISS_IVF_NLIST = int(os.getenv("FAISS_IVF_NLIST", "0"))
+FAISS_IVF_NPROBE = int(os.getenv("FAISS_IVF_NPROBE", "8"))
+# IVF needs enough vectors to train its centroids; smaller partitions stay flat.
+FAISS_IVF_MIN_POINTS_PER_LIST = 39
+# With HNSW or IVF, filters narrower than this (e.g. one document) are scored exactly from stored
+# embeddings, since both lose recall when most of a partition is excluded.
+FAISS_EXACT_SEARCH_MAX = int(os.getenv("FAISS_EXACT_SEARCH_MAX", "4096"))
+INDEX_SUFFIX = ".index"
+
+def partition_key(metadata: dict):
+    # Chunks stamped by load_pdf_chunks carry the quarter end; older metadata falls back to the file name.
+    period = metadata.get("period_end") or period_from_filename(metadata.get("source", "")).get("period_end", "undated")
+    return f"{metadata.get('type', 'other')}-{period}"
+
+def where_clause(filter: dict):
+    # A filter value may be a list of accepted values, e.g. {"quarter": ["Q1 FY26", "Q4 FY25"]}.
+    clauses, values = [], []
+    for key, value in filter.items():
+        if key.startswith("$"):
+            raise ValueError(f"Unsupported filter operator for the FAISS engine: {key}")
+        column = "doc_sha256" if key == "doc_sha256" else f"json_extract(metadata, '$.{key}')"
+        if isinstance(value, list):
+            clauses.append(f"{column} IN ({','.join('?' * len(value))})" if value else "0")
+            values.extend(value)
+        else:
+            clauses.append(f"{column} = ?")
+            values.append(value)
+    return " AND ".join(clauses) or "1", values
+
+def build_index(vectors: np.ndarray, kind: str = FAISS_INDEX):
+    import faiss
+
+    n, dim = vectors.shape
+    if kind == "hnsw":
+        base = faiss.IndexHNSWFlat(dim, FAISS_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        base.hnsw.efConstruction = FAISS_HNSW_EF_CONSTRUCTION
+    elif kind == "ivf":
+        nlist = FAISS_IVF_NLIST or max(1, int(4 * np.sqrt(n)))
+        if n >= nlist * FAISS_IVF_MIN_POINTS_PER_LIST:
+            base = faiss.IndexIVFFlat(faiss.IndexFlatIP(dim), dim, nlist, faiss.METRIC_INNER_PRODUCT)
+            base.train(vectors)
+        else:
+            base = faiss.IndexFlatIP(dim)
+    elif kind == "flat":
+        base = faiss.IndexFlatIP(dim)
+    else:
+        raise ValueError(f"Unknown FAISS_INDEX: {kind}")
+    return base
+
+def search_params(index, selector=None):
+    import faiss
+
+    base = faiss.downcast_index(index.index) if hasattr(index, "index") else index
+    if isinstance(base, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=FAISS_HNSW_EF_SEARCH)
+    if isinstance(base, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=min(FAISS_IVF_NPROBE, base.nlist))
+    return faiss.SearchParameters(sel=selector) if selector is not None else None
+
+class PartitionedFaissStore(VectorStore):
+    # One FAISS index per document type and period, so a filtered search scans only its partitions.
+    # Index files are opened memory-mapped: uvicorn workers on one host share the same page cache
+    # instead of each holding a copy. Chunk text, metadata and embeddings live in SQLite, from which
+    # partitions touched by writes are rebuilt before the next search.
+    def __init__(self, path: str, embedding=None, index_kind: str = FAISS_INDEX):
+        self.path = path
+        self.embedding = embedding
+        self.index_kind = index_kind
+        self.db_path = os.path.join(path, "chunks.sqlite")
+        self.partitions = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS chunks (
+                    row_id INTEGER PRIMARY KEY,
+                    chunk_id TEXT UNIQUE,
+                    partition TEXT,
+                    doc_sha256 TEXT,
+                    content TEXT,
+                    metadata TEXT,
+                    embedding BLOB
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS chunks_partition ON chunks (partition)")
+            conn.execute("CREATE INDEX IF NOT EXISTS chunks_doc ON chunks (doc_sha256)")
+        self.reopen()
+
+    @property
+    def embeddings(self):
+        return self.embedding
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _index_path(self, partition: str):
+        return os.path.join(self.path, partition + INDEX_SUFFIX)
+
+    def reopen(self):
+        # Picks up partitions rewritten by another process as well as our own.
+        import faiss
+
+        partitions = {}
+        for name in sorted(os.listdir(self.path)):
+            if name.endswith(INDEX_SUFFIX):
+                path = os.path.join(self.path, name)
+                partitions[name[:-len(INDEX_SUFFIX)]] = faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_MMAP_IFC)
+        self.partitions = partitions
+
+    def flush(self):
+        import faiss
+
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            for partition in sorted(dirty):
+                with self._connect() as conn:
+                    rows = conn.execute("SELECT row_id, embedding FROM chunks WHERE partition = ?", (partition,)).fetchall()
+                path = self._index_path(partition)
+                if not rows:
+                    if os.path.exists(path):
+                        os.remove(path)
+                    continue
+                vectors = np.vstack([np.frombuffer(blob, dtype=np.float32) for _, blob in rows])
+                index = faiss.IndexIDMap(build_index(vectors, self.index_kind))
+                index.add_with_ids(vectors, np.array([row_id for row_id, _ in rows], dtype=np.int64))
+                # Readers keep their mapping of the old file until they reopen.
+                faiss.write_index(index, path + ".tmp")
+                os.replace(path + ".tmp", path)
+                logger.info(f"Rebuilt FAISS partition {partition}: {len(rows)} vectors ({self.index_kind})")
+            self.reopen()
+
+    def upsert(self, ids: List[str], vectors, documents: List[Document]):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        rows = []
+        for chunk_id, vector, doc in zip(ids, vectors, documents):
+            partition = partition_key(doc.metadata)
+            rows.append((chunk_id, partition, doc.metadata.get("doc_sha256"), doc.page_content,
+                         json.dumps(doc.metadata), vector.tobytes()))
+        with self._connect() as conn:
+            stale = self._partitions_of(conn, ids)
+            conn.executemany(
+                "INSERT OR REPLACE INTO chunks (chunk_id, partition, doc_sha256, content, metadata, embedding) VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+        with self._lock:
+            self._dirty.update(stale, (row[1] for row in rows))
+        return list(ids)
+
+    def _partitions_of(self, conn, ids):
+        partitions = set()
+        for start in range(0, len(ids), 500):
+            batch = list(ids[start:start + 500])
+            placeholders = ",".join("?" * len(batch))
+            partitions.update(row[0] for row in conn.execute(
+                f"SELECT DISTINCT partition FROM chunks WHERE chunk_id IN ({placeholders})", batch
+            ))
+        return partitions
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None, **kwargs):
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [f"chunk-{os.urandom(8).hex()}" for _ in texts]
+        vectors = self.embedding.embed_documents(texts)
+        documents = [Document(page_content=text, metadata=metadata) for text, metadata in zip(texts, metadatas)]
+        return self.upsert(ids, vectors, documents)
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs):
+        if not ids:
+            return False
+        with self._connect() as conn:
+            partitions = self._partitions_of(conn, ids)
+            for start in range(0, len(ids), 500):
+                batch = list(ids[start:start + 500])
+                conn.execute(f"DELETE FROM chunks WHERE chunk_id IN ({','.join('?' * len(batch))})", batch)
+        with self._lock:
+            self._dirty.update(partitions)
+        return True
+
+    def delete_collection(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM chunks")
+        with self._lock:
+            self._dirty.clear()
+            for name in os.listdir(self.path):
+                if name.endswith(INDEX_SUFFIX):
+                    os.remove(os.path.join(self.path, name))
+            self.partitions = {}
+
+    def count(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def close(self):
+        # Dropping the index objects unmaps their files.
+        self.partitions = {}
+
+    def _plan(self, filter: Optional[dict]):
+        # Partitions are chosen from the type; any other equality condition becomes an id selector.
+        filter = dict(filter or {})
+        doc_types = filter.get("type")
+        if doc_types is not None and not isinstance(doc_types, list):
+            doc_types = [doc_types]
+        partitions = {name: index for name, index in self.partitions.items()
+                      if doc_types is None or name.rsplit("-", 2)[0] in doc_types}
+        if set(filter) <= {"type"} or not partitions:
+            return partitions, None
+
+        clause, values = where_clause(filter)
+        with self._connect() as conn:
+            rows = conn.execute(f"SELECT row_id, partition FROM chunks WHERE {clause}", values).fetchall()
+        row_ids = np.array([row_id for row_id, _ in rows], dtype=np.int64)
+        return {name: partitions[name] for name in {partition for _, partition in rows} if name in partitions}, row_ids
+
+    def search_with_scores(self, vectors, k: int = 4, filter: Optional[dict] = None):
+        import faiss
+
+        if self._dirty:
+            self.flush()
+        queries = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        partitions, row_ids = self._plan(filter)
+        if row_ids is not None and self.index_kind != "flat" and len(row_ids) <= FAISS_EXACT_SEARCH_MAX:
+            return self._exact_search(queries, row_ids, k)
+        selector = faiss.IDSelectorBatch(row_ids) if row_ids is not None else None
+        scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        labels = np.full((len(queries), 0), -1, dtype=np.int64)
+        for index in partitions.values():
+            found_scores, found_labels = index.search(queries, min(k, index.ntotal), params=search_params(index, selector))
+            scores = np.hstack([scores, found_scores])
+            labels = np.hstack([labels, found_labels])
+
+        return self._ranked(scores, labels, k)
+
+    def _exact_search(self, queries, row_ids, k):
+        if not len(row_ids):
+            return [[] for _ in queries]
+        ids = row_ids.tolist()
+        found = {}
+        with self._connect() as conn:
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                found.update(conn.execute(
+                    f"SELECT row_id, embedding FROM chunks WHERE row_id IN ({','.join('?' * len(batch))})", batch
+                ))
+        labels = np.array(list(found), dtype=np.int64)
+        matrix = np.vstack([np.frombuffer(blob, dtype=np.float32) for blob in found.values()])
+        scores = queries @ matrix.T
+        return self._ranked(scores, np.broadcast_to(labels, scores.shape), k)
+
+    def _ranked(self, scores, labels, k):
+        top = np.argsort(-scores, axis=1)[:, :k]
+        hits = [[(int(labels[i, j]), float(scores[i, j])) for j in row if labels[i, j] >= 0] for i, row in enumerate(top)]
+        rows = self._rows({row_id for found in hits for row_id, _ in found})
+        return [[(rows[row_id], score) for row_id, score in found if row_id in rows] for found in hits]
+
+    def _rows(self, row_ids):
+        rows = {}
+        row_ids = list(row_ids)
+        with self._connect() as conn:
+            for start in range(0, len(row_ids), 500):
+                batch = row_ids[start:start + 500]
+                for row_id, chunk_id, content, metadata in conn.execute(
+                    f"SELECT row_id, chunk_id, content, metadata FROM chunks WHERE row_id IN ({','.join('?' * len(batch))})", batch
+                ):
+                    rows[row_id] = Document(id=chunk_id, page_content=content, metadata=json.loads(metadata))
+        return rows
+
+    def search_by_vectors(self, vectors, k: int = 4, filter: Optional[dict] = None):
+        return [[doc for doc, _ in found] for found in self.search_with_scores(vectors, k, filter)]
+
+    def get_chunks(self, where: dict):
+        # (chunk_id, document) pairs matching a filter, in no particular order.
+        clause, values = where_clause(where)
+        with self._connect() as conn:
+            rows = conn.execute(f"SELECT chunk_id, content, metadata FROM chunks WHERE {clause}", values).fetchall()
+        return [(chunk_id, Document(id=chunk_id, page_content=content, metadata=json.loads(metadata))) for chunk_id, content, metadata in rows]
+
+    def get_chunks_by_ids(self, ids: List[str]):
+        found = []
+        with self._connect() as conn:
+            for start in range(0, len(ids), 500):
+                batch = list(ids[start:start + 500])
+                found.extend(conn.execute(
+                    f"SELECT chunk_id, content, metadata FROM chunks WHERE chunk_id IN ({','.join('?' * len(batch))})", batch
+                ))
+        return [(chunk_id, Document(id=chunk_id, page_content=content, metadata=json.loads(metadata))) for chunk_id, content, metadata in found]
+
+    def index_bytes(self):
+        return sum(os.path.getsize(self._index_path(partition)) for partition in self.partitions)
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4, filter: Optional[dict] = None, **kwargs):
+        return self.search_with_scores([embedding], k, filter)[0]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, filter: Optional[dict] = None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, filter)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs):
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k, filter)
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def _select_relevance_score_fn(self):
+        # Embeddings are normalized, so the inner product is already a cosine similarity.
+        return lambda score: score
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding, metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None,
+                   path: str = "./faiss_db", **kwargs):
+        store = cls(path, embedding, **kwargs)
+        store.add_texts(texts, metadatas, ids=ids)
+        store.flush()
+        return store
@@ -1,44 +1,83 @@
-from langchain_core.prompts import PromptTemplate
+from .prompts import LazyPromptTemplate
+from .vectorstore import RETRIEVAL_QUARTERS, recent_filter, retrieve, aretrieve
+from .context_packer import pack_context, FINANCIALS_CONTEXT_TOKENS
+from .metrics_store import get_quarterly_metrics, aget_quarterly_metrics
+from ..metrics import instrumented
+import asyncio
+import json
 import logging
 
 logger = logging.getLogger(__name__)
-def extract_financials(task: str, llm, vector_store):
+
+FINANCIALS_PROMPT = LazyPromptTemplate(
+    input_variables=["context","task"],
+    template=(
+        "You are a financial analyst. From the following quarterly financial report context, "
+        "extract key forecastable business metrics with exact values with units(if any), and periods.If a metric is missing, indicate it as 'N/A'" 
+        "Context:\n{context}\n\n"
+        "End goal:\n{task}\n\n"                
+        "  - quarter\n"
+        "  - total_revenue\n"
+        "  - net_profit\n"
+        "  - operating_margin\n"
+        "  - ebitda\n"
+        "  - earnings_per_share (EPS)\n"
+        "  - pe_ratio\n"
+        "  - roe (Return on Equity)\n"
+        "  - total_expenses\n"
+        "  - finance_costs\n"
+        "  - depreciation_amortization\n"
+        "  - tax_expense\n"
+        "  - free_cash_flow\n"
+        "  - Any other key metrics relevant to financial performance.\n\n"
+        "Ensure all extracted data and commentary are suitable for use in forecasting future quarters."
+    )
+)
+
+REPORT_FILTER = {"type": "report"}
+
+def report_filter(corpus):
+    return recent_filter(corpus, "report") if corpus is not None else REPORT_FILTER
+
+def build_financials_query(task: str):
+    return f"Extract key financial metrics from the latest reports for task: {task}."
+
+def format_metrics(records):
+    return json.dumps(records, indent=2, ensure_ascii=False)
+
+@instrumented("financials")
+def extract_financials(task: str, llm, vector_store=None, chunks=None, embeddings=None, corpus=None):
     try:
-        query = f"Extract key financial metrics from the latest reports for task: {task}."
-        retriever = vector_store.as_retriever()
-        retriever.search_kwargs["filter"] = {"type": "report"}
-        relevant_chunks = retriever.get_relevant_documents(query)
-        context = "\n\n".join([chunk.page_content for chunk in relevant_chunks])
-
-        prompt_template = PromptTemplate(
-            input_variables=["context","task"],
-            template=(
-                "You are a financial analyst. From the following quarterly financial report context, "
-                "extract key forecastable business metrics with exact values with units(if any), and periods.If a metric is missing, indicate it as 'N/A'" 
-                "Context:\n{context}\n\n"
-                "End goal:\n{task}\n\n"                
-                "  - quarter\n"
-                "  - total_revenue\n"
-                "  - net_profit\n"
-                "  - operating_margin\n"
-                "  - ebitda\n"
-                "  - earnings_per_share (EPS)\n"
-                "  - pe_ratio\n"
-                "  - roe (Return on Equity)\n"
-                "  - total_expenses\n"
-                "  - finance_costs\n"
-                "  - depreciation_amortization\n"
-                "  - tax_expense\n"
-                "  - free_cash_flow\n"
-                "  - Any other key metrics relevant to financial performance.\n\n"
-                "Ensure all extracted data and commentary are suitable for use in forecasting future quarters."
-            )
-        )
-        
-        prompt = prompt_template.format(context=context, task=task)
+        if chunks is None and embeddings is not None and corpus is not None:
+            # Per-quarter metrics are extracted once per report at ingest time; only new reports hit the LLM.
+            return format_metrics(get_quarterly_metrics(llm, vector_store, embeddings, corpus, RETRIEVAL_QUARTERS))
+
+        relevant_chunks = chunks
+        if relevant_chunks is None:
+            relevant_chunks = retrieve(vector_store, build_financials_query(task), filter=report_filter(corpus), corpus=corpus)
+        context = pack_context(relevant_chunks, FINANCIALS_CONTEXT_TOKENS, "financials")
+        prompt = FINANCIALS_PROMPT.format(context=context, task=task)
 
         response = llm.invoke(prompt)
         return response.content.strip()
     except Exception as e:
         logger.error(f"Error extracting financials: {e}")
         raise
+
+@instrumented("financials")
+async def aextract_financials(task: str, llm, vector_store=None, chunks=None, embeddings=None, corpus=None):
+    try:
+        if chunks is None and embeddings is not None and corpus is not None:
+            return format_metrics(await aget_quarterly_metrics(llm, vector_store, embeddings, corpus, RETRIEVAL_QUARTERS))
+
+        relevant_chunks = chunks
+        if relevant_chunks is None:
+            relevant_chunks = await aretrieve(vector_store, build_financials_query(task), filter=await asyncio.to_thread(report_filter, corpus), corpus=corpus)
+        context = pack_context(relevant_chunks, FINANCIALS_CONTEXT_TOKENS, "financials")
+        prompt = FINANCIALS_PROMPT.format(context=context, task=task)
+
+        response = await llm.ainvoke(prompt)
+        return response.content.strip()
+    except Exception as e:
+        logger.error(f"Error extracting financials: {e}")
+        raise
@@ -0,0 +1,159 @@
+import argparse
+import logging
+import os
+import resource
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+from .vectorstore import (
+    DOCS_PATH,
+    UnknownTickerError,
+    add_embedded_chunks,
+    get_corpus,
+    get_embeddings,
+    list_tickers,
+    load_manifest,
+    load_pdf_chunks,
+    open_vector_store,
+    save_manifest,
+    sync_vector_store,
+)
+from .metrics_store import get_quarterly_metrics
+from .transcript_summaries import summarize_pending
+
+logger = logging.getLogger(__name__)
+
+def _parse_file(path, doc_type, sha256):
+    start = time.perf_counter()
+    chunks, ids = load_pdf_chunks(path, doc_type, sha256)
+    pages = len({chunk.metadata.get("page") for chunk in chunks})
+    return path, chunks, ids, pages, time.perf_counter() - start
+
+def peak_rss_mb():
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) / 1024
+
+class ParallelIndexer:
+    # Parses PDFs across a process pool and streams their chunks into batched embedding threads.
+    def __init__(self, embeddings, parse_workers: int, batch_size: int, embed_threads: int):
+        self.embeddings = embeddings
+        self.parse_workers = parse_workers
+        self.batch_size = batch_size
+        self.embed_threads = embed_threads
+        self.stats = {"files": 0, "pages": 0, "chunks": 0, "parse_s": 0.0, "embed_s": 0.0, "write_s": 0.0}
+
+    def _embed_batch(self, batch):
+        start = time.perf_counter()
+        vectors = self.embeddings.embed_documents([chunk.page_content for _, chunk in batch])
+        return batch, vectors, time.perf_counter() - start
+
+    def _write(self, vector_store, future):
+        batch, vectors, embed_s = future.result()
+        start = time.perf_counter()
+        add_embedded_chunks(vector_store, [chunk_id for chunk_id, _ in batch], [chunk for _, chunk in batch], vectors)
+        self.stats["embed_s"] += embed_s
+        self.stats["write_s"] += time.perf_counter() - start
+        self.stats["chunks"] += len(batch)
+
+    def __call__(self, vector_store, files: dict):
+        chunk_ids = {}
+        pending = []
+        in_flight = set()
+
+        with ProcessPoolExecutor(max_workers=self.parse_workers) as parsers, \
+                ThreadPoolExecutor(max_workers=self.embed_threads, thread_name_prefix="embed") as embedders:
+
+            def submit(batch):
+                # Keep at most a couple of batches queued per embedding thread to bound memory.
+                while len(in_flight) >= self.embed_threads * 2:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        in_flight.discard(future)
+                        self._write(vector_store, future)
+                in_flight.add(embedders.submit(self._embed_batch, batch))
+
+            parse_jobs = [
+                parsers.submit(_parse_file, path, entry["type"], entry["sha256"])
+                for path, entry in files.items()
+            ]
+            for job in as_completed(parse_jobs):
+                path, chunks, ids, pages, parse_s = job.result()
+                chunk_ids[path] = ids
+                self.stats["files"] += 1
+                self.stats["pages"] += pages
+                self.stats["parse_s"] += parse_s
+                logger.info(f"Parsed {path}: {pages} pages, {len(chunks)} chunks in {parse_s:.2f}s")
+                pending.extend(zip(ids, chunks))
+                while len(pending) >= self.batch_size:
+                    submit(pending[:self.batch_size])
+                    pending = pending[self.batch_size:]
+
+            if pending:
+                submit(pending)
+            for future in as_completed(in_flight):
+                self._write(vector_store, future)
+        return chunk_ids
+
+def print_report(stats, wall_s):
+    print("\nIngestion report")
+    print(f"  files parsed     {stats['files']}")
+    print(f"  pages            {stats['pages']} ({stats['pages'] / wall_s:.1f} pages/s)")
+    print(f"  chunks embedded  {stats['chunks']} ({stats['chunks'] / wall_s:.1f} chunks/s)")
+    print(f"  parse time       {stats['parse_s']:.2f}s (summed over workers)")
+    print(f"  embed time       {stats['embed_s']:.2f}s (summed over threads)")
+    print(f"  write time       {stats['write_s']:.2f}s")
+    print(f"  wall time        {wall_s:.2f}s")
+    print(f"  peak RSS         {peak_rss_mb():.0f} MB")
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally ingest each company's reports and transcripts into its vector store.")
+    parser.add_argument("--ticker", nargs="+", help="Companies to ingest (default: every company under docs/).")
+    parser.add_argument("--parse-workers", type=int, default=os.cpu_count() or 1, help="Processes used to parse PDFs.")
+    parser.add_argument("--batch-size", type=int, default=64, help="Chunks per embedding batch.")
+    parser.add_argument("--embed-threads", type=int, default=2, help="Threads running embedding batches.")
+    parser.add_argument("--full", action="store_true", help="Ignore the manifest and re-ingest every PDF.")
+    parser.add_argument("--derive", action="store_true", help="Also precompute report metrics and transcript summaries with the LLM.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(name)s | %(message)s")
+    try:
+        corpora = [get_corpus(ticker) for ticker in args.ticker or list_tickers()]
+    except UnknownTickerError as e:
+        sys.exit(str(e))
+    if not corpora:
+        sys.exit(f"No documents found under {DOCS_PATH}")
+
+    start = time.perf_counter()
+    embeddings = get_embeddings()
+    logger.info(f"Loaded embeddings in {time.perf_counter() - start:.2f}s")
+
+    indexer = ParallelIndexer(embeddings, args.parse_workers, args.batch_size, args.embed_threads)
+    stores = {}
+    start = time.perf_counter()
+    for corpus in corpora:
+        vector_store = open_vector_store(embeddings, corpus)
+        if args.full and load_manifest(corpus) is not None:
+            vector_store.delete_collection()
+            vector_store = open_vector_store(embeddings, corpus)
+            save_manifest(corpus, {"files": {}})
+        result = sync_vector_store(vector_store, corpus, indexer=indexer)
+        stores[corpus.ticker] = (corpus, vector_store)
+        print(f"Sync {corpus.ticker}: {result}")
+    wall_s = time.perf_counter() - start
+    print_report(indexer.stats, max(wall_s, 1e-9))
+
+    if args.derive:
+        from ..llm import get_llm
+
+        llm = get_llm()
+        for ticker, (corpus, vector_store) in stores.items():
+            start = time.perf_counter()
+            records = get_quarterly_metrics(llm, vector_store, embeddings, corpus)
+            print(f"  {ticker} metrics records  {len(records)} ({time.perf_counter() - start:.2f}s)")
+            start = time.perf_counter()
+            summarized = summarize_pending(llm, vector_store, corpus)
+            print(f"  {ticker} transcripts summarized  {summarized} ({time.perf_counter() - start:.2f}s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import json
+import logging
+import math
+import os
+import re
+import shutil
+import threading
+from collections import Counter
+from typing import Optional
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+# Metadata that keyword searches can filter on, stored as one code array per field.
+FILTER_FIELDS = ("type", "doc_sha256", "quarter", "section")
+CURRENT_FILE = "CURRENT"
+
+TOKEN_PATTERN = re.compile(r"[a-z]+[0-9]*|[0-9][0-9,]*(?:\.[0-9]+)?")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were will with "
+    "we our you your they their into over under about than then also which what who how".split()
+)
+
+def tokenize(text: str):
+    # Keeps the tokens analysts search for intact: "Q1FY26" and "Q1 FY26" both give q1 + fy26,
+    # "FY2026" gives fy26, and "₹1,23,456.50 crore" gives 123456.50 + crore.
+    text = text.lower()
+    text = re.sub(r"\b(q[1-4])(?=fy)", r"\1 ", text)
+    text = re.sub(r"\bfy\s?'?20(\d\d)\b", r"fy\1", text)
+    text = re.sub(r"\bfy\s?'?(\d\d)\b", r"fy\1", text)
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text):
+        if token[0].isdigit():
+            token = token.replace(",", "")
+        if token not in STOPWORDS:
+            tokens.append(token)
+    return tokens
+
+class KeywordIndex:
+    # BM25 over one company's chunks. Postings are CSR arrays (term offsets into chunk/frequency
+    # arrays) saved as .npy files and memory-mapped, like the FAISS partitions.
+    def __init__(self, path: str):
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        self.version = meta["version"]
+        self.chunk_ids = meta["chunk_ids"]
+        self.vocabulary = {term: i for i, term in enumerate(meta["terms"])}
+        self.field_values = {field: {value: code for code, value in enumerate(values)} for field, values in meta["fields"].items()}
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in ("offsets", "postings", "frequencies", "lengths")}
+        self.offsets, self.postings, self.frequencies = arrays["offsets"], arrays["postings"], arrays["frequencies"]
+        self.field_codes = {field: np.load(os.path.join(path, f"field_{field}.npy"), mmap_mode="r") for field in meta["fields"]}
+        # Length normalization is per chunk and query independent, so it is folded in once at load.
+        lengths = np.asarray(arrays["lengths"], dtype=np.float32)
+        self.norms = BM25_K1 * (1 - BM25_B + BM25_B * lengths / max(float(lengths.mean()) if len(lengths) else 1.0, 1.0))
+
+    def __len__(self):
+        return len(self.chunk_ids)
+
+    def _mask(self, filter: Optional[dict]):
+        mask = None
+        for field, value in (filter or {}).items():
+            if field not in self.field_codes:
+                return False
+            # A list accepts any of its values, as in the vector engines.
+            codes = [self.field_values[field][str(v)] for v in (value if isinstance(value, list) else [value])
+                     if str(v) in self.field_values[field]]
+            if not codes:
+                return False
+            matches = np.isin(self.field_codes[field], codes)
+            mask = matches if mask is None else mask & matches
+        return mask
+
+    def search(self, query: str, k: int, filter: Optional[dict] = None):
+        # (chunk_id, score) pairs, best first. Filters on fields the index does not store match nothing.
+        mask = self._mask(filter)
+        if mask is False or not len(self):
+            return []
+        scores = np.zeros(len(self), dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            chunks = self.postings[start:end]
+            frequencies = self.frequencies[start:end].astype(np.float32)
+            idf = math.log(1 + (len(self) - (end - start) + 0.5) / ((end - start) + 0.5))
+            scores[chunks] += idf * frequencies * (BM25_K1 + 1) / (frequencies + self.norms[chunks])
+        if mask is not None:
+            scores[~mask] = 0
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        ranked = candidates[np.argsort(-scores[candidates])]
+        return [(self.chunk_ids[i], float(scores[i])) for i in ranked]
+
+def build_keyword_index(path: str, chunks: list, version: str):
+    # chunks: (chunk_id, Document) pairs. Writes a new versioned directory and then switches
+    # CURRENT to it, so readers never see a half-written index.
+    chunks = sorted(chunks, key=lambda item: item[0])
+    counts = [Counter(tokenize(doc.page_content)) for _, doc in chunks]
+    terms = sorted({term for counter in counts for term in counter})
+    vocabulary = {term: i for i, term in enumerate(terms)}
+
+    postings = [[] for _ in terms]
+    for chunk, counter in enumerate(counts):
+        for term, frequency in counter.items():
+            postings[vocabulary[term]].append((chunk, frequency))
+    offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(entries) for entries in postings])
+    flat = [entry for entries in postings for entry in entries]
+
+    fields = {}
+    field_codes = {}
+    for field in FILTER_FIELDS:
+        values = sorted({str(doc.metadata.get(field)) for _, doc in chunks if doc.metadata.get(field) is not None})
+        codes = {value: code for code, value in enumerate(values)}
+        fields[field] = values
+        field_codes[field] = np.array([codes.get(str(doc.metadata.get(field)), -1) for _, doc in chunks], dtype=np.int32)
+
+    directory = os.path.join(path, version)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+    np.save(os.path.join(directory, "offsets.npy"), offsets)
+    np.save(os.path.join(directory, "postings.npy"), np.array([chunk for chunk, _ in flat], dtype=np.int32))
+    np.save(os.path.join(directory, "frequencies.npy"), np.array([frequency for _, frequency in flat], dtype=np.uint16))
+    np.save(os.path.join(directory, "lengths.npy"), np.array([sum(counter.values()) for counter in counts], dtype=np.int32))
+    for field, codes in field_codes.items():
+        np.save(os.path.join(directory, f"field_{field}.npy"), codes)
+    with open(os.path.join(directory, "meta.json"), "w") as f:
+        json.dump({"version": version, "chunk_ids": [chunk_id for chunk_id, _ in chunks], "terms": terms, "fields": fields}, f)
+
+    with open(os.path.join(path, CURRENT_FILE + ".tmp"), "w") as f:
+        f.write(version)
+    os.replace(os.path.join(path, CURRENT_FILE + ".tmp"), os.path.join(path, CURRENT_FILE))
+    for name in os.listdir(path):
+        if name not in (version, CURRENT_FILE) and os.path.isdir(os.path.join(path, name)):
+            shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+    logger.info(f"Built keyword index {version}: {len(chunks)} chunks, {len(terms)} terms, {len(flat)} postings")
+
+def current_version(path: str):
+    try:
+        with open(os.path.join(path, CURRENT_FILE)) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def load_keyword_index(path: str):
+    # Cached per path; a rebuild by ingest or another worker is picked up on the next call.
+    version = current_version(path)
+    if version is None:
+        return None
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None or index.version != version:
+            index = KeywordIndex(os.path.join(path, version))
+            _indexes[path] = index
+        return index
@@ -1,23 +1,31 @@
-import requests
-from bs4 import BeautifulSoup
+from ..metrics import instrumented
+from .vectorstore import normalize_ticker
+import asyncio
+import hashlib
+import json
+import os
 import re
+import threading
+import time
 import logging
 
 logger = logging.getLogger(__name__)
 
-def fetch_market_data():
-    url = "https://www.screener.in/company/TCS/#quarters"
-    headers = {"User-Agent": "Mozilla/5.0"}
+MARKET_DATA_URL = "https://www.screener.in/company/{ticker}/#quarters"
+HEADERS = {"User-Agent": "Mozilla/5.0"}
+TIMEOUT = 10
+MARKET_DATA_TTL = float(os.getenv("MARKET_DATA_TTL", "900"))
+# After a failed fetch the source is left alone for this long, doubling per failure up to the ttl.
+MARKET_DATA_RETRY_BACKOFF = float(os.getenv("MARKET_DATA_RETRY_BACKOFF", "30"))
+# How long a request without any snapshot waits for a fetch another request already started.
+MARKET_DATA_COLD_WAIT = float(os.getenv("MARKET_DATA_COLD_WAIT", str(TIMEOUT + 5)))
+MARKET_DATA_FILE = os.getenv("MARKET_DATA_FILE")
 
-    try:
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-    except requests.RequestException as e:
-        logger.error(f"Network error while fetching market data: {e}")
-        return {}
+def parse_market_data(html: str):
+    from bs4 import BeautifulSoup
 
     try:
-        soup = BeautifulSoup(response.text, "html.parser")
+        soup = BeautifulSoup(html, "html.parser")
         ratios = {}
         ratios_ul = soup.find("ul", id="top-ratios")
         if ratios_ul:
@@ -52,4 +60,172 @@ def fetch_market_data():
         return filtered
     except Exception as e:
         logger.error(f"Error parsing market data: {e}")
-        return {}
\ No newline at end of file
+        return {}
+
+class HttpSource:
+    def __init__(self, url: str = MARKET_DATA_URL, timeout: float = TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+
+    def fetch(self):
+        import requests
+
+        response = requests.get(self.url, headers=HEADERS, timeout=self.timeout)
+        response.raise_for_status()
+        return response.text
+
+    async def afetch(self):
+        import httpx
+
+        async with httpx.AsyncClient(headers=HEADERS, timeout=self.timeout, follow_redirects=True) as client:
+            response = await client.get(self.url)
+            response.raise_for_status()
+            return response.text
+
+class FileSource:
+    def __init__(self, path: str):
+        self.path = path
+
+    def fetch(self):
+        with open(self.path, encoding="utf-8") as f:
+            return f.read()
+
+    async def afetch(self):
+        return await asyncio.to_thread(self.fetch)
+
+class MarketDataProvider:
+    # Serves the last parsed snapshot immediately and refreshes it in the background once it is older than ttl.
+    def __init__(self, source, ttl: float = MARKET_DATA_TTL):
+        self.source = source
+        self.ttl = ttl
+        self._data = None
+        self._version = None
+        self._fetched_at = None
+        self._last_error = None
+        self._failures = 0
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._idle = threading.Event()
+        self._idle.set()
+        self._refresh_task = None
+
+    def _store(self, html):
+        data = parse_market_data(html)
+        if not data:
+            raise ValueError("No ratios found in market data page")
+        # Content hash, so forecasts cached against an unchanged snapshot survive refreshes and match across workers.
+        version = hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()[:16]
+        with self._lock:
+            self._data = data
+            self._version = version
+            self._fetched_at = time.time()
+            self._last_error = None
+            self._failures = 0
+            self._retry_at = 0.0
+
+    def _record_failure(self, e):
+        with self._lock:
+            self._last_error = str(e)
+            self._failures += 1
+            self._retry_at = time.time() + min(MARKET_DATA_RETRY_BACKOFF * 2 ** (self._failures - 1), max(self.ttl, MARKET_DATA_RETRY_BACKOFF))
+        if self._data is None:
+            logger.error(f"Failed to fetch market data: {e}")
+        else:
+            logger.error(f"Failed to refresh market data, serving snapshot from {self.snapshot()['age_seconds']}s ago: {e}")
+
+    def _finish_refresh(self):
+        with self._lock:
+            self._refreshing = False
+            self._idle.set()
+
+    def refresh(self):
+        try:
+            self._store(self.source.fetch())
+        except Exception as e:
+            self._record_failure(e)
+        finally:
+            self._finish_refresh()
+
+    async def arefresh(self):
+        try:
+            self._store(await self.source.afetch())
+        except Exception as e:
+            self._record_failure(e)
+        finally:
+            self._finish_refresh()
+
+    def _claim_refresh(self):
+        with self._lock:
+            if self._refreshing or time.time() < self._retry_at:
+                return False
+            self._refreshing = True
+            self._idle.clear()
+            return True
+
+    def _is_fresh(self):
+        return self._fetched_at is not None and time.time() - self._fetched_at < self.ttl
+
+    def snapshot(self):
+        age = None if self._fetched_at is None else round(time.time() - self._fetched_at, 1)
+        return {
+            "data": dict(self._data or {}),
+            "version": self._version,
+            "fetched_at": self._fetched_at,
+            "age_seconds": age,
+            "stale": not self._is_fresh(),
+            "last_error": self._last_error,
+        }
+
+    def get(self):
+        if self._data is None:
+            if self._claim_refresh():
+                self.refresh()
+            else:
+                # Another caller is already fetching; its result beats answering without market data.
+                self._idle.wait(MARKET_DATA_COLD_WAIT)
+        elif not self._is_fresh() and self._claim_refresh():
+            threading.Thread(target=self.refresh, name="market-data-refresh", daemon=True).start()
+        return self.snapshot()
+
+    async def aget(self):
+        if self._data is None:
+            if self._claim_refresh():
+                await self.arefresh()
+            elif not self._idle.is_set():
+                await asyncio.to_thread(self._idle.wait, MARKET_DATA_COLD_WAIT)
+        elif not self._is_fresh() and self._claim_refresh():
+            self._refresh_task = asyncio.create_task(self.arefresh())
+        return self.snapshot()
+
+def build_market_data_provider(ticker: str):
+    # MARKET_DATA_URL and MARKET_DATA_FILE may contain a {ticker} placeholder.
+    if MARKET_DATA_FILE:
+        return MarketDataProvider(FileSource(MARKET_DATA_FILE.format(ticker=ticker)))
+    return MarketDataProvider(HttpSource(os.getenv("MARKET_DATA_URL", MARKET_DATA_URL).format(ticker=ticker)))
+
+_providers = {}
+_providers_lock = threading.Lock()
+
+def market_data_provider(ticker=None):
+    # One provider per company, created on first use; each keeps only a small parsed snapshot.
+    ticker = normalize_ticker(ticker)
+    with _providers_lock:
+        provider = _providers.get(ticker)
+        if provider is None:
+            provider = _providers[ticker] = build_market_data_provider(ticker)
+        return provider
+
+@instrumented("market_data")
+def get_market_snapshot(ticker=None):
+    return market_data_provider(ticker).get()
+
+@instrumented("market_data")
+async def aget_market_snapshot(ticker=None):
+    return await market_data_provider(ticker).aget()
+
+def fetch_market_data(ticker=None):
+    return get_market_snapshot(ticker)["data"]
+
+async def afetch_market_data(ticker=None):
+    return (await aget_market_snapshot(ticker))["data"]
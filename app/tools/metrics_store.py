@@ -0,0 +1,187 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+from .prompts import LazyPromptTemplate
+from .context_packer import pack_context, METRICS_CONTEXT_TOKENS
+from .derived_store import connect, manifest_documents, parse_json_output
+from .vectorstore import retrieve_batch
+
+logger = logging.getLogger(__name__)
+
+METRICS_K = int(os.getenv("METRICS_K", "8"))
+METRIC_FIELDS = [
+    "quarter",
+    "total_revenue",
+    "net_profit",
+    "operating_margin",
+    "ebitda",
+    "earnings_per_share",
+    "pe_ratio",
+    "roe",
+    "total_expenses",
+    "finance_costs",
+    "depreciation_amortization",
+    "tax_expense",
+    "free_cash_flow",
+]
+METRICS_QUERY = (
+    "Quarterly financial results: revenue, net profit, operating margin, EBITDA, earnings per share, "
+    "total expenses, finance costs, depreciation and amortization, tax expense, free cash flow."
+)
+
+METRICS_PROMPT = LazyPromptTemplate(
+    input_variables=["context", "fields"],
+    template=(
+        "You are a financial analyst. From the following excerpts of a single quarterly financial report, "
+        "extract the key forecastable business metrics with exact values, units (if any) and periods. "
+        "If a metric is missing, indicate it as 'N/A'.\n\n"
+        "Context:\n{context}\n\n"
+        "Return only a JSON object with exactly these keys: {fields}. "
+        "Add an 'other_metrics' object for any other key metrics relevant to financial performance."
+    )
+)
+
+# Stored as one column per metric so a quarter's record can be queried directly; values stay in the
+# report's own units, with NULL for metrics the report does not give.
+VALUE_FIELDS = [field for field in METRIC_FIELDS if field != "quarter"]
+
+def _ensure_table(conn):
+    columns = ",\n".join(f"            {field} TEXT" for field in VALUE_FIELDS)
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS quarterly_metrics (
+            doc_sha256 TEXT PRIMARY KEY,
+            source TEXT NOT NULL,
+            quarter TEXT,
+{columns},
+            other_metrics TEXT,
+            extracted_at TEXT NOT NULL
+        )
+    """)
+
+def _is_metrics(record):
+    return isinstance(record, dict) and any(field in record for field in METRIC_FIELDS)
+
+def _column_value(value):
+    if value is None or value == "N/A":
+        return None
+    return value if isinstance(value, str) else json.dumps(value)
+
+def _insert(conn, doc_sha256: str, source: str, record: dict, extracted_at: str):
+    columns = ["doc_sha256", "source", "quarter", *VALUE_FIELDS, "other_metrics", "extracted_at"]
+    other = {
+        key: value for key, value in record.items()
+        if key not in METRIC_FIELDS and key not in ("source", "other_metrics")
+    }
+    if isinstance(record.get("other_metrics"), dict):
+        other.update(record["other_metrics"])
+    values = [
+        doc_sha256,
+        source,
+        _column_value(record.get("quarter")),
+        *(_column_value(record.get(field)) for field in VALUE_FIELDS),
+        json.dumps(other) if other else None,
+        extracted_at,
+    ]
+    conn.execute(
+        f"INSERT OR REPLACE INTO quarterly_metrics ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+        values
+    )
+
+def _row_record(row):
+    source, quarter, *values, other = row
+    record = {"source": os.path.basename(source), "quarter": quarter or "N/A"}
+    record.update((field, "N/A" if value is None else value) for field, value in zip(VALUE_FIELDS, values))
+    if other:
+        record["other_metrics"] = json.loads(other)
+    return record
+
+def load_metrics(hashes):
+    with connect(_ensure_table) as conn:
+        placeholders = ",".join("?" * len(hashes))
+        rows = conn.execute(
+            f"SELECT doc_sha256, source, quarter, {', '.join(VALUE_FIELDS)}, other_metrics "
+            f"FROM quarterly_metrics WHERE doc_sha256 IN ({placeholders})",
+            list(hashes)
+        ).fetchall()
+    return {row[0]: _row_record(row[1:]) for row in rows}
+
+def save_metrics(doc_sha256: str, source: str, record: dict):
+    with connect(_ensure_table) as conn:
+        _insert(conn, doc_sha256, source, record, datetime.now(timezone.utc).isoformat())
+
+def _metrics_prompt(vector_store, embeddings, doc_sha256: str, corpus=None):
+    chunks = retrieve_batch(vector_store, embeddings, [(METRICS_QUERY, {"doc_sha256": doc_sha256})], k=METRICS_K, corpus=corpus)[0]
+    context = pack_context(chunks, METRICS_CONTEXT_TOKENS, "metrics")
+    return METRICS_PROMPT.format(context=context, fields=", ".join(METRIC_FIELDS))
+
+def _store_record(doc_sha256: str, source: str, text: str):
+    parsed = parse_json_output(text)
+    if not _is_metrics(parsed):
+        # Returned for this request only, so the next one retries the extraction.
+        logger.warning(f"Metrics extraction for {source} did not return a JSON object; not storing it.")
+        return {"source": os.path.basename(source), **(parsed if isinstance(parsed, dict) else {"raw": parsed})}
+    save_metrics(doc_sha256, source, parsed)
+    return load_metrics([doc_sha256])[doc_sha256]
+
+# One extraction per document at a time in this process: the background precompute and a cold
+# request asking for the same report wait for each other instead of both calling the LLM.
+_extraction_locks = {}
+_extraction_locks_lock = threading.Lock()
+
+def _extraction_lock(doc_sha256: str):
+    with _extraction_locks_lock:
+        return _extraction_locks.setdefault(doc_sha256, threading.Lock())
+
+def _extract(llm, vector_store, embeddings, corpus, doc_sha256: str, source: str):
+    with _extraction_lock(doc_sha256):
+        stored = load_metrics([doc_sha256])
+        if stored:
+            return stored[doc_sha256]
+        logger.info(f"No precomputed metrics for {source}, extracting with the LLM.")
+        response = llm.invoke(_metrics_prompt(vector_store, embeddings, doc_sha256, corpus))
+        return _store_record(doc_sha256, source, response.content)
+
+async def _aextract(llm, vector_store, embeddings, corpus, doc_sha256: str, source: str):
+    lock = _extraction_lock(doc_sha256)
+    acquired = asyncio.ensure_future(asyncio.to_thread(lock.acquire))
+    try:
+        await asyncio.shield(acquired)
+    except asyncio.CancelledError:
+        # The worker thread still takes the lock; hand it straight back once it does.
+        acquired.add_done_callback(lambda _: lock.release())
+        raise
+    try:
+        stored = await asyncio.to_thread(load_metrics, [doc_sha256])
+        if stored:
+            return stored[doc_sha256]
+        logger.info(f"No precomputed metrics for {source}, extracting with the LLM.")
+        prompt = await asyncio.to_thread(_metrics_prompt, vector_store, embeddings, doc_sha256, corpus)
+        response = await llm.ainvoke(prompt)
+        return await asyncio.to_thread(_store_record, doc_sha256, source, response.content)
+    finally:
+        lock.release()
+
+def get_quarterly_metrics(llm, vector_store, embeddings, corpus, last_quarters: int = 0):
+    documents = manifest_documents(corpus, "report", last_quarters)
+    if not documents:
+        return []
+    records = load_metrics(documents)
+    for doc_sha256, source in documents.items():
+        if doc_sha256 not in records:
+            records[doc_sha256] = _extract(llm, vector_store, embeddings, corpus, doc_sha256, source)
+    return [records[doc_sha256] for doc_sha256 in documents]
+
+async def aget_quarterly_metrics(llm, vector_store, embeddings, corpus, last_quarters: int = 0):
+    documents = manifest_documents(corpus, "report", last_quarters)
+    if not documents:
+        return []
+    records = await asyncio.to_thread(load_metrics, documents)
+    missing = [doc_sha256 for doc_sha256 in documents if doc_sha256 not in records]
+    extracted = await asyncio.gather(
+        *(_aextract(llm, vector_store, embeddings, corpus, doc_sha256, documents[doc_sha256]) for doc_sha256 in missing)
+    )
+    records.update(zip(missing, extracted))
+    return [records[doc_sha256] for doc_sha256 in documents]
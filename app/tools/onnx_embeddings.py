@@ -0,0 +1,117 @@
+import argparse
+import logging
+import os
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_community.embeddings.huggingface import DEFAULT_QUERY_BGE_INSTRUCTION_EN
+
+logger = logging.getLogger(__name__)
+
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "./onnx_models/all-MiniLM-L6-v2")
+ONNX_QUANTIZED = os.getenv("ONNX_QUANTIZED", "true").lower() == "true"
+ONNX_INTRA_OP_THREADS = int(os.getenv("ONNX_INTRA_OP_THREADS", "0"))
+ONNX_BATCH_SIZE = int(os.getenv("ONNX_BATCH_SIZE", "32"))
+# sentence-transformers truncates all-MiniLM-L6-v2 inputs at 256 tokens.
+ONNX_MAX_LENGTH = int(os.getenv("ONNX_MAX_LENGTH", "256"))
+FP32_FILE = "model.onnx"
+INT8_FILE = "model.int8.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+
+class OnnxEmbeddings(Embeddings):
+    # Drop-in for HuggingFaceBgeEmbeddings(all-MiniLM-L6-v2): same mean pooling, normalization, newline
+    # handling and query instruction, so stores built with either backend stay comparable.
+    def __init__(self, model_dir: str = ONNX_MODEL_DIR, quantized: bool = ONNX_QUANTIZED,
+                 threads: int = ONNX_INTRA_OP_THREADS, batch_size: int = ONNX_BATCH_SIZE,
+                 query_instruction: str = DEFAULT_QUERY_BGE_INSTRUCTION_EN):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        path = os.path.join(model_dir, INT8_FILE if quantized else FP32_FILE)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"ONNX model not found at {path}. Export it with: python -m app.tools.onnx_embeddings --export")
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=ONNX_MAX_LENGTH)
+        self.tokenizer.enable_padding(pad_id=self.tokenizer.token_to_id("[PAD]") or 0, pad_token="[PAD]")
+        self.batch_size = batch_size
+        self.query_instruction = query_instruction
+        logger.info(f"ONNX embeddings loaded from {path} (intra-op threads: {threads or 'auto'})")
+
+    def _embed_batch(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        feeds = {
+            "input_ids": np.array([encoding.ids for encoding in encodings], dtype=np.int64),
+            "attention_mask": mask,
+            "token_type_ids": np.array([encoding.type_ids for encoding in encodings], dtype=np.int64),
+        }
+        hidden = self.session.run(None, {name: value for name, value in feeds.items() if name in self.input_names})[0]
+        weights = mask[..., None].astype(np.float32)
+        pooled = (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def embed_documents(self, texts):
+        texts = [text.replace("\n", " ") for text in texts]
+        # Batching texts of similar length keeps padding, and so wasted compute, low.
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            positions = order[start:start + self.batch_size]
+            for position, vector in zip(positions, self._embed_batch([texts[i] for i in positions])):
+                vectors[position] = vector.tolist()
+        return vectors
+
+    def embed_query(self, text):
+        return self.embed_documents([self.query_instruction + text])[0]
+
+def export_model(model_name: str, output_dir: str = ONNX_MODEL_DIR, quantize: bool = True, opset: int = 17):
+    # Needs torch and transformers, but only here: serving workers load the exported files with onnxruntime alone.
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    repo = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+    tokenizer = AutoTokenizer.from_pretrained(repo)
+    model = AutoModel.from_pretrained(repo).eval()
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer.save_pretrained(output_dir)
+
+    sample = tokenizer(["An example sentence to trace the graph."], return_tensors="pt")
+    names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in names + ["last_hidden_state"]}
+    fp32_path = os.path.join(output_dir, FP32_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            model, tuple(sample[name] for name in names), fp32_path,
+            input_names=names, output_names=["last_hidden_state"], dynamic_axes=dynamic_axes, opset_version=opset
+        )
+    logger.info(f"Exported {repo} to {fp32_path}")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        int8_path = os.path.join(output_dir, INT8_FILE)
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+        logger.info(f"Quantized weights to int8 at {int8_path}")
+    return output_dir
+
+def main():
+    from .vectorstore import EMBEDDING_MODEL
+
+    parser = argparse.ArgumentParser(description="Export the embedding model to ONNX for EMBEDDINGS_BACKEND=onnx.")
+    parser.add_argument("--export", action="store_true", required=True)
+    parser.add_argument("--model", default=EMBEDDING_MODEL)
+    parser.add_argument("--output-dir", default=ONNX_MODEL_DIR)
+    parser.add_argument("--no-quantize", action="store_true", help="Skip the dynamic int8 quantized copy.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(name)s | %(message)s")
+    export_model(args.model, args.output_dir, quantize=not args.no_quantize)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,13 @@
+class LazyPromptTemplate:
+    # Takes PromptTemplate's arguments and builds it on first use: langchain_core.prompts pulls in the
+    # output parsers and requests, which importing the app should not pay for.
+    def __init__(self, **kwargs):
+        self._kwargs = kwargs
+        self._template = None
+
+    def format(self, **kwargs):
+        if self._template is None:
+            from langchain_core.prompts import PromptTemplate
+
+            self._template = PromptTemplate(**self._kwargs)
+        return self._template.format(**kwargs)
@@ -1,32 +1,72 @@
-from langchain_core.prompts import PromptTemplate
+from .prompts import LazyPromptTemplate
+from .vectorstore import RETRIEVAL_QUARTERS, recent_filter, retrieve, aretrieve
+from .context_packer import pack_context, TRANSCRIPTS_CONTEXT_TOKENS
+from .transcript_summaries import cached_summaries
+from ..metrics import instrumented
+import asyncio
+import json
 import logging
 
 logger = logging.getLogger(__name__)
 
-def analyze_transcripts(task: str, llm, vector_store):
+TRANSCRIPTS_PROMPT = LazyPromptTemplate(
+    input_variables=["context","task"],
+    template=(
+        "You are a financial analyst. Do a qualitative analysis of the provided context on latest earnings call transcripts and extract the following:\n"
+        "1. Recurring Themes: Common topics, strategic initiatives, or challenges discussed across multiple calls especially those relevant to future business performance.\n"
+        "2. Management Sentiment: Access Overall tone regarding performance and future outlook. Use categories: 'optimistic', 'cautious', 'neutral', 'negative'.\n"
+        "3. Forward-Looking Statements: Analyse Any specific outlook, guidance, or expectations for future periods (e.g., 'expect revenue growth to moderate', 'target 20% increase').\n"
+        "4. Risks & Opportunities: Identify specific external or internal factors mentioned that could impact future performance.and indicate whether they are likely to be short-term or long-term in nature.\n\n"
+        "Context:\n{context}\n\n"
+        "End goal:\n{task}\n\n" 
+        "rovide the extracted information in a structured JSON format, including any relevant qualitative metrics or analysis that could inform financial forecasting for future quarters."
+    )
+)
+
+TRANSCRIPT_FILTER = {"type": "transcript"}
+
+def transcript_filter(corpus):
+    return recent_filter(corpus, "transcript") if corpus is not None else TRANSCRIPT_FILTER
+
+def build_transcripts_query(task: str):
+    return f"Extract qualitative insights from the latest 2-3 earnings call transcripts for task: {task}."
+
+def summaries_context(summaries):
+    return json.dumps(summaries, indent=2, ensure_ascii=False)
+
+@instrumented("qualitative")
+def analyze_transcripts(task: str, llm, vector_store=None, chunks=None, corpus=None):
     try:
-        query = f"Extract qualitative insights from the latest 2-3 earnings call transcripts for task: {task}."
-        retriever = vector_store.as_retriever()
-        retriever.search_kwargs["filter"] = {"type": "transcript"}
-        relevant_chunks = retriever.get_relevant_documents(query)
-        context = "\n\n".join([chunk.page_content for chunk in relevant_chunks])
-
-        prompt_template = PromptTemplate(
-            input_variables=["context","task"],
-            template=(
-                "You are a financial analyst. Do a qualitative analysis of the provided context on latest earnings call transcripts and extract the following:\n"
-                "1. Recurring Themes: Common topics, strategic initiatives, or challenges discussed across multiple calls especially those relevant to future business performance.\n"
-                "2. Management Sentiment: Access Overall tone regarding performance and future outlook. Use categories: 'optimistic', 'cautious', 'neutral', 'negative'.\n"
-                "3. Forward-Looking Statements: Analyse Any specific outlook, guidance, or expectations for future periods (e.g., 'expect revenue growth to moderate', 'target 20% increase').\n"
-                "4. Risks & Opportunities: Identify specific external or internal factors mentioned that could impact future performance.and indicate whether they are likely to be short-term or long-term in nature.\n\n"
-                "Context:\n{context}\n\n"
-                "End goal:\n{task}\n\n" 
-                "rovide the extracted information in a structured JSON format, including any relevant qualitative metrics or analysis that could inform financial forecasting for future quarters."
-            )
-        )
-        prompt = prompt_template.format(context=context, task=task)
+        # Per-call summaries cover every transcript in far fewer tokens than raw chunks.
+        summaries, pending = cached_summaries(corpus, RETRIEVAL_QUARTERS) if corpus is not None else ([], [])
+        if summaries and not pending and chunks is None:
+            context = summaries_context(summaries)
+        else:
+            relevant_chunks = chunks
+            if relevant_chunks is None:
+                relevant_chunks = retrieve(vector_store, build_transcripts_query(task), filter=transcript_filter(corpus), corpus=corpus)
+            context = pack_context(relevant_chunks, TRANSCRIPTS_CONTEXT_TOKENS, "transcripts")
+        prompt = TRANSCRIPTS_PROMPT.format(context=context, task=task)
         response = llm.invoke(prompt)
         return response.content.strip()
     except Exception as e:
         logger.error(f"Error analyzing transcripts: {e}")
-        raise
\ No newline at end of file
+        raise
+
+@instrumented("qualitative")
+async def aanalyze_transcripts(task: str, llm, vector_store=None, chunks=None, corpus=None):
+    try:
+        summaries, pending = await asyncio.to_thread(cached_summaries, corpus, RETRIEVAL_QUARTERS) if corpus is not None else ([], [])
+        if summaries and not pending and chunks is None:
+            context = summaries_context(summaries)
+        else:
+            relevant_chunks = chunks
+            if relevant_chunks is None:
+                relevant_chunks = await aretrieve(vector_store, build_transcripts_query(task), filter=await asyncio.to_thread(transcript_filter, corpus), corpus=corpus)
+            context = pack_context(relevant_chunks, TRANSCRIPTS_CONTEXT_TOKENS, "transcripts")
+        prompt = TRANSCRIPTS_PROMPT.format(context=context, task=task)
+        response = await llm.ainvoke(prompt)
+        return response.content.strip()
+    except Exception as e:
+        logger.error(f"Error analyzing transcripts: {e}")
+        raise
@@ -0,0 +1,122 @@
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from .prompts import LazyPromptTemplate
+from .derived_store import connect, manifest_documents, parse_json_output
+from .vectorstore import get_document_chunks
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_CHUNKS_PER_CALL = int(os.getenv("SUMMARY_CHUNKS_PER_CALL", "4"))
+SUMMARY_MAP_CONCURRENCY = int(os.getenv("SUMMARY_MAP_CONCURRENCY", "4"))
+SUMMARY_KEYS = "recurring_themes, management_sentiment, forward_looking_statements, risks_and_opportunities"
+
+MAP_PROMPT = LazyPromptTemplate(
+    input_variables=["context", "keys"],
+    template=(
+        "You are a financial analyst. Below is one section of an earnings call transcript. Extract:\n"
+        "1. Recurring Themes: topics, strategic initiatives or challenges relevant to future business performance.\n"
+        "2. Management Sentiment: 'optimistic', 'cautious', 'neutral' or 'negative', with a short justification.\n"
+        "3. Forward-Looking Statements: any outlook, guidance or expectations for future periods.\n"
+        "4. Risks & Opportunities: factors that could impact future performance, marked short-term or long-term.\n\n"
+        "Section:\n{context}\n\n"
+        "Return only a JSON object with the keys: {keys}. Use empty lists when the section has nothing relevant."
+    )
+)
+
+REDUCE_PROMPT = LazyPromptTemplate(
+    input_variables=["partials", "keys"],
+    template=(
+        "You are a financial analyst. The following JSON objects summarize consecutive sections of one earnings call. "
+        "Merge them into a single compact summary of the whole call: de-duplicate themes, keep every distinct "
+        "forward-looking statement, and give one overall management sentiment.\n\n"
+        "Section summaries:\n{partials}\n\n"
+        "Return only a JSON object with the keys: {keys}."
+    )
+)
+
+def _ensure_table(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS transcript_summaries (
+            doc_sha256 TEXT PRIMARY KEY,
+            source TEXT NOT NULL,
+            summary TEXT NOT NULL,
+            summarized_at TEXT NOT NULL
+        )
+    """)
+
+def load_summaries(hashes):
+    with connect(_ensure_table) as conn:
+        placeholders = ",".join("?" * len(hashes))
+        rows = conn.execute(
+            f"SELECT doc_sha256, summary FROM transcript_summaries WHERE doc_sha256 IN ({placeholders})",
+            list(hashes)
+        ).fetchall()
+    return {doc_sha256: json.loads(summary) for doc_sha256, summary in rows}
+
+def save_summary(doc_sha256: str, source: str, summary: dict):
+    with connect(_ensure_table) as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO transcript_summaries (doc_sha256, source, summary, summarized_at) VALUES (?, ?, ?, ?)",
+            (doc_sha256, source, json.dumps(summary), datetime.now(timezone.utc).isoformat())
+        )
+
+def cached_summaries(corpus, last_quarters: int = 0):
+    documents = manifest_documents(corpus, "transcript", last_quarters)
+    summaries = load_summaries(documents) if documents else {}
+    pending = [doc_sha256 for doc_sha256 in documents if doc_sha256 not in summaries]
+    return [summaries[doc_sha256] for doc_sha256 in documents if doc_sha256 in summaries], pending
+
+def _merged(before: str, after: str):
+    # The two chunks joined on their longest overlap, or None when they do not overlap.
+    for size in range(min(len(before), len(after)), 0, -1):
+        if before.endswith(after[:size]):
+            return before + after[size:]
+    return None
+
+def _covering_chunks(chunks):
+    # Pages are split separately, so overlap never crosses a page. Within a page a chunk is only
+    # dropped when the kept chunk before it and the chunk after it overlap and contain all of its text.
+    kept = []
+    for i, chunk in enumerate(chunks):
+        previous = chunks[i - 1] if i > 0 else None
+        following = chunks[i + 1] if i + 1 < len(chunks) else None
+        if previous is not None and following is not None and kept and kept[-1] is previous \
+                and previous.metadata.get("page") == chunk.metadata.get("page") == following.metadata.get("page"):
+            merged = _merged(previous.page_content, following.page_content)
+            if merged is not None and chunk.page_content in merged:
+                continue
+        kept.append(chunk)
+    return kept
+
+def _map_prompts(vector_store, doc_sha256: str):
+    chunks = _covering_chunks(get_document_chunks(vector_store, doc_sha256))
+    return [
+        MAP_PROMPT.format(
+            context="\n\n".join(chunk.page_content for chunk in chunks[i:i + SUMMARY_CHUNKS_PER_CALL]),
+            keys=SUMMARY_KEYS
+        )
+        for i in range(0, len(chunks), SUMMARY_CHUNKS_PER_CALL)
+    ]
+
+def _reduce_prompt(responses):
+    partials = "\n".join(json.dumps(parse_json_output(response.content), ensure_ascii=False) for response in responses)
+    return REDUCE_PROMPT.format(partials=partials, keys=SUMMARY_KEYS)
+
+def _summary(source: str, text: str):
+    return {"source": os.path.basename(source), **parse_json_output(text)}
+
+def summarize_transcript(llm, vector_store, doc_sha256: str, source: str):
+    responses = llm.batch(_map_prompts(vector_store, doc_sha256), config={"max_concurrency": SUMMARY_MAP_CONCURRENCY})
+    summary = _summary(source, llm.invoke(_reduce_prompt(responses)).content)
+    save_summary(doc_sha256, source, summary)
+    return summary
+
+def summarize_pending(llm, vector_store, corpus):
+    documents = manifest_documents(corpus, "transcript")
+    _, pending = cached_summaries(corpus)
+    for doc_sha256 in pending:
+        logger.info(f"Summarizing transcript {documents[doc_sha256]}")
+        summarize_transcript(llm, vector_store, doc_sha256, documents[doc_sha256])
+    return len(pending)
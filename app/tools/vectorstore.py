@@ -1,69 +1,508 @@
 import os
+import asyncio
+import hashlib
+import json
 import logging
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
-from langchain.vectorstores import Chroma
-from langchain.embeddings import HuggingFaceBgeEmbeddings
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.document_loaders import PyPDFDirectoryLoader
+from langchain_core.documents import Document
+from .chunk_metadata import document_period, page_sections
+from .faiss_store import PartitionedFaissStore
+from .keyword_index import build_keyword_index, current_version, load_keyword_index
 
-logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
+# Resolved against the app package rather than the working directory, so the server and the CLIs
+# find the same corpus and stores wherever they are started from.
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHROMA_PATH = os.getenv("CHROMA_PATH", os.path.join(APP_DIR, "chroma_db"))
+DOCS_PATH = os.getenv("DOCS_PATH", os.path.join(APP_DIR, "docs"))
+REPORTS_PATH = os.path.join(DOCS_PATH, "Reports")
+TRANSCRIPTS_PATH = os.path.join(DOCS_PATH, "Transcripts")
+DEFAULT_TICKER = os.getenv("DEFAULT_TICKER", "TCS").upper()
+TICKER_PATTERN = re.compile(r"^[A-Z0-9][A-Z0-9&.\-]{0,19}$")
+SEGMENT_DIR_PATTERN = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$")
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+EMBEDDINGS_BACKEND = os.getenv("EMBEDDINGS_BACKEND", "torch")
+VECTOR_ENGINE = os.getenv("VECTOR_ENGINE", "chroma")
+RETRIEVAL_WORKERS = int(os.getenv("RETRIEVAL_WORKERS", "4"))
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "4"))
+# The tools only consider documents from the latest RETRIEVAL_QUARTERS quarters (0 = all).
+RETRIEVAL_QUARTERS = int(os.getenv("RETRIEVAL_QUARTERS", "4"))
+# Bumped when load_pdf_chunks stamps new metadata, so existing stores are re-indexed once.
+CHUNK_METADATA_VERSION = 2
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "512"))
+# Fuse BM25 keyword hits with vector hits; each side contributes HYBRID_CANDIDATES ranked chunks.
+HYBRID_RETRIEVAL = os.getenv("HYBRID_RETRIEVAL", "true").lower() == "true"
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+RRF_K = int(os.getenv("RRF_K", "60"))
 
-CHROMA_PATH = "./chroma_db"
-REPORTS_PATH = "docs/Reports"
-TRANSCRIPTS_PATH = "docs/Transcripts"
+# Chroma and the embedding model are synchronous; a bounded pool keeps retrieval off the event loop.
+_retrieval_executor = ThreadPoolExecutor(max_workers=RETRIEVAL_WORKERS, thread_name_prefix="retrieval")
+# Chroma stores are built and its system cache cleared under one lock, so a store being opened never
+# finds its system cleared halfway through.
+_chroma_systems_lock = threading.Lock()
+_manifest_cache = {}
+_manifest_cache_lock = threading.Lock()
+_splitter = None
 
-def create_or_load_vector_store():
-    try:
-        embeddings = HuggingFaceBgeEmbeddings(model_name="all-MiniLM-L6-v2")
+class UnknownTickerError(LookupError):
+    pass
+
+class Corpus:
+    # One company's documents and the vector store that indexes only them.
+    def __init__(self, ticker: str, reports_path: str, transcripts_path: str, store_path: str):
+        self.ticker = ticker
+        self.reports_path = reports_path
+        self.transcripts_path = transcripts_path
+        self.store_path = store_path
+        self.faiss_path = os.path.join(store_path, "faiss")
+        self.keyword_path = os.path.join(store_path, "keywords")
+        # Each engine keeps its own manifest, so switching VECTOR_ENGINE indexes the corpus into the new one.
+        self.manifest_path = os.path.join(self.faiss_path if VECTOR_ENGINE == "faiss" else store_path, "manifest.json")
+
+def normalize_ticker(ticker: Optional[str]):
+    ticker = (ticker or DEFAULT_TICKER).strip().upper()
+    if not TICKER_PATTERN.match(ticker):
+        raise UnknownTickerError(f"Invalid ticker: {ticker}")
+    return ticker
+
+def get_corpus(ticker: Optional[str] = None):
+    # Companies live under docs/<TICKER>/{Reports,Transcripts} with a store at chroma_db/<TICKER>.
+    # The default ticker may still use the original single-company layout.
+    ticker = normalize_ticker(ticker)
+    folder = os.path.join(DOCS_PATH, ticker)
+    if os.path.isdir(folder):
+        return Corpus(ticker, os.path.join(folder, "Reports"), os.path.join(folder, "Transcripts"), os.path.join(CHROMA_PATH, ticker))
+    if ticker == DEFAULT_TICKER and (os.path.isdir(REPORTS_PATH) or os.path.isdir(TRANSCRIPTS_PATH)):
+        return Corpus(ticker, REPORTS_PATH, TRANSCRIPTS_PATH, CHROMA_PATH)
+    raise UnknownTickerError(f"No documents for ticker: {ticker}")
+
+def list_tickers():
+    tickers = set()
+    if os.path.isdir(DOCS_PATH):
+        for name in os.listdir(DOCS_PATH):
+            if TICKER_PATTERN.match(name) and os.path.isdir(os.path.join(DOCS_PATH, name)):
+                tickers.add(name)
+    if os.path.isdir(REPORTS_PATH) or os.path.isdir(TRANSCRIPTS_PATH):
+        tickers.add(DEFAULT_TICKER)
+    return sorted(tickers)
+
+def index_bytes(corpus: Corpus):
+    # Chroma keeps each collection's HNSW segment files in memory once queried; their size on disk
+    # is a close proxy for what a loaded store costs. FAISS partitions are mapped whole.
+    total = 0
+    if VECTOR_ENGINE == "faiss":
+        if not os.path.isdir(corpus.faiss_path):
+            return 0
+        return sum(entry.stat().st_size for entry in os.scandir(corpus.faiss_path) if entry.name.endswith(".index"))
+    if not os.path.isdir(corpus.store_path):
+        return 0
+    for entry in os.scandir(corpus.store_path):
+        if entry.is_dir() and SEGMENT_DIR_PATTERN.match(entry.name):
+            for root, _, names in os.walk(entry.path):
+                total += sum(os.path.getsize(os.path.join(root, name)) for name in names)
+    return total
+
+def get_embeddings(backend: Optional[str] = None):
+    # "onnx" runs an exported (optionally int8) copy of the same model through ONNX Runtime, without torch.
+    backend = backend or EMBEDDINGS_BACKEND
+    if backend == "onnx":
+        from .onnx_embeddings import OnnxEmbeddings
+
+        return OnnxEmbeddings()
+    if backend != "torch":
+        raise ValueError(f"Unknown EMBEDDINGS_BACKEND: {backend}")
+    from langchain_community.embeddings import HuggingFaceBgeEmbeddings
+
+    return HuggingFaceBgeEmbeddings(model_name=EMBEDDING_MODEL)
+
+def corpus_fingerprint(corpus: Corpus):
+    digest = hashlib.sha256()
+    for folder in (corpus.reports_path, corpus.transcripts_path):
+        if not os.path.isdir(folder):
+            continue
+        for name in sorted(os.listdir(folder)):
+            if not name.lower().endswith(".pdf"):
+                continue
+            stat = os.stat(os.path.join(folder, name))
+            digest.update(f"{folder}/{name}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()
+
+def chroma_where(filter: Optional[dict]):
+    # Filters map fields to a value or a list of accepted values; Chroma wants operators for both.
+    clauses = [{key: {"$in": value} if isinstance(value, list) else value} for key, value in (filter or {}).items()]
+    if len(clauses) > 1:
+        return {"$and": clauses}
+    return clauses[0] if clauses else None
+
+def recent_quarters(corpus: Corpus, doc_type: Optional[str] = None, last: int = RETRIEVAL_QUARTERS):
+    # Latest `last` quarters that have documents of this type, newest first.
+    if last <= 0:
+        return []
+    manifest, derived = cached_manifest(corpus)
+    key = ("recent_quarters", doc_type, last)
+    if key not in derived:
+        quarters = {
+            (entry["fiscal_year"], entry["fiscal_quarter"]): entry["quarter"]
+            for entry in manifest["files"].values()
+            if entry.get("quarter") and (doc_type is None or entry["type"] == doc_type)
+        }
+        derived[key] = [quarters[key] for key in sorted(quarters, reverse=True)[:last]]
+    return list(derived[key])
+
+def recent_filter(corpus: Optional[Corpus], doc_type: str, last: int = RETRIEVAL_QUARTERS):
+    # Older filings never enter the candidate set, so retrieval cost stays flat as quarters pile up.
+    filter = {"type": doc_type}
+    quarters = recent_quarters(corpus, doc_type, last) if corpus is not None else []
+    if quarters:
+        filter["quarter"] = quarters
+    return filter
 
-        if os.path.exists(CHROMA_PATH):
-            logging.info("Existing ChromaDB found. Loading...")
-            return Chroma(persist_directory=CHROMA_PATH, embedding_function=embeddings)
+def retrieve(vector_store, query: str, filter: Optional[dict] = None, corpus: Optional[Corpus] = None):
+    if HYBRID_RETRIEVAL and corpus is not None:
+        return retrieve_batch(vector_store, vector_store.embeddings, [(query, filter)], corpus=corpus)[0]
+    retriever = vector_store.as_retriever()
+    if filter:
+        retriever.search_kwargs["filter"] = filter if isinstance(vector_store, PartitionedFaissStore) else chroma_where(filter)
+    return retriever.get_relevant_documents(query)
 
-        logging.info("ChromaDB not found. Creating a new one...")
+async def aretrieve(vector_store, query: str, filter: Optional[dict] = None, corpus: Optional[Corpus] = None):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_retrieval_executor, retrieve, vector_store, query, filter, corpus)
 
-        if not os.path.isdir(REPORTS_PATH):
-            raise FileNotFoundError(f"Reports folder missing at path: {REPORTS_PATH}")
-        if not os.path.isdir(TRANSCRIPTS_PATH):
-            raise FileNotFoundError(f"Transcripts folder missing at path: {TRANSCRIPTS_PATH}")
+class QueryEmbeddingCache:
+    # Task strings repeat heavily, so their query embeddings are kept in a small LRU.
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._vectors = OrderedDict()
+        self._lock = threading.Lock()
 
-        loader_reports = PyPDFDirectoryLoader(REPORTS_PATH)
-        loader_transcripts = PyPDFDirectoryLoader(TRANSCRIPTS_PATH)
+    def embed(self, embeddings, queries: list):
+        found = {}
+        with self._lock:
+            for query in dict.fromkeys(queries):
+                if query in self._vectors:
+                    self._vectors.move_to_end(query)
+                    found[query] = self._vectors[query]
+        misses = [query for query in dict.fromkeys(queries) if query not in found]
+        if misses:
+            # One forward pass for every uncached query; mirrors embed_query's instruction prefix.
+            instruction = getattr(embeddings, "query_instruction", "")
+            vectors = embeddings.embed_documents([instruction + query for query in misses])
+            found.update(zip(misses, vectors))
+            with self._lock:
+                for query, vector in zip(misses, vectors):
+                    self._vectors[query] = vector
+                while len(self._vectors) > self.maxsize:
+                    self._vectors.popitem(last=False)
+        return [found[query] for query in queries]
 
-        documents_reports = loader_reports.load()
-        documents_transcripts = loader_transcripts.load()
+query_embedding_cache = QueryEmbeddingCache(QUERY_EMBEDDING_CACHE_SIZE)
 
-        if not documents_reports and not documents_transcripts:
-            raise ValueError("No PDF documents found in both Reports and Transcripts folders.")
+def search_by_vectors(vector_store, vectors: list, k: int = RETRIEVAL_K, filter: Optional[dict] = None):
+    if isinstance(vector_store, PartitionedFaissStore):
+        return vector_store.search_by_vectors(vectors, k, filter)
+    result = vector_store._collection.query(
+        query_embeddings=vectors,
+        n_results=k,
+        where=chroma_where(filter),
+        include=["documents", "metadatas"],
+    )
+    return [
+        [Document(id=chunk_id, page_content=text, metadata=metadata or {}) for chunk_id, text, metadata in zip(ids, texts, metadatas)]
+        for ids, texts, metadatas in zip(result["ids"], result["documents"], result["metadatas"])
+    ]
 
-        for doc in documents_reports:
-            doc.metadata["type"] = "report"
-        for doc in documents_transcripts:
-            doc.metadata["type"] = "transcript"
+def get_chunks(vector_store, ids: Optional[list] = None):
+    # (chunk_id, Document) pairs for the given ids, or for the whole store.
+    if isinstance(vector_store, PartitionedFaissStore):
+        return vector_store.get_chunks_by_ids(ids) if ids is not None else vector_store.get_chunks({})
+    result = vector_store._collection.get(ids=ids, include=["documents", "metadatas"])
+    return [
+        (chunk_id, Document(id=chunk_id, page_content=text, metadata=metadata or {}))
+        for chunk_id, text, metadata in zip(result["ids"], result["documents"], result["metadatas"])
+    ]
 
-        all_documents = documents_reports + documents_transcripts
-        logging.info(f"Loaded {len(all_documents)} documents from Reports and Transcripts.")
+def rebuild_keyword_index(vector_store, corpus: Corpus, version: str):
+    build_keyword_index(corpus.keyword_path, get_chunks(vector_store), version)
 
-        splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=500)
-        split_docs = splitter.split_documents(all_documents)
-        logging.info(f"Split documents into {len(split_docs)} chunks.")
+def reciprocal_rank_fusion(rankings: list, k: int):
+    scores = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1 / (RRF_K + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)[:k]
 
-        vectorstore = Chroma.from_documents(
-            split_docs,
-            embedding_function=embeddings,
-            persist_directory=CHROMA_PATH
+def fuse_keyword_hits(vector_store, keywords, requests: list, results: list, k: int):
+    # Exact terms (EBITDA, Q1 FY26, a rupee figure) that MiniLM ranks poorly still reach the top k.
+    hits = [[chunk_id for chunk_id, _ in keywords.search(query, HYBRID_CANDIDATES, filter)] for query, filter in requests]
+    known = {doc.id: doc for found in results for doc in found}
+    missing = list({chunk_id for found in hits for chunk_id in found if chunk_id not in known})
+    if missing:
+        known.update(get_chunks(vector_store, missing))
+    return [
+        [known[chunk_id] for chunk_id in reciprocal_rank_fusion([[doc.id for doc in found], keyword_hits], k) if chunk_id in known]
+        for found, keyword_hits in zip(results, hits)
+    ]
+
+def keyword_index(corpus: Optional[Corpus]):
+    return load_keyword_index(corpus.keyword_path) if HYBRID_RETRIEVAL and corpus is not None else None
+
+def get_document_chunks(vector_store, doc_sha256: str):
+    if isinstance(vector_store, PartitionedFaissStore):
+        found = vector_store.get_chunks({"doc_sha256": doc_sha256})
+    else:
+        result = vector_store._collection.get(where={"doc_sha256": doc_sha256}, include=["documents", "metadatas"])
+        found = [
+            (chunk_id, Document(id=chunk_id, page_content=text, metadata=metadata or {}))
+            for chunk_id, text, metadata in zip(result["ids"], result["documents"], result["metadatas"])
+        ]
+    return [doc for _, doc in sorted(found, key=lambda item: int(item[0].rsplit("-", 1)[-1]))]
+
+def _group_by_filter(requests: list):
+    groups = {}
+    for position, (_, filter) in enumerate(requests):
+        groups.setdefault(json.dumps(filter, sort_keys=True), []).append(position)
+    return groups
+
+def retrieve_batch(vector_store, embeddings, requests: list, k: int = RETRIEVAL_K, corpus: Optional[Corpus] = None):
+    keywords = keyword_index(corpus)
+    depth = max(k, HYBRID_CANDIDATES) if keywords else k
+    vectors = query_embedding_cache.embed(embeddings, [query for query, _ in requests])
+    results = [None] * len(requests)
+    for positions in _group_by_filter(requests).values():
+        chunks = search_by_vectors(vector_store, [vectors[i] for i in positions], depth, requests[positions[0]][1])
+        for position, found in zip(positions, chunks):
+            results[position] = found
+    if keywords:
+        results = fuse_keyword_hits(vector_store, keywords, requests, results, k)
+    return results
+
+async def aretrieve_batch(vector_store, embeddings, requests: list, k: int = RETRIEVAL_K, corpus: Optional[Corpus] = None):
+    loop = asyncio.get_running_loop()
+    keywords = await loop.run_in_executor(_retrieval_executor, keyword_index, corpus)
+    depth = max(k, HYBRID_CANDIDATES) if keywords else k
+    vectors = await loop.run_in_executor(
+        _retrieval_executor, query_embedding_cache.embed, embeddings, [query for query, _ in requests]
+    )
+    groups = list(_group_by_filter(requests).values())
+    searches = await asyncio.gather(*(
+        loop.run_in_executor(
+            _retrieval_executor, search_by_vectors, vector_store, [vectors[i] for i in positions], depth, requests[positions[0]][1]
         )
-        vectorstore.persist()
-        logging.info("ChromaDB creation complete and persisted.")
+        for positions in groups
+    ))
+    results = [None] * len(requests)
+    for positions, chunks in zip(groups, searches):
+        for position, found in zip(positions, chunks):
+            results[position] = found
+    if keywords:
+        results = await loop.run_in_executor(_retrieval_executor, fuse_keyword_hits, vector_store, keywords, requests, results, k)
+    return results
+
+def file_sha256(path: str):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def scan_corpus(corpus: Corpus):
+    files = {}
+    for folder, doc_type in ((corpus.reports_path, "report"), (corpus.transcripts_path, "transcript")):
+        if not os.path.isdir(folder):
+            raise FileNotFoundError(f"{doc_type.title()}s folder missing at path: {folder}")
+        for name in sorted(os.listdir(folder)):
+            if name.lower().endswith(".pdf"):
+                path = os.path.join(folder, name)
+                files[path] = {"sha256": file_sha256(path), "type": doc_type}
+    return files
+
+def compute_corpus_version(files: dict):
+    digest = hashlib.sha256()
+    for path in sorted(files):
+        digest.update(f"{path}:{files[path]['sha256']}".encode())
+    return digest.hexdigest()[:16]
+
+def load_manifest(corpus: Corpus):
+    if not os.path.exists(corpus.manifest_path):
+        return None
+    with open(corpus.manifest_path) as f:
+        return json.load(f)
+
+def save_manifest(corpus: Corpus, manifest: dict):
+    os.makedirs(os.path.dirname(corpus.manifest_path), exist_ok=True)
+    tmp_path = corpus.manifest_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, corpus.manifest_path)
+
+def cached_manifest(corpus: Corpus):
+    # Request-time readers share one parse per manifest version, plus a dict for values derived from
+    # it. os.replace in save_manifest gives every version a new inode, so a stat tells them apart,
+    # including versions written by another worker process. Callers must not modify either.
+    try:
+        stat = os.stat(corpus.manifest_path)
+        version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        version = None
+    cached = _manifest_cache.get(corpus.manifest_path)
+    if cached is None or cached[0] != version:
+        manifest = (load_manifest(corpus) if version is not None else None) or {"files": {}}
+        cached = (version, manifest, {})
+        with _manifest_cache_lock:
+            _manifest_cache[corpus.manifest_path] = cached
+    return cached[1], cached[2]
+
+def corpus_version(corpus: Corpus):
+    manifest, _ = cached_manifest(corpus)
+    return manifest.get("corpus_version")
+
+def text_splitter():
+    global _splitter
+    if _splitter is None:
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+        _splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=500)
+    return _splitter
+
+def load_pdf_chunks(path: str, doc_type: str, sha256: str):
+    from langchain_community.document_loaders import PyPDFLoader
+
+    documents = PyPDFLoader(path).load()
+    texts = [doc.page_content for doc in documents]
+    period = document_period(path, texts)
+    for doc, section in zip(documents, page_sections(doc_type, texts)):
+        doc.metadata["type"] = doc_type
+        doc.metadata["doc_sha256"] = sha256
+        doc.metadata["section"] = section
+        doc.metadata.update(period)
+    chunks = text_splitter().split_documents(documents)
+    ids = [f"{sha256[:16]}-{i}" for i in range(len(chunks))]
+    return chunks, ids
+
+def add_embedded_chunks(vector_store, ids, chunks, vectors):
+    # Bulk write of chunks whose embeddings were computed outside the store.
+    if isinstance(vector_store, PartitionedFaissStore):
+        vector_store.upsert(ids, vectors, chunks)
+        return
+    vector_store._collection.upsert(
+        ids=ids,
+        embeddings=vectors,
+        documents=[chunk.page_content for chunk in chunks],
+        metadatas=[chunk.metadata for chunk in chunks],
+    )
+
+def index_files_serially(vector_store, files: dict):
+    chunk_ids = {}
+    for path, entry in files.items():
+        chunks, ids = load_pdf_chunks(path, entry["type"], entry["sha256"])
+        if chunks:
+            vector_store.add_documents(chunks, ids=ids)
+        chunk_ids[path] = ids
+        logging.info(f"Indexed {path}: {len(chunks)} chunks.")
+    return chunk_ids
+
+def sync_vector_store(vector_store, corpus: Corpus, indexer=index_files_serially):
+    # Only files whose content hash changed since the last manifest are parsed and embedded.
+    manifest = load_manifest(corpus) or {"files": {}}
+    indexed = manifest["files"]
+    current = scan_corpus(corpus)
+    if not current:
+        raise ValueError("No PDF documents found in both Reports and Transcripts folders.")
+    outdated = manifest.get("metadata_version") != CHUNK_METADATA_VERSION
+    if outdated and indexed:
+        logging.info(f"Chunk metadata for {corpus.ticker} predates version {CHUNK_METADATA_VERSION}. Re-indexing once...")
+
+    removed = [path for path in indexed if path not in current]
+    changed = [path for path in current if path in indexed and (outdated or indexed[path]["sha256"] != current[path]["sha256"])]
+    added = [path for path in current if path not in indexed]
+
+    stale_ids = [chunk_id for path in removed + changed for chunk_id in indexed[path]["chunk_ids"]]
+    if stale_ids:
+        vector_store.delete(ids=stale_ids)
+    for path in removed:
+        del indexed[path]
+
+    chunk_ids = indexer(vector_store, {path: current[path] for path in changed + added})
+    for path, ids in chunk_ids.items():
+        indexed[path] = {**current[path], **document_period(path), "chunk_ids": ids}
+    if isinstance(vector_store, PartitionedFaissStore):
+        # Rebuild touched partitions now rather than on the first search.
+        vector_store.flush()
+
+    manifest["corpus_version"] = compute_corpus_version(current)
+    manifest["metadata_version"] = CHUNK_METADATA_VERSION
+    keyword_version = f"{manifest['corpus_version']}-m{CHUNK_METADATA_VERSION}"
+    if current_version(corpus.keyword_path) != keyword_version:
+        # BM25 statistics are corpus wide, so the keyword index is rebuilt whole; it takes well under a second.
+        rebuild_keyword_index(vector_store, corpus, keyword_version)
+    save_manifest(corpus, manifest)
+    stats = {
+        "added": len(added),
+        "updated": len(changed),
+        "removed": len(removed),
+        "unchanged": len(current) - len(added) - len(changed),
+        "corpus_version": manifest["corpus_version"],
+    }
+    logging.info(f"Vector store sync complete for {corpus.ticker}: {stats}")
+    return stats
+
+def open_vector_store(embeddings, corpus: Corpus):
+    if VECTOR_ENGINE == "faiss":
+        logging.info(f"Opening FAISS partitions for {corpus.ticker} at {corpus.faiss_path}")
+        return PartitionedFaissStore(corpus.faiss_path, embeddings)
+    if VECTOR_ENGINE != "chroma":
+        raise ValueError(f"Unknown VECTOR_ENGINE: {VECTOR_ENGINE}")
+    from langchain_community.vectorstores import Chroma
+
+    exists = os.path.exists(corpus.store_path)
+    logging.info(f"Existing ChromaDB found for {corpus.ticker}. Loading..." if exists else f"ChromaDB not found for {corpus.ticker}. Creating a new one...")
+    with _chroma_systems_lock:
+        vectorstore = Chroma(persist_directory=corpus.store_path, embedding_function=embeddings)
+
+    if exists and load_manifest(corpus) is None and vectorstore._collection.count() > 0:
+        # Stores built before the manifest existed have no stable chunk ids to diff against.
+        logging.info("ChromaDB has no ingestion manifest. Re-indexing once...")
+        vectorstore.delete_collection()
+        with _chroma_systems_lock:
+            vectorstore = Chroma(persist_directory=corpus.store_path, embedding_function=embeddings)
+    return vectorstore
+
+def close_vector_store(vector_store):
+    if isinstance(vector_store, PartitionedFaissStore):
+        vector_store.close()
+        return
+    # Chroma caches one client system per persist directory for the life of the process and only offers
+    # clearing the whole cache. Open stores keep the server they were built with, so clearing it lets
+    # the evicted company's system be freed while later opens of other paths build fresh ones.
+    try:
+        from chromadb.api.client import Client
+
+        with _chroma_systems_lock:
+            Client.clear_system_cache()
+    except Exception as e:
+        logging.warning(f"Could not release vector store: {e}")
+
+def create_or_load_vector_store(corpus: Corpus, embeddings=None):
+    try:
+        if embeddings is None:
+            embeddings = get_embeddings()
+
+        vectorstore = open_vector_store(embeddings, corpus)
+        sync_vector_store(vectorstore, corpus)
         return vectorstore
 
     except Exception as e:
         logging.error(f"create_or_load_vector_store failed: {e}", exc_info=True)
         return None
 
-
 if __name__ == "__main__":
-    vs = create_or_load_vector_store()
+    # Run as a module from app/ (`python -m tools.vectorstore`) so the package-relative imports resolve.
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(name)s | %(message)s")
+    vs = create_or_load_vector_store(get_corpus())
     if vs:
         logging.info("Vector store ready to use!")
     else:
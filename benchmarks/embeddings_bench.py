@@ -0,0 +1,163 @@
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+import numpy as np
+from forecast_bench import DEFAULT_TASK, RESULTS_DIR, git_revision, percentile
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# name -> (EMBEDDINGS_BACKEND, ONNX_QUANTIZED)
+BACKENDS = {
+    "torch": ("torch", "false"),
+    "onnx": ("onnx", "false"),
+    "onnx-int8": ("onnx", "true"),
+}
+
+def rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def measure(name, texts, queries, threads, repeats):
+    # Runs in a fresh process per backend so import cost and RSS are not shared between them.
+    backend, quantized = BACKENDS[name]
+    os.environ["EMBEDDINGS_BACKEND"] = backend
+    os.environ["ONNX_QUANTIZED"] = quantized
+    if threads:
+        os.environ["ONNX_INTRA_OP_THREADS"] = str(threads)
+    os.chdir(ROOT / "app")
+
+    rss_start = rss_mb()
+    start = time.perf_counter()
+    from app.tools.vectorstore import get_embeddings
+
+    embeddings = get_embeddings()
+    if backend == "torch" and threads:
+        import torch
+
+        torch.set_num_threads(threads)
+    load_s = time.perf_counter() - start
+    rss_loaded = rss_mb()
+
+    embeddings.embed_documents(texts[:8])
+    start = time.perf_counter()
+    doc_vectors = embeddings.embed_documents(texts)
+    embed_s = time.perf_counter() - start
+
+    latencies = []
+    for _ in range(repeats):
+        for query in queries:
+            start = time.perf_counter()
+            embeddings.embed_query(query)
+            latencies.append(time.perf_counter() - start)
+    query_vectors = [embeddings.embed_query(query) for query in queries]
+
+    return {
+        "backend": name,
+        "load_s": load_s,
+        "docs_per_s": len(texts) / embed_s,
+        "query_p50_ms": percentile(latencies, 50) * 1000,
+        "query_p95_ms": percentile(latencies, 95) * 1000,
+        "rss_import_mb": rss_loaded - rss_start,
+        "peak_rss_mb": rss_mb(),
+        "doc_vectors": doc_vectors,
+        "query_vectors": query_vectors,
+    }
+
+def agreement(result, reference, k):
+    # Overlap of each query's top-k chunks with the reference backend, and cosine between the two
+    # backends' vectors for the same chunk (vectors are normalized by both backends).
+    docs, ref_docs = np.asarray(result["doc_vectors"]), np.asarray(reference["doc_vectors"])
+    queries, ref_queries = np.asarray(result["query_vectors"]), np.asarray(reference["query_vectors"])
+    top = np.argsort(-queries @ docs.T, axis=1)[:, :k]
+    ref_top = np.argsort(-ref_queries @ ref_docs.T, axis=1)[:, :k]
+    overlap = [len(set(a) & set(b)) / k for a, b in zip(top, ref_top)]
+    return {
+        "topk_overlap": float(np.mean(overlap)),
+        "mean_cosine": float(np.mean(np.sum(docs * ref_docs, axis=1))),
+    }
+
+def load_texts(ticker, limit):
+    from app.tools.vectorstore import get_corpus, load_pdf_chunks, scan_corpus
+
+    os.chdir(ROOT / "app")
+    corpus = get_corpus(ticker)
+    texts = []
+    for path, entry in scan_corpus(corpus).items():
+        chunks, _ = load_pdf_chunks(path, entry["type"], entry["sha256"])
+        texts.extend(chunk.page_content for chunk in chunks)
+        if len(texts) >= limit:
+            break
+    return texts[:limit]
+
+def default_queries():
+    from app.tools.financial_extractor import build_financials_query
+    from app.tools.metrics_store import METRICS_QUERY
+    from app.tools.qualitative_analysis import build_transcripts_query
+
+    return [
+        METRICS_QUERY,
+        build_financials_query(DEFAULT_TASK),
+        build_transcripts_query(DEFAULT_TASK),
+        "What did management say about deal wins and the order book?",
+        "Operating margin guidance for the next quarter",
+        "Attrition and headcount changes",
+        "Revenue growth by industry vertical in constant currency",
+        "Risks from client discretionary spending cuts",
+    ]
+
+def print_results(results, reference_name, k):
+    print(f"{'backend':>10} {'load s':>7} {'docs/s':>8} {'q p50 ms':>9} {'q p95 ms':>9} {'RSS +MB':>8} {'peak MB':>8} {f'top{k}':>8} {'cosine':>7}")
+    for result in results:
+        print(f"{result['backend']:>10} {result['load_s']:>7.2f} {result['docs_per_s']:>8.1f} {result['query_p50_ms']:>9.2f} "
+              f"{result['query_p95_ms']:>9.2f} {result['rss_import_mb']:>8.0f} {result['peak_rss_mb']:>8.0f} "
+              f"{result['agreement']['topk_overlap']:>8.3f} {result['agreement']['mean_cosine']:>7.4f}")
+    print(f"\nAgreement is measured against {reference_name}.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare embedding backends: throughput, query latency, RSS and retrieval agreement.")
+    parser.add_argument("--backends", nargs="+", choices=list(BACKENDS), default=list(BACKENDS),
+                        help="The first backend is the reference for agreement.")
+    parser.add_argument("--ticker", help="Company whose PDFs supply the chunks (default: DEFAULT_TICKER).")
+    parser.add_argument("--chunks", type=int, default=1000, help="Number of corpus chunks to embed.")
+    parser.add_argument("--threads", type=int, default=0, help="Intra-op threads for every backend (default: library default).")
+    parser.add_argument("--query-repeats", type=int, default=20)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--output-dir", default=str(RESULTS_DIR))
+    args = parser.parse_args()
+
+    texts = load_texts(args.ticker, args.chunks)
+    queries = default_queries()
+    print(f"Embedding {len(texts)} chunks and {len(queries)} queries x {args.query_repeats}")
+
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for name in args.backends:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            results.append(executor.submit(measure, name, texts, queries, args.threads, args.query_repeats).result())
+    for result in results:
+        result["agreement"] = agreement(result, results[0], args.k)
+    print_results(results, args.backends[0], args.k)
+
+    commit, dirty = git_revision()
+    output = {
+        "commit": commit,
+        "dirty": dirty,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "config": {"chunks": len(texts), "queries": len(queries), "threads": args.threads, "k": args.k},
+        "results": [{key: value for key, value in result.items() if not key.endswith("_vectors")} for result in results],
+    }
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    path = output_dir / f"embeddings-{commit}{'-dirty' if dirty else ''}-{datetime.now(timezone.utc):%Y%m%dT%H%M%S}.json"
+    path.write_text(json.dumps(output, indent=2))
+    print(f"\nSaved {path}")
+
+if __name__ == "__main__":
+    main()
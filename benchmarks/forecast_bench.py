@@ -0,0 +1,208 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+DEFAULT_TASK = "Analyze the financial reports and transcripts for the last three quarters and provide a qualitative forecast for the upcoming quarter."
+
+# Offline defaults for --serve: fake LLM, saved screener page, no forecast cache so every request runs the pipeline.
+SERVE_ENV = {
+    "LLM_PROVIDER": "fake",
+    "MARKET_DATA_FILE": str(ROOT / "benchmarks" / "fixtures" / "screener_tcs.html"),
+    "FORECAST_CACHE_BACKEND": "off",
+    "SERVER_TIMING": "true",
+}
+
+def percentile(values, q):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+def parse_server_timing(header):
+    stages = {}
+    for entry in filter(None, (part.strip() for part in (header or "").split(","))):
+        name, *params = entry.split(";")
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "dur":
+                stages[name.strip()] = float(value) / 1000
+    return stages
+
+async def run_level(client, url, task, concurrency, total, unique_tasks, tickers=None):
+    samples = []
+    errors = 0
+    queue = asyncio.Queue()
+    for i in range(total):
+        payload = {"task": f"{task} (run {i})" if unique_tasks else task}
+        if tickers:
+            # Round-robin over companies so every request may need a different store.
+            payload["ticker"] = tickers[i % len(tickers)]
+        queue.put_nowait(payload)
+
+    async def worker():
+        nonlocal errors
+        while True:
+            try:
+                payload = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            start = time.perf_counter()
+            try:
+                response = await client.post(url, json=payload)
+                latency = time.perf_counter() - start
+                if response.status_code != 200:
+                    errors += 1
+                    continue
+                samples.append((latency, parse_server_timing(response.headers.get("server-timing"))))
+            except httpx.HTTPError:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies = [latency for latency, _ in samples]
+    stage_names = sorted({name for _, stages in samples for name in stages})
+    stages = {
+        name: sum(stages.get(name, 0.0) for _, stages in samples) / len(samples)
+        for name in stage_names
+    }
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "throughput_rps": len(samples) / elapsed,
+        "p50_s": percentile(latencies, 50),
+        "p95_s": percentile(latencies, 95),
+        "p99_s": percentile(latencies, 99),
+        "mean_stage_s": stages,
+    }
+
+def git_revision():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT, capture_output=True, text=True).stdout.strip())
+        return commit or "unknown", dirty
+    except OSError:
+        return "unknown", False
+
+def start_server(port, wait_s):
+    env = {**os.environ, **{key: os.environ.get(key, value) for key, value in SERVE_ENV.items()}}
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(ROOT), env.get("PYTHONPATH")]))
+    # The document and vector-store paths are relative to app/.
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--workers", "1", "--log-level", "warning"],
+        cwd=ROOT / "app", env=env
+    )
+    deadline = time.time() + wait_s
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("Benchmark server exited during startup")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/ready", timeout=2).status_code == 200:
+                return server
+        except httpx.HTTPError:
+            pass
+        time.sleep(1)
+    server.terminate()
+    raise RuntimeError(f"Benchmark server was not ready after {wait_s:.0f}s")
+
+def print_results(levels):
+    print(f"{'concurrency':>11} {'requests':>8} {'errors':>6} {'req/s':>8} {'p50 s':>8} {'p95 s':>8} {'p99 s':>8}")
+    for level in levels:
+        print(f"{level['concurrency']:>11} {level['requests']:>8} {level['errors']:>6} {level['throughput_rps']:>8.2f} "
+              f"{level['p50_s'] or 0:>8.2f} {level['p95_s'] or 0:>8.2f} {level['p99_s'] or 0:>8.2f}")
+    print("\nMean time per stage (s)")
+    for level in levels:
+        stages = ", ".join(f"{name} {seconds:.3f}" for name, seconds in level["mean_stage_s"].items())
+        print(f"  c={level['concurrency']}: {stages}")
+
+def compare(levels, baseline_path, threshold_pct):
+    baseline = json.loads(Path(baseline_path).read_text())
+    previous = {level["concurrency"]: level for level in baseline["levels"]}
+    print(f"\nCompared with {baseline['commit']} ({baseline_path})")
+    regressed = False
+    for level in levels:
+        old = previous.get(level["concurrency"])
+        if old is None or not old["p95_s"] or not level["p95_s"]:
+            continue
+        p95_change = (level["p95_s"] / old["p95_s"] - 1) * 100
+        rps_change = (level["throughput_rps"] / old["throughput_rps"] - 1) * 100
+        print(f"  c={level['concurrency']}: p95 {p95_change:+.1f}%, throughput {rps_change:+.1f}%")
+        if p95_change > threshold_pct:
+            regressed = True
+    return regressed
+
+async def run(args):
+    url = args.url or f"http://127.0.0.1:{args.port}/forecast"
+    async with httpx.AsyncClient(timeout=args.timeout) as client:
+        levels = []
+        for concurrency in args.concurrency:
+            levels.append(await run_level(
+                client, url, args.task, concurrency, args.requests or concurrency * 4, not args.repeat_task, args.ticker))
+    return levels
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end /forecast benchmark: latency percentiles, throughput and per-stage time.")
+    parser.add_argument("--url", help="Forecast endpoint of a running server (default: the one started by --serve).")
+    parser.add_argument("--serve", action="store_true", help="Start a local server with the fake LLM and the saved market-data page.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--startup-timeout", type=float, default=600)
+    parser.add_argument("--task", default=DEFAULT_TASK)
+    parser.add_argument("--repeat-task", action="store_true", help="Send the same task every time (default appends a run number so the cache cannot answer).")
+    parser.add_argument("--ticker", nargs="+", help="Spread requests over these companies (default: the server's default ticker).")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--requests", type=int, default=0, help="Requests per level (default: 4 x concurrency).")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--output-dir", default=str(RESULTS_DIR))
+    parser.add_argument("--compare", help="Earlier results JSON to compare against.")
+    parser.add_argument("--fail-threshold", type=float, default=10.0, help="Exit non-zero if p95 regresses by more than this percentage.")
+    args = parser.parse_args()
+
+    server = start_server(args.port, args.startup_timeout) if args.serve else None
+    try:
+        levels = asyncio.run(run(args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    print_results(levels)
+    commit, dirty = git_revision()
+    result = {
+        "commit": commit,
+        "dirty": dirty,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "config": {
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "repeat_task": args.repeat_task,
+            "tickers": args.ticker,
+            "served": args.serve,
+            "env": {key: os.environ.get(key, value if args.serve else None) for key, value in SERVE_ENV.items()},
+        },
+        "levels": levels,
+    }
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    path = output_dir / f"{commit}{'-dirty' if dirty else ''}-{datetime.now(timezone.utc):%Y%m%dT%H%M%S}.json"
+    path.write_text(json.dumps(result, indent=2))
+    print(f"\nSaved {path}")
+
+    if args.compare and compare(levels, args.compare, args.fail_threshold):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import argparse
+import asyncio
+import os
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+import uvicorn
+from mock_groq import app as mock_app, settings as mock_settings, stats as mock_stats, window as mock_window
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from app.llm import GatewayChatModel, build_groq_llm
+from app.llm_gateway import LLMGateway
+
+# Drives the gateway against benchmarks/mock_groq.py in-process and fails when 429s are not retried,
+# Retry-After is not honoured, 5xx backoff does not stop at LLM_MAX_RETRIES, or a queued synthesis
+# call does not get the next free slot ahead of queued tool calls:
+#   python benchmarks/gateway_check.py
+
+PROMPT = "Reply with one short sentence."
+
+def start_mock():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(mock_app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, f"http://127.0.0.1:{port}"
+
+def configure_mock(rpm=0, tpm=0, window=60, error_rate=0.0, latency_ms=20):
+    mock_settings.rpm, mock_settings.tpm, mock_settings.window = rpm, tpm, window
+    mock_settings.error_rate, mock_settings.latency_ms = error_rate, latency_ms
+    mock_window.clear()
+    for key in mock_stats:
+        mock_stats[key] = 0
+
+def gateway_llm(max_in_flight=8, max_retries=4, backoff_base=0.5, backoff_max=20):
+    gateway = LLMGateway(rpm=0, tpm=0, max_in_flight=max_in_flight, max_retries=max_retries,
+                         backoff_base=backoff_base, backoff_max=backoff_max, expected_completion_tokens=100)
+    return GatewayChatModel(inner=build_groq_llm(), gateway=gateway)
+
+async def check_retry_after():
+    # Two requests fit in the mock's window; the other two get 429 with Retry-After set to when the
+    # window frees up. Backoff alone would wait up to 30s, so finishing just after the window shows
+    # the server's Retry-After was used.
+    window = 1.5
+    configure_mock(rpm=2, window=window)
+    llm = gateway_llm(backoff_base=30, backoff_max=30)
+    start = time.perf_counter()
+    results = await asyncio.gather(*(llm.ainvoke(PROMPT) for _ in range(4)), return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    failures = []
+    errors = [result for result in results if isinstance(result, Exception)]
+    if errors:
+        failures.append(f"429: {len(errors)} of 4 calls failed instead of being retried ({errors[0]!r})")
+    if mock_stats["rate_limited"] < 2:
+        failures.append(f"429: expected at least 2 rate-limited attempts, mock saw {mock_stats['rate_limited']}")
+    if not window * 0.9 <= elapsed <= window + 5:
+        failures.append(f"Retry-After: calls finished after {elapsed:.2f}s, expected about {window:.1f}s")
+    print(f"429 / Retry-After: {mock_stats['rate_limited']} rate-limited attempts, {elapsed:.2f}s")
+    return failures
+
+async def check_backoff():
+    # Every attempt gets a 503 without Retry-After, so the call gives up after max_retries retries
+    # spaced by jittered exponential backoff.
+    configure_mock(error_rate=1.0)
+    max_retries, backoff_base, backoff_max = 2, 0.2, 0.3
+    llm = gateway_llm(max_retries=max_retries, backoff_base=backoff_base, backoff_max=backoff_max)
+    failures = []
+    start = time.perf_counter()
+    try:
+        await llm.ainvoke(PROMPT)
+        failures.append("backoff: a call that only gets 503s succeeded")
+    except Exception:
+        pass
+    elapsed = time.perf_counter() - start
+    if mock_stats["errors"] != max_retries + 1:
+        failures.append(f"backoff: expected {max_retries + 1} attempts, mock saw {mock_stats['errors']}")
+    ceiling = sum(min(backoff_max, backoff_base * 2 ** attempt) for attempt in range(max_retries))
+    if elapsed > ceiling + 2:
+        failures.append(f"backoff: {elapsed:.2f}s spent retrying, the backoff ceiling is {ceiling:.2f}s")
+    delays = [llm.gateway.backoff(attempt, Exception()) for attempt in range(6) for _ in range(50)]
+    if min(delays) < 0 or max(delays) > backoff_max:
+        failures.append(f"backoff: delays {min(delays):.2f}-{max(delays):.2f}s fall outside 0-{backoff_max}s")
+    print(f"5xx backoff: {mock_stats['errors']} attempts, {elapsed:.2f}s")
+    return failures
+
+async def queued(gateway, in_flight, waiting):
+    while gateway.slots.status() != {"in_flight": in_flight, "waiting": waiting, "max_in_flight": gateway.slots.limit}:
+        await asyncio.sleep(0.01)
+
+async def check_priority():
+    # One slot: a tool call holds it while two tool calls and then a synthesis call queue up. Each call
+    # is started once the previous one holds or waits for the slot, so the queueing order is fixed.
+    configure_mock(latency_ms=200)
+    llm = gateway_llm(max_in_flight=1)
+    finished = []
+
+    async def call(name, tags):
+        await llm.ainvoke(PROMPT, config={"tags": tags})
+        finished.append(name)
+
+    tasks = [asyncio.create_task(call("tool-running", ["stage:tools"]))]
+    for waiting, (name, tags) in enumerate((("tool-1", ["stage:tools"]), ("tool-2", ["stage:tools"]), ("synthesis", ["stage:synthesis"]))):
+        await asyncio.wait_for(queued(llm.gateway, 1, waiting), timeout=10)
+        tasks.append(asyncio.create_task(call(name, tags)))
+    await asyncio.gather(*tasks)
+    print(f"priority: finished in order {', '.join(finished)}")
+    expected = ["tool-running", "synthesis", "tool-1", "tool-2"]
+    return [] if finished == expected else [f"priority: expected {', '.join(expected)}"]
+
+async def run_checks():
+    failures = []
+    for check in (check_retry_after, check_backoff, check_priority):
+        failures += await check()
+    return failures
+
+def main():
+    argparse.ArgumentParser(description="Check the LLM gateway's retries, backoff and priorities against the mock Groq API.").parse_args()
+    server, base_url = start_mock()
+    os.environ.update(GROQ_BASE_URL=base_url, GROQ_API_KEY="mock")
+    try:
+        failures = asyncio.run(run_checks())
+    finally:
+        server.should_exit = True
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
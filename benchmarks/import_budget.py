@@ -0,0 +1,102 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "900"))
+# Loaded on first use (startup warm-up, ingest, the first request) and never by importing the app.
+DEFERRED_MODULES = (
+    "langchain_community",
+    "langchain_groq",
+    "langchain_text_splitters",
+    "langchain_core.prompts",
+    "langchain_core.output_parsers",
+    "langsmith.client",
+    "chromadb",
+    "torch",
+    "sentence_transformers",
+    "onnxruntime",
+    "faiss",
+    "pypdf",
+    "mysql.connector",
+    "bs4",
+    "requests",
+    "httpx",
+)
+
+def import_times(module):
+    # One `python -X importtime` run in a fresh interpreter and an empty working directory. Returns
+    # (name, self_us, cumulative_us, depth) in the order imports finished, so every module is listed
+    # after the modules it imported, and the paths the import wrote under the working directory.
+    env = {**os.environ, "PYTHONPATH": str(ROOT)}
+    with tempfile.TemporaryDirectory() as cwd:
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=cwd, env=env, capture_output=True, text=True,
+        )
+        created = sorted(
+            os.path.relpath(os.path.join(folder, name), cwd)
+            for folder, dirs, files in os.walk(cwd) for name in dirs + files
+        )
+    if result.returncode != 0:
+        sys.exit(f"import {module} failed:\n{result.stderr[-2000:]}")
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        times.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return times, created
+
+def direct_imports(times, module):
+    # Depth-1 entries between the previous top-level import and the module itself.
+    end = max(i for i, (name, _, _, depth) in enumerate(times) if name == module and depth == 0)
+    children = []
+    for name, own, cumulative, depth in reversed(times[:end]):
+        if depth == 0:
+            break
+        if depth == 1:
+            children.append((cumulative, own, name))
+    return sorted(children, reverse=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail when importing the app gets slower than the budget, loads deferred dependencies or writes files.")
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS, help="Maximum median cumulative import time (default: IMPORT_BUDGET_MS or 900).")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to time; the median is compared with the budget.")
+    parser.add_argument("--top", type=int, default=15, help="Slowest top-level imports to list.")
+    args = parser.parse_args()
+
+    runs = [import_times(args.module) for _ in range(args.runs)]
+    total_ms = statistics.median(
+        next(cumulative for name, _, cumulative, depth in reversed(times) if name == args.module and depth == 0) for times, _ in runs
+    ) / 1000
+
+    last, _ = runs[-1]
+    print(f"{'cumulative ms':>13} {'self ms':>8}  module")
+    for cumulative, own, name in direct_imports(last, args.module)[:args.top]:
+        print(f"{cumulative / 1000:>13.1f} {own / 1000:>8.1f}  {name}")
+
+    failures = []
+    imported = {name for name, _, _, _ in last}
+    loaded = [name for name in DEFERRED_MODULES if name in imported]
+    if loaded:
+        failures.append(f"deferred dependencies imported at startup: {', '.join(loaded)}")
+    created = sorted({path for _, paths in runs for path in paths})
+    if created:
+        failures.append(f"importing {args.module} wrote to the working directory: {', '.join(created)}")
+    if total_ms > args.budget_ms:
+        failures.append(f"median import time {total_ms:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+    print(f"\nimport {args.module}: median {total_ms:.0f} ms over {args.runs} runs (budget {args.budget_ms:.0f} ms)")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
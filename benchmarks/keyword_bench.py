@@ -0,0 +1,98 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from forecast_bench import percentile
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# Term lookups analysts make that MiniLM embeddings tend to miss, with the filter the tools would use.
+TERM_QUERIES = [
+    ("operating margin", {"type": "report"}),
+    ("net profit margin", {"type": "report"}),
+    ("earnings per share", {"type": "report"}),
+    ("Q1 FY26", None),
+    ("attrition", {"type": "transcript"}),
+    ("headcount addition", {"type": "transcript"}),
+    ("deal wins TCV", {"type": "transcript"}),
+    ("BFSI", None),
+]
+
+def load_chunks(ticker):
+    from app.tools.vectorstore import get_corpus, load_pdf_chunks, scan_corpus
+
+    os.chdir(ROOT / "app")
+    corpus = get_corpus(ticker)
+    chunks = []
+    for path, entry in scan_corpus(corpus).items():
+        documents, ids = load_pdf_chunks(path, entry["type"], entry["sha256"])
+        for chunk_id, doc in zip(ids, documents):
+            doc.id = chunk_id
+            chunks.append((chunk_id, doc))
+    return corpus, chunks
+
+def term_hit_rate(documents, query):
+    # Share of returned chunks that contain every query term: a rough precision for term lookups.
+    from app.tools.keyword_index import tokenize
+
+    terms = set(tokenize(query))
+    if not documents:
+        return 0.0
+    return sum(terms <= set(tokenize(doc.page_content)) for doc in documents) / len(documents)
+
+def compare_retrieval(corpus, chunks, k):
+    # Indexes the chunks into a scratch FAISS store and compares vector-only with fused results.
+    from app.tools.faiss_store import PartitionedFaissStore
+    from app.tools.keyword_index import build_keyword_index
+    from app.tools.vectorstore import Corpus, get_embeddings, retrieve_batch
+
+    embeddings = get_embeddings()
+    with tempfile.TemporaryDirectory() as workdir:
+        scratch = Corpus(corpus.ticker, corpus.reports_path, corpus.transcripts_path, workdir)
+        build_keyword_index(scratch.keyword_path, chunks, "bench")
+        store = PartitionedFaissStore(scratch.faiss_path, embeddings)
+        vectors = embeddings.embed_documents([doc.page_content for _, doc in chunks])
+        store.upsert([chunk_id for chunk_id, _ in chunks], vectors, [doc for _, doc in chunks])
+        store.flush()
+        vector_only = retrieve_batch(store, embeddings, TERM_QUERIES, k)
+        hybrid = retrieve_batch(store, embeddings, TERM_QUERIES, k, corpus=scratch)
+    print(f"\n{'query':<22} {'vector':>7} {'hybrid':>7}   (share of top {k} containing every term)")
+    for (query, _), plain, fused in zip(TERM_QUERIES, vector_only, hybrid):
+        print(f"{query:<22} {term_hit_rate(plain, query):>7.2f} {term_hit_rate(fused, query):>7.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the BM25 keyword index for a company and time term queries.")
+    parser.add_argument("--ticker", help="Company whose PDFs supply the chunks (default: DEFAULT_TICKER).")
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--repeats", type=int, default=1000)
+    parser.add_argument("--compare", action="store_true", help="Also compare vector-only and hybrid results (loads the embedding model).")
+    args = parser.parse_args()
+
+    from app.tools.keyword_index import KeywordIndex, build_keyword_index, current_version
+
+    corpus, chunks = load_chunks(args.ticker)
+    with tempfile.TemporaryDirectory() as path:
+        start = time.perf_counter()
+        build_keyword_index(path, chunks, "bench")
+        build_s = time.perf_counter() - start
+        size_kb = sum(entry.stat().st_size for entry in os.scandir(os.path.join(path, "bench"))) / 1024
+        index = KeywordIndex(os.path.join(path, current_version(path)))
+        print(f"Indexed {len(index)} chunks, {len(index.vocabulary)} terms in {build_s * 1000:.0f} ms ({size_kb:.0f} KB on disk)\n")
+
+        print(f"{'query':<22} {'filter':<20} {'hits':>5} {'p50 us':>8} {'p95 us':>8}")
+        for query, filter in TERM_QUERIES:
+            latencies = []
+            for _ in range(args.repeats):
+                start = time.perf_counter()
+                hits = index.search(query, args.k, filter)
+                latencies.append(time.perf_counter() - start)
+            print(f"{query:<22} {str(filter or ''):<20} {len(hits):>5} {percentile(latencies, 50) * 1e6:>8.1f} {percentile(latencies, 95) * 1e6:>8.1f}")
+
+    if args.compare:
+        compare_retrieval(corpus, chunks, args.k)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import argparse
+import asyncio
+import statistics
+import time
+import httpx
+
+DEFAULT_TASK = "Analyze the financial reports and transcripts for the last three quarters and provide a qualitative forecast for the upcoming quarter."
+
+async def run_level(client, url, task, concurrency, requests_per_level):
+    latencies = []
+    errors = 0
+    queue = asyncio.Queue()
+    for _ in range(requests_per_level):
+        queue.put_nowait(task)
+
+    async def worker():
+        nonlocal errors
+        while True:
+            try:
+                payload = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            start = time.perf_counter()
+            try:
+                response = await client.post(url, json={"task": payload})
+                if response.status_code != 200:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "concurrency": concurrency,
+        "requests": requests_per_level,
+        "errors": errors,
+        "throughput_rps": requests_per_level / elapsed,
+        "mean_latency_s": statistics.mean(latencies),
+    }
+
+async def main(args):
+    async with httpx.AsyncClient(timeout=args.timeout) as client:
+        print(f"{'concurrency':>11} {'requests':>8} {'errors':>6} {'req/s':>8} {'mean s':>8}")
+        for concurrency in args.concurrency:
+            result = await run_level(client, args.url, args.task, concurrency, args.requests or concurrency * 4)
+            print(f"{result['concurrency']:>11} {result['requests']:>8} {result['errors']:>6} "
+                  f"{result['throughput_rps']:>8.2f} {result['mean_latency_s']:>8.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure /forecast throughput at increasing concurrency against a single worker.")
+    parser.add_argument("--url", default="http://127.0.0.1:8000/forecast")
+    parser.add_argument("--task", default=DEFAULT_TASK)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--requests", type=int, default=0, help="Requests per level (default: 4 x concurrency).")
+    parser.add_argument("--timeout", type=float, default=300)
+    asyncio.run(main(parser.parse_args()))
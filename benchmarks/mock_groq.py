@@ -0,0 +1,115 @@
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import uuid
+from collections import deque
+from pathlib import Path
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from app.llm import FakeForecastLLM
+from app.tools.context_packer import estimate_tokens
+
+# OpenAI-compatible stand-in for the Groq API that enforces its own RPM/TPM limits, so the
+# gateway's budgets, retries and backoff can be exercised offline:
+#   python benchmarks/mock_groq.py --rpm 30 --tpm 12000 --error-rate 0.05
+#   GROQ_BASE_URL=http://127.0.0.1:8766 GROQ_API_KEY=mock uvicorn app.main:app
+
+app = FastAPI()
+responder = FakeForecastLLM()
+settings = argparse.Namespace()
+window = deque()
+stats = {"requests": 0, "rate_limited": 0, "errors": 0, "completed": 0, "max_in_flight": 0}
+in_flight = 0
+
+def over_limit(tokens):
+    # Sliding window (one minute by default) over (time, tokens) of accepted requests.
+    now = time.monotonic()
+    while window and now - window[0][0] > settings.window:
+        window.popleft()
+    if settings.rpm and len(window) + 1 > settings.rpm:
+        return settings.window - (now - window[0][0])
+    if settings.tpm and sum(used for _, used in window) + tokens > settings.tpm:
+        return settings.window - (now - window[0][0]) if window else 1
+    window.append((now, tokens))
+    return None
+
+def completion(model, content, prompt_tokens):
+    completion_tokens = estimate_tokens(content)
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens},
+    }
+
+async def stream(model, content):
+    chat_id = f"chatcmpl-{uuid.uuid4().hex}"
+    for piece in content.split(" "):
+        chunk = {"id": chat_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                 "choices": [{"index": 0, "delta": {"content": piece + " "}, "finish_reason": None}]}
+        yield f"data: {json.dumps(chunk)}\n\n"
+        await asyncio.sleep(0.005)
+    done = {"id": chat_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+    yield f"data: {json.dumps(done)}\n\n"
+    yield "data: [DONE]\n\n"
+
+@app.post("/openai/v1/chat/completions")
+async def chat_completions(request: Request):
+    global in_flight
+    body = await request.json()
+    prompt = "\n".join(str(message.get("content", "")) for message in body.get("messages", []))
+    prompt_tokens = estimate_tokens(prompt)
+    stats["requests"] += 1
+
+    wait = over_limit(prompt_tokens + int(body.get("max_tokens") or 0))
+    if wait is not None:
+        stats["rate_limited"] += 1
+        return JSONResponse(
+            {"error": {"message": "Rate limit reached", "type": "tokens", "code": "rate_limit_exceeded"}},
+            status_code=429, headers={"retry-after": f"{max(wait, 0.1):.2f}"}
+        )
+    if random.random() < settings.error_rate:
+        stats["errors"] += 1
+        return JSONResponse({"error": {"message": "Service unavailable", "type": "internal_server_error"}}, status_code=503)
+
+    in_flight += 1
+    stats["max_in_flight"] = max(stats["max_in_flight"], in_flight)
+    try:
+        await asyncio.sleep(random.lognormvariate(0, 0.3) * settings.latency_ms / 1000)
+    finally:
+        in_flight -= 1
+    stats["completed"] += 1
+    content = responder.respond(prompt)
+    model = body.get("model", "mock")
+    if body.get("stream"):
+        return StreamingResponse(stream(model, content), media_type="text/event-stream")
+    return completion(model, content, prompt_tokens)
+
+@app.get("/stats")
+def get_stats():
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock Groq chat-completions API with rate limits, errors and latency.")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--rpm", type=int, default=30, help="Requests per minute before answering 429 (0 = unlimited).")
+    parser.add_argument("--tpm", type=int, default=12000, help="Tokens per minute before answering 429 (0 = unlimited).")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of accepted requests answered with 503.")
+    parser.add_argument("--latency-ms", type=float, default=400)
+    parser.add_argument("--window", type=float, default=60, help="Seconds the RPM/TPM limits are counted over.")
+    parser.parse_args(namespace=settings)
+    uvicorn.run(app, port=settings.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
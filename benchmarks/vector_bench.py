@@ -0,0 +1,204 @@
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+import numpy as np
+from forecast_bench import RESULTS_DIR, git_revision, percentile
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# name -> (VECTOR_ENGINE, FAISS_INDEX)
+ENGINES = {
+    "chroma": ("chroma", ""),
+    "faiss-flat": ("faiss", "flat"),
+    "faiss-hnsw": ("faiss", "hnsw"),
+    "faiss-ivf": ("faiss", "ivf"),
+}
+
+def memory_mb():
+    # Anonymous pages are private to this process; file-backed pages (mmapped indexes) are shared.
+    status = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("VmRSS", "RssAnon", "RssFile"):
+                status[key] = int(value.split()[0]) / 1024
+    return status
+
+def synthetic_dataset(chunks, dim, queries, doc_count, seed=0):
+    # Clustered random vectors spread over report/transcript documents of several quarters.
+    from langchain_core.documents import Document
+
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(doc_count, dim)).astype(np.float32)
+    months = ["jan", "apr", "jul", "oct"]
+    documents, ids, vectors = [], [], []
+    for i in range(chunks):
+        doc = i % doc_count
+        doc_type = "report" if doc % 2 == 0 else "transcript"
+        source = f"docs/{doc_type}_{months[(doc // 2) % 4]}_{20 + doc // 8}.pdf"
+        documents.append(Document(page_content=f"chunk {i}", metadata={
+            "type": doc_type, "source": source, "page": i % 30, "doc_sha256": f"{doc:064x}",
+        }))
+        ids.append(f"{doc:016x}-{i}")
+        vectors.append(centers[doc] + rng.normal(scale=0.8, size=dim))
+    query_vectors = centers[rng.integers(0, doc_count, size=queries)] + rng.normal(scale=0.8, size=(queries, dim))
+    return documents, ids, normalize(np.array(vectors)), normalize(query_vectors)
+
+def corpus_dataset(ticker, limit):
+    from embeddings_bench import default_queries
+    from app.tools.vectorstore import get_corpus, get_embeddings, load_pdf_chunks, scan_corpus
+
+    os.chdir(ROOT / "app")
+    corpus = get_corpus(ticker)
+    documents, ids = [], []
+    for path, entry in scan_corpus(corpus).items():
+        chunks, chunk_ids = load_pdf_chunks(path, entry["type"], entry["sha256"])
+        documents.extend(chunks)
+        ids.extend(chunk_ids)
+    documents, ids = documents[:limit], ids[:limit]
+    embeddings = get_embeddings()
+    vectors = np.array(embeddings.embed_documents([doc.page_content for doc in documents]), dtype=np.float32)
+    queries = np.array([embeddings.embed_query(query) for query in default_queries()], dtype=np.float32)
+    return documents, ids, vectors, queries
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def benchmark_filters(documents):
+    filters = {"none": None, "type=report": {"type": "report"}, "type=transcript": {"type": "transcript"}}
+    filters["one document"] = {"doc_sha256": documents[0].metadata["doc_sha256"]}
+    return filters
+
+def exact_top_k(vectors, documents, query, k, filter):
+    mask = np.array([all(doc.metadata.get(key) == value for key, value in (filter or {}).items()) for doc in documents])
+    scores = np.where(mask, vectors @ query, -np.inf)
+    return {i for i in np.argsort(-scores)[:k] if np.isfinite(scores[i])}
+
+def measure(name, documents, ids, vectors, queries, k, repeats, workdir):
+    # Runs in a fresh process per engine so imports, caches and RSS are not shared between them.
+    engine, index_kind = ENGINES[name]
+    os.environ["VECTOR_ENGINE"] = engine
+    if index_kind:
+        os.environ["FAISS_INDEX"] = index_kind
+    from app.tools.vectorstore import (
+        Corpus, add_embedded_chunks, close_vector_store, index_bytes, open_vector_store, search_by_vectors
+    )
+
+    corpus = Corpus("BENCH", "", "", os.path.join(workdir, name))
+    start = time.perf_counter()
+    vector_store = open_vector_store(None, corpus)
+    for offset in range(0, len(ids), 1000):
+        add_embedded_chunks(vector_store, ids[offset:offset + 1000], documents[offset:offset + 1000], vectors[offset:offset + 1000].tolist())
+    if engine == "faiss":
+        vector_store.flush()
+    build_s = time.perf_counter() - start
+    close_vector_store(vector_store)
+    del vector_store
+
+    # Measure a store opened from disk, as a serving worker would see it.
+    before = memory_mb()
+    start = time.perf_counter()
+    vector_store = open_vector_store(None, corpus)
+    search_by_vectors(vector_store, [queries[0].tolist()], k)
+    open_s = time.perf_counter() - start
+
+    # Engines return documents without their ids, so results are matched back by content and origin.
+    positions = {chunk_key(doc): i for i, doc in enumerate(documents)}
+    results = {}
+    for label, filter in benchmark_filters(documents).items():
+        latencies, recalls = [], []
+        for _ in range(repeats):
+            for query in queries:
+                start = time.perf_counter()
+                found = search_by_vectors(vector_store, [query.tolist()], k, filter)[0]
+                latencies.append(time.perf_counter() - start)
+        for query in queries:
+            found = search_by_vectors(vector_store, [query.tolist()], k, filter)[0]
+            expected = exact_top_k(vectors, documents, query, k, filter)
+            got = {positions.get(chunk_key(doc)) for doc in found}
+            recalls.append(len(got & expected) / max(len(expected), 1))
+        results[label] = {
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "recall": float(np.mean(recalls)),
+        }
+    after = memory_mb()
+    return {
+        "engine": name,
+        "build_s": build_s,
+        "open_s": open_s,
+        "index_mb": index_bytes(corpus) / 2**20,
+        "rss_anon_mb": after.get("RssAnon", 0) - before.get("RssAnon", 0),
+        "rss_file_mb": after.get("RssFile", 0) - before.get("RssFile", 0),
+        "filters": results,
+    }
+
+def chunk_key(doc):
+    return doc.page_content, doc.metadata.get("doc_sha256"), doc.metadata.get("page")
+
+def print_results(results):
+    print(f"{'engine':>11} {'build s':>8} {'open s':>7} {'index MB':>9} {'anon MB':>8} {'file MB':>8}  filter           p50 ms  p95 ms  recall")
+    for result in results:
+        for i, (label, stats) in enumerate(result["filters"].items()):
+            head = (f"{result['engine']:>11} {result['build_s']:>8.2f} {result['open_s']:>7.3f} {result['index_mb']:>9.1f} "
+                    f"{result['rss_anon_mb']:>8.1f} {result['rss_file_mb']:>8.1f}") if i == 0 else " " * 56
+            print(f"{head}  {label:<15} {stats['p50_ms']:>7.3f} {stats['p95_ms']:>7.3f} {stats['recall']:>7.3f}")
+    print("\nanon MB is private to each worker; file MB is mmapped index pages that workers on one host share.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare vector engines: filtered query latency, recall, build time and memory.")
+    parser.add_argument("--engines", nargs="+", choices=list(ENGINES), default=list(ENGINES))
+    parser.add_argument("--synthetic", type=int, default=0, help="Use N random clustered vectors instead of the corpus.")
+    parser.add_argument("--dim", type=int, default=384, help="Vector size for --synthetic.")
+    parser.add_argument("--documents", type=int, default=48, help="Documents the synthetic chunks are spread over.")
+    parser.add_argument("--ticker", help="Company whose PDFs supply the chunks (default: DEFAULT_TICKER).")
+    parser.add_argument("--chunks", type=int, default=5000, help="Maximum corpus chunks to index.")
+    parser.add_argument("--queries", type=int, default=50, help="Random queries for --synthetic.")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--output-dir", default=str(RESULTS_DIR))
+    args = parser.parse_args()
+
+    if args.synthetic:
+        documents, ids, vectors, queries = synthetic_dataset(args.synthetic, args.dim, args.queries, args.documents)
+    else:
+        documents, ids, vectors, queries = corpus_dataset(args.ticker, args.chunks)
+    print(f"Indexing {len(ids)} chunks of dimension {vectors.shape[1]}, {len(queries)} queries x {args.repeats}")
+
+    results = []
+    workdir = tempfile.mkdtemp(prefix="vector-bench-")
+    context = multiprocessing.get_context("spawn")
+    try:
+        for name in args.engines:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                results.append(executor.submit(measure, name, documents, ids, vectors, queries, args.k, args.repeats, workdir).result())
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    print_results(results)
+
+    commit, dirty = git_revision()
+    output = {
+        "commit": commit,
+        "dirty": dirty,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "config": {"chunks": len(ids), "dim": int(vectors.shape[1]), "queries": len(queries), "k": args.k, "synthetic": bool(args.synthetic)},
+        "results": results,
+    }
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    path = output_dir / f"vectors-{commit}{'-dirty' if dirty else ''}-{datetime.now(timezone.utc):%Y%m%dT%H%M%S}.json"
+    path.write_text(json.dumps(output, indent=2))
+    print(f"\nSaved {path}")
+
+if __name__ == "__main__":
+    main()